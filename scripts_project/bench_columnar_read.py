@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+Compara la lectura de unas pocas columnas desde CSV frente a Parquet y
+Arrow IPC (memory-map) sobre los mismos usuarios sintéticos.
+
+Uso:
+    python scripts_project/bench_columnar_read.py [--rows 200000] [--repeat 5]
+"""
+import argparse
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Configurar encoding UTF-8 para Windows
+if sys.platform == 'win32':
+    sys.stdout.reconfigure(encoding='utf-8')
+    sys.stderr.reconfigure(encoding='utf-8')
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from src.loaders.csv_loader import CSVLoader
+from src.loaders.columnar_loader import ColumnarLoader, PYARROW_AVAILABLE, read_columnar
+from src.models.user_model import User
+
+COUNTRIES = ["Spain", "France", "Germany", "Norway", "Brazil", "Canada", "Iran", "Turkey"]
+COLUMNS = ["country", "age"]
+
+
+def print_header(text):
+    """Imprime un encabezado formateado."""
+    print("\n" + "=" * 70)
+    print(f" {text}")
+    print("=" * 70 + "\n")
+
+
+def make_rows(n):
+    """Filas con el formato de los loaders (usuarios ya enriquecidos)."""
+    rnd = random.Random(42)
+    rows = []
+    for i in range(n):
+        u = User(gender=rnd.choice(["male", "female"]), first_name=f"N{i}", last_name=f"A{i}",
+                 country=rnd.choice(COUNTRIES), age=rnd.randint(18, 90),
+                 email=f"user{i}@example.com", uuid=f"{i:032x}")
+        u.age_group, u.region, u.population = "18-30", "Europe", rnd.randint(10**6, 10**8)
+        u.is_outlier = False
+        rows.append(u.to_dict())
+    return rows
+
+
+def read_csv_columns(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return [(row["country"], int(row["age"])) for row in csv.DictReader(f)]
+
+
+def best_of(repeat, fn):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if not PYARROW_AVAILABLE:
+        print("pyarrow no está instalado (pip install pyarrow)")
+        return False
+
+    rows = make_rows(args.rows)
+    with tempfile.TemporaryDirectory() as tmp:
+        CSVLoader("users.csv").load(rows, tmp)
+        ColumnarLoader("users.parquet", fmt="parquet").load(rows, tmp)
+        ColumnarLoader("users.arrow", fmt="arrow", compression=None).load(rows, tmp)
+
+        print_header(f"LECTURA DE {COLUMNS} SOBRE {args.rows} FILAS (mejor de {args.repeat})")
+        for name in ("users.csv", "users.parquet", "users.arrow"):
+            print(f"   {name:15s} {os.path.getsize(os.path.join(tmp, name)) / 1e6:8.1f} MB")
+        print()
+
+        csv_time, csv_data = best_of(args.repeat, lambda: read_csv_columns(os.path.join(tmp, "users.csv")))
+        print(f"   CSV (csv.DictReader):     {csv_time:8.3f} s")
+        results = []
+        for name in ("users.parquet", "users.arrow"):
+            path = os.path.join(tmp, name)
+            elapsed, table = best_of(args.repeat, lambda: read_columnar(path, COLUMNS))
+            same = list(zip(table.column("country").to_pylist(), table.column("age").to_pylist())) == csv_data
+            print(f"   {name:25s} {elapsed:8.3f} s  (x{csv_time / elapsed:.0f}) {'✓' if same else '✗'}")
+            results.append(same and elapsed < csv_time)
+        return all(results)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+Compara el enriquecimiento de países secuencial frente al concurrente
+usando un servidor RestCountries local con latencia inyectada.
+
+Uso:
+    python scripts_project/bench_country_enrichment.py [--latency 0.3] [--workers 8]
+"""
+import argparse
+import os
+import sys
+import time
+
+# Configurar encoding UTF-8 para Windows
+if sys.platform == 'win32':
+    sys.stdout.reconfigure(encoding='utf-8')
+    sys.stderr.reconfigure(encoding='utf-8')
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import src.config as config
+from src.models.user_model import User
+from src.services.transformer_service import TransformerService
+from fake_apis import FakeAPIServer, COUNTRIES
+
+
+def print_header(text):
+    """Imprime un encabezado formateado."""
+    print("\n" + "=" * 70)
+    print(f" {text}")
+    print("=" * 70 + "\n")
+
+
+def make_users(countries):
+    """Un usuario por país (el coste de la etapa depende de los países únicos)."""
+    return [User(gender="female", first_name="Ana", last_name="Test", country=c,
+                 age=30, email=f"ana@{i}.com") for i, c in enumerate(countries)]
+
+
+def time_enrichment(countries, workers):
+    """Ejecuta enrich_with_country_data sin caché y devuelve (segundos, usuarios)."""
+    transformer = TransformerService(make_users(countries), max_workers=workers)
+    start = time.perf_counter()
+    transformer.enrich_with_country_data()
+    return time.perf_counter() - start, transformer.get_users()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.3, help="Latencia por petición (s)")
+    parser.add_argument("--workers", type=int, default=config.COUNTRY_LOOKUP_WORKERS)
+    args = parser.parse_args()
+
+    # Un país lento y uno inexistente para comprobar que no bloquean al resto
+    slow_country = "Spain"
+    countries = list(COUNTRIES) + ["Atlantis"]
+    server = FakeAPIServer(latency=args.latency, slow={slow_country: args.latency * 4}).start()
+    config.RESTCOUNTRIES_API_URL = server.restcountries_url
+
+    try:
+        print_header(f"ENRIQUECIMIENTO DE {len(countries)} PAÍSES (latencia {args.latency}s)")
+
+        seq_time, seq_users = time_enrichment(countries, workers=1)
+        print(f"   Secuencial (1 hilo):        {seq_time:6.2f} s")
+
+        par_time, par_users = time_enrichment(countries, workers=args.workers)
+        print(f"   Concurrente ({args.workers} hilos):     {par_time:6.2f} s")
+
+        same = [(u.region, u.population) for u in seq_users] == [(u.region, u.population) for u in par_users]
+        print(f"\n   ✓ Aceleración: x{seq_time / par_time:.1f}")
+        print(f"   {'✓' if same else '✗'} Mismos resultados en ambos modos")
+        # Cota esperada: ~ceil(países / hilos) latencias + el país lento
+        expected = -(-len(countries) // args.workers) * args.latency + args.latency * 4
+        print(f"   Cota teórica concurrente: ~{expected:.2f} s")
+        return same and par_time < seq_time
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
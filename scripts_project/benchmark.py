@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark reproducible del pipeline completo contra un servidor local que
+imita RandomUser y RestCountries (sin red).
+
+Para cada tamaño y modo se ejecuta ETLController.run en un proceso nuevo (así
+el pico de RSS es el de esa ejecución) y sobre directorios temporales, y se
+recogen las métricas de cada etapa (extracción, limpieza, enriquecimiento,
+estadísticas, cada loader y cada gráfico). Los resultados se guardan en JSON;
+con --baseline se comparan con otro JSON y se marcan las regresiones.
+
+Con --corpus DIR los usuarios no salen del servidor local sino de respuestas
+reales de RandomUser guardadas en DIR (RESPONSE_CACHE="replay", sin red): una
+entrada estable y realista para comparar versiones. El corpus se graba una vez
+por tamaño con la misma seed, p. ej.:
+
+    python -m src.main --set RESPONSE_CACHE_DIR=corpus extract --seed benchmark --n-users 100000
+
+Uso:
+    python scripts_project/benchmark.py [--sizes 1000,10000,100000] [--modes batch,stream]
+        [--users-latency 0.0] [--country-latency 0.05] [--output data/benchmark.json]
+        [--baseline benchmark_anterior.json] [--tolerance 0.25] [--corpus DIR]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+# Configurar encoding UTF-8 para Windows
+if sys.platform == 'win32':
+    sys.stdout.reconfigure(encoding='utf-8')
+    sys.stderr.reconfigure(encoding='utf-8')
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_apis import FakeAPIServer
+
+# Diferencias menores que esto (segundos) no cuentan como regresión
+MIN_REGRESSION_SECONDS = 0.05
+
+
+def print_header(text):
+    """Imprime un encabezado formateado."""
+    print("\n" + "=" * 70)
+    print(f" {text}")
+    print("=" * 70 + "\n")
+
+
+def run_once(n_users, mode, seed, randomuser_url, restcountries_url, corpus=None):
+    """Ejecuta el pipeline una vez (en el proceso hijo) y devuelve sus métricas."""
+    import src.config as config
+    if corpus:
+        # Usuarios desde el corpus grabado (URLs de la API real), sin red
+        config.RESPONSE_CACHE = "replay"
+        config.RESPONSE_CACHE_DIR = os.path.abspath(corpus)
+    else:
+        # Sin caché de respuestas: se mide siempre la descarga
+        config.RANDOMUSER_API_URL = randomuser_url
+        config.RESPONSE_CACHE = "off"
+    config.RESTCOUNTRIES_API_URL = restcountries_url
+
+    from src.controller.etl_controller import ETLController
+    from src.services.visualization_service import VisualizationService
+
+    with tempfile.TemporaryDirectory() as tmp:
+        controller = ETLController()
+        controller.output_dir = os.path.join(tmp, "data")
+        controller.cache_dir = os.path.join(tmp, "cache")
+        # Sin reutilizar gráficos: se mide siempre el renderizado completo
+        controller.visualizer = VisualizationService(output_dir=os.path.join(tmp, "plots"),
+                                                     skip_unchanged=False)
+        os.makedirs(controller.output_dir, exist_ok=True)
+        controller.run(n_users=n_users, seed=seed, stream=(mode == "stream"))
+        return controller.metrics.to_dict()
+
+
+def git_commit():
+    """Commit actual (para saber qué versión se midió), o None."""
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT,
+                             capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, tolerance):
+    """Devuelve las regresiones (etapas más lentas que la base en más de `tolerance`)."""
+    previous = {
+        (r["n_users"], r["mode"], s["stage"]): s["seconds"]
+        for r in baseline.get("results", []) for s in r["metrics"]["stages"]
+    }
+    regressions = []
+    for r in results:
+        for s in r["metrics"]["stages"]:
+            before = previous.get((r["n_users"], r["mode"], s["stage"]))
+            if before is None:
+                continue
+            after = s["seconds"]
+            if after > before * (1 + tolerance) and after - before > MIN_REGRESSION_SECONDS:
+                regressions.append((r["n_users"], r["mode"], s["stage"], before, after))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000,100000",
+                        help="Tamaños separados por comas (p. ej. 1000,10000,100000,1000000)")
+    parser.add_argument("--modes", default="batch,stream", help="batch, stream o ambos")
+    parser.add_argument("--seed", default="benchmark")
+    parser.add_argument("--users-latency", type=float, default=0.0, help="Latencia por página de RandomUser (s)")
+    parser.add_argument("--country-latency", type=float, default=0.05, help="Latencia por petición de RestCountries (s)")
+    parser.add_argument("--output", default=os.path.join(PROJECT_ROOT, "data", "benchmark.json"))
+    parser.add_argument("--baseline", help="JSON de un benchmark anterior con el que comparar")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Margen de regresión (0.25 = 25%%)")
+    parser.add_argument("--corpus", help="Directorio con respuestas de RandomUser grabadas (modo replay)")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    modes = [m for m in args.modes.split(",") if m]
+
+    server = FakeAPIServer(latency=args.country_latency, users_latency=args.users_latency).start()
+    results = []
+    try:
+        # Un proceso nuevo por ejecución ("spawn"): métricas y memoria independientes
+        context = multiprocessing.get_context("spawn")
+        for n_users in sizes:
+            for mode in modes:
+                print_header(f"BENCHMARK: {n_users} usuarios, modo {mode}")
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                    metrics = executor.submit(run_once, n_users, mode, args.seed, server.randomuser_url,
+                                              server.restcountries_url, args.corpus).result()
+                results.append({"n_users": n_users, "mode": mode, "metrics": metrics})
+    finally:
+        server.stop()
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "params": {"seed": args.seed, "users_latency": args.users_latency,
+                   "country_latency": args.country_latency, "corpus": args.corpus},
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    print_header("RESUMEN (segundos)")
+    for r in results:
+        run = r["metrics"]["run"]
+        print(f"   {r['n_users']:>9} usuarios  {r['mode']:6s}  {run['seconds']:8.2f} s  "
+              f"RSS {run['rss_peak_mb']} MB")
+        for s in sorted(r["metrics"]["stages"], key=lambda s: s["seconds"], reverse=True)[:5]:
+            print(f"       {s['stage']:32s} {s['seconds']:8.3f} s")
+    print(f"\n   Resultados guardados en {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        print_header(f"COMPARACIÓN CON {args.baseline}")
+        for n_users, mode, stage, before, after in regressions:
+            print(f"   ✗ {n_users} {mode} {stage}: {before:.3f} s -> {after:.3f} s")
+        if not regressions:
+            print("   ✓ Sin regresiones")
+        return not regressions
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
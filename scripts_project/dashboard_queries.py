@@ -0,0 +1,298 @@
+"""
+Capa de consultas del dashboard sobre la base de datos SQLite del ETL.
+
+El navegador nunca descarga la tabla completa: pide páginas de usuarios ya
+filtradas y ordenadas, y los agregados del filtro activo, y el servidor los
+calcula en SQLite usando sus índices.
+
+- Paginación por clave (keyset): cada página devuelve un cursor opaco con el
+  valor de ordenación y el rowid de su última fila, y la siguiente página
+  empieza en `WHERE (columna, rowid) > (?, ?)`. El coste de una página no
+  depende de lo lejos que esté (a diferencia de OFFSET, que recorre y
+  descarta todas las filas anteriores).
+- Caché LRU de resultados indexada por la versión de la base de datos (mtime
+  y tamaño): una nueva carga del ETL invalida los resultados anteriores sin
+  necesidad de vaciar la caché.
+- Sin filtros, los agregados salen de las tablas de resumen que crea
+  SQLLoader (O(grupos)); con filtros, de consultas GROUP BY sobre users.
+"""
+import base64
+import binascii
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from src.models.user_model import user_fields
+
+# Filtros admitidos: parámetro -> (condición SQL, tipo)
+FILTERS = {
+    "country": ("country = ?", str),
+    "gender": ("gender = ?", str),
+    "region": ("region = ?", str),
+    "age_group": ("age_group = ?", str),
+    "email_domain": ("email_domain = ?", str),
+    "age_min": ("age >= ?", int),
+    "age_max": ("age <= ?", int),
+}
+
+# Columnas por las que se puede ordenar. Solo columnas sin NULL: la
+# comparación (columna, rowid) > (?, ?) del cursor no funciona con NULL.
+# Todas tienen un índice de una columna en SECONDARY_INDEXES (el rowid va
+# implícito al final), así que ninguna página se ordena en memoria
+SORT_COLUMNS = {
+    "id": "rowid",
+    "age": "age",
+    "country": "country",
+    "gender": "gender",
+    "first_name": "first_name",
+    "last_name": "last_name",
+    "email": "email",
+}
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+CACHE_SIZE = 256
+
+USER_COLUMNS = [name for name, _ in user_fields()]
+# SQLite guarda los booleanos como 0/1
+BOOL_COLUMNS = [name for name, tp in user_fields() if tp is bool]
+
+
+class QueryError(ValueError):
+    """Parámetros de consulta no válidos (el servidor responde 400)."""
+
+
+def encode_cursor(values: list) -> str:
+    """Cursor opaco (base64 de JSON, apto para URL) con la posición de la última fila."""
+    raw = json.dumps(values, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> list:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, ValueError):
+        raise QueryError("Cursor no válido")
+    if not isinstance(values, list) or len(values) != 2:
+        raise QueryError("Cursor no válido")
+    return values
+
+
+class ResultCache:
+    """Caché LRU de resultados, segura entre hilos."""
+
+    def __init__(self, max_entries: int = CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value) -> None:
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+
+class UserQueries:
+    """Consultas paginadas y agregados por filtro sobre la tabla users."""
+
+    def __init__(self, db_path: str, cache_size: int = CACHE_SIZE):
+        self.db_path = db_path
+        self.cache = ResultCache(cache_size)
+
+    def version(self) -> Optional[tuple]:
+        """(mtime, tamaño) de la base de datos, o None si no existe."""
+        try:
+            stat = os.stat(self.db_path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def connect(self) -> sqlite3.Connection:
+        """Conexión de solo lectura (una por consulta: sqlite3 no se comparte entre hilos)."""
+        conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    # ----------------------------
+    # PARÁMETROS
+    # ----------------------------
+    @staticmethod
+    def parse_filters(params: Dict[str, str]) -> Dict[str, Any]:
+        """Filtros presentes en `params`, con su tipo."""
+        filters = {}
+        for name, (_, tp) in FILTERS.items():
+            value = params.get(name)
+            if value in (None, ""):
+                continue
+            try:
+                filters[name] = tp(value)
+            except ValueError:
+                raise QueryError(f"{name} debe ser {tp.__name__}")
+        return filters
+
+    @staticmethod
+    def _where(filters: Dict[str, Any]) -> tuple:
+        clauses = [FILTERS[name][0] for name in filters]
+        return clauses, list(filters.values())
+
+    def _cached(self, key: tuple, compute):
+        result = self.cache.get(key)
+        if result is None:
+            result = compute()
+            self.cache.put(key, result)
+        return result
+
+    # ----------------------------
+    # PÁGINAS DE USUARIOS
+    # ----------------------------
+    def page(self, params: Dict[str, str]) -> dict:
+        """
+        Una página de usuarios filtrada y ordenada.
+
+        Parámetros: los de FILTERS, sort (SORT_COLUMNS), order (asc/desc),
+        limit (1..MAX_LIMIT) y cursor (el `next_cursor` de la página anterior).
+        La primera página (sin cursor) incluye el total de filas del filtro.
+        """
+        filters = self.parse_filters(params)
+        sort = params.get("sort") or "id"
+        if sort not in SORT_COLUMNS:
+            raise QueryError(f"sort debe ser uno de {list(SORT_COLUMNS)}")
+        order = (params.get("order") or "asc").lower()
+        if order not in ("asc", "desc"):
+            raise QueryError("order debe ser asc o desc")
+        try:
+            limit = int(params.get("limit") or DEFAULT_LIMIT)
+        except ValueError:
+            raise QueryError("limit debe ser un entero")
+        if not 1 <= limit <= MAX_LIMIT:
+            raise QueryError(f"limit debe estar entre 1 y {MAX_LIMIT}")
+        cursor = params.get("cursor") or None
+        after = decode_cursor(cursor) if cursor else None
+
+        key = ("page", self.version(), tuple(sorted(filters.items())), sort, order, limit, cursor)
+        return self._cached(key, lambda: self._page(filters, sort, order, limit, after))
+
+    def _page(self, filters: dict, sort: str, order: str, limit: int, after: Optional[list]) -> dict:
+        clauses, args = self._where(filters)
+        column = SORT_COLUMNS[sort]
+        direction, comparison = ("ASC", ">") if order == "asc" else ("DESC", "<")
+        count_where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        page_clauses, page_args = list(clauses), list(args)
+        if after is not None:
+            if column == "rowid":
+                page_clauses.append(f"rowid {comparison} ?")
+                page_args.append(after[1])
+            else:
+                page_clauses.append(f"({column}, rowid) {comparison} (?, ?)")
+                page_args.extend(after)
+        where = f" WHERE {' AND '.join(page_clauses)}" if page_clauses else ""
+        order_by = "rowid " + direction if column == "rowid" else f"{column} {direction}, rowid {direction}"
+
+        conn = self.connect()
+        try:
+            # Se pide una fila de más para saber si hay página siguiente
+            rows = conn.execute(
+                f"SELECT rowid AS id, {', '.join(USER_COLUMNS)} FROM users{where} "
+                f"ORDER BY {order_by} LIMIT ?",
+                page_args + [limit + 1],
+            ).fetchall()
+            total = None
+            if after is None:
+                total = conn.execute(f"SELECT COUNT(*) FROM users{count_where}", args).fetchone()[0]
+        finally:
+            conn.close()
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        users = [dict(row) for row in rows]
+        for user in users:
+            for name in BOOL_COLUMNS:
+                if user[name] is not None:
+                    user[name] = bool(user[name])
+        next_cursor = None
+        if has_more:
+            last = rows[-1]
+            next_cursor = encode_cursor([last["id"] if column == "rowid" else last[sort], last["id"]])
+        return {"users": users, "next_cursor": next_cursor, "total": total,
+                "sort": sort, "order": order, "limit": limit, "filters": filters}
+
+    # ----------------------------
+    # AGREGADOS
+    # ----------------------------
+    def aggregates(self, params: Dict[str, str]) -> dict:
+        """Total, edades, géneros, países y regiones de los usuarios del filtro."""
+        filters = self.parse_filters(params)
+        key = ("aggregates", self.version(), tuple(sorted(filters.items())))
+        return self._cached(key, lambda: self._aggregates(filters))
+
+    def _aggregates(self, filters: dict) -> dict:
+        conn = self.connect()
+        try:
+            tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            if not filters and "users_by_country_gender" in tables and "users_age_histogram" in tables:
+                return self._summary_aggregates(conn, tables)
+
+            clauses, args = self._where(filters)
+            where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+            total, avg_age, min_age, max_age = conn.execute(
+                f"SELECT COUNT(*), AVG(age), MIN(age), MAX(age) FROM users{where}", args).fetchone()
+
+            def counts(column):
+                return dict(conn.execute(
+                    f"SELECT {column}, COUNT(*) AS n FROM users{where} GROUP BY {column} ORDER BY n DESC",
+                    args).fetchall())
+
+            return {
+                "total": total,
+                "avg_age": round(avg_age, 2) if avg_age is not None else None,
+                "min_age": min_age,
+                "max_age": max_age,
+                "genders": counts("gender"),
+                "countries": counts("country"),
+                "regions": counts("region"),
+                "filters": filters,
+            }
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _summary_aggregates(conn: sqlite3.Connection, tables: set) -> dict:
+        """Agregados sin filtro desde las tablas de resumen (sin recorrer users)."""
+        genders, countries = {}, {}
+        for country, gender, n in conn.execute("SELECT country, gender, n FROM users_by_country_gender"):
+            genders[gender] = genders.get(gender, 0) + n
+            countries[country] = countries.get(country, 0) + n
+        histogram = conn.execute("SELECT age, n FROM users_age_histogram ORDER BY age").fetchall()
+        total = sum(n for _, n in histogram)
+        regions = {}
+        if "users_by_region" in tables:
+            regions = dict(conn.execute("SELECT region, n FROM users_by_region ORDER BY n DESC").fetchall())
+        by_count = lambda counts: dict(sorted(counts.items(), key=lambda item: item[1], reverse=True))
+        return {
+            "total": total,
+            "avg_age": round(sum(age * n for age, n in histogram) / total, 2) if total else None,
+            "min_age": histogram[0][0] if histogram else None,
+            "max_age": histogram[-1][0] if histogram else None,
+            "genders": by_count(genders),
+            "countries": by_count(countries),
+            "regions": regions,
+            "filters": {},
+        }
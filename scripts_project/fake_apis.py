@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+Servidor HTTP local que imita las APIs RandomUser y RestCountries.
+
+Sirve para medir el pipeline sin depender de la red:
+- /api/?results=N&seed=S&page=P responde con el mismo formato que
+  https://randomuser.me/api/ (usuarios deterministas para cada seed y página,
+  como la API real, con un máximo de 5000 por petición).
+- /v3.1/name/{country} responde como https://restcountries.com/v3.1/name/{country},
+  con países inexistentes (404).
+Se puede inyectar latencia en ambas (global o por país en RestCountries).
+
+Uso desde otro script:
+    server = FakeAPIServer(latency=0.2, slow={"Spain": 2.0}, users_latency=0.5)
+    server.start()
+    ...  # apuntar src.config.RANDOMUSER_API_URL a server.randomuser_url y
+         # src.config.RESTCOUNTRIES_API_URL a server.restcountries_url
+    server.stop()
+
+`randomuser_payload` genera las mismas respuestas sin servidor (fixtures).
+"""
+import json
+import random
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, unquote, parse_qs
+
+# Datos de ejemplo: país -> (región, población)
+COUNTRIES = {
+    "Australia": ("Oceania", 25687041),
+    "Brazil": ("Americas", 212559409),
+    "Canada": ("Americas", 38005238),
+    "Denmark": ("Europe", 5831404),
+    "Finland": ("Europe", 5530719),
+    "France": ("Europe", 67391582),
+    "Germany": ("Europe", 83240525),
+    "India": ("Asia", 1380004385),
+    "Iran": ("Asia", 83992953),
+    "Ireland": ("Europe", 4994724),
+    "Mexico": ("Americas", 128932753),
+    "Netherlands": ("Europe", 16655799),
+    "New Zealand": ("Oceania", 5084300),
+    "Norway": ("Europe", 5379475),
+    "Serbia": ("Europe", 6908224),
+    "Spain": ("Europe", 47351567),
+    "Switzerland": ("Europe", 8654622),
+    "Turkey": ("Asia", 84339067),
+    "Ukraine": ("Europe", 44134693),
+    "United Kingdom": ("Europe", 67215293),
+    "United States": ("Americas", 329484123),
+}
+
+
+FIRST_NAMES = ["Ana", "Lucas", "Emma", "Noah", "Mia", "Leo", "Sara", "Hugo", "Lea", "Jan"]
+LAST_NAMES = ["Garcia", "Smith", "Muller", "Martin", "Hansen", "Silva", "Kumar", "Yilmaz"]
+
+# Máximo de resultados por petición de la API real
+RANDOMUSER_MAX_RESULTS = 5000
+
+
+def randomuser_payload(results: int, seed: str = "", page: int = 1) -> dict:
+    """
+    Respuesta con la forma de RandomUser: mismos usuarios para la misma
+    (seed, página), aunque cambie el número de resultados pedido.
+    """
+    results = max(1, min(results, RANDOMUSER_MAX_RESULTS))
+    rnd = random.Random(f"{seed}:{page}")
+    countries = list(COUNTRIES)
+    users = []
+    for i in range(results):
+        gender = "female" if rnd.random() < 0.5 else "male"
+        first, last = rnd.choice(FIRST_NAMES), rnd.choice(LAST_NAMES)
+        age = rnd.randint(18, 80)
+        users.append({
+            "gender": gender,
+            "name": {"title": "Ms" if gender == "female" else "Mr", "first": first, "last": last},
+            "location": {"city": "Springfield", "country": rnd.choice(countries)},
+            "email": f"{first.lower()}.{last.lower()}.{page}.{i}@example.com",
+            "login": {"uuid": "%032x" % rnd.getrandbits(128), "username": f"user{page}_{i}"},
+            "dob": {"date": f"{2024 - age}-01-01T00:00:00.000Z", "age": age},
+            "nat": "ES",
+        })
+    return {"results": users, "info": {"seed": seed, "results": results, "page": page, "version": "1.4"}}
+
+
+class FakeAPIServer:
+    """Servidor local multihilo con latencia configurable."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0,
+                 latency: float = 0.0, slow: dict = None, users_latency: float = 0.0) -> None:
+        """
+        Args:
+            host: Interfaz de escucha
+            port: Puerto (0 = uno libre elegido por el sistema)
+            latency: Segundos de espera antes de cada respuesta de RestCountries
+            slow: Latencia específica por país, p. ej. {"Spain": 2.0}
+            users_latency: Segundos de espera antes de cada página de RandomUser
+        """
+        self.latency = latency
+        self.slow = slow or {}
+        self.users_latency = users_latency
+        self.requests_served = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.requests_served += 1
+                server._handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.host, self.port = self.httpd.server_address[:2]
+        self._thread = None
+
+    @property
+    def restcountries_url(self) -> str:
+        """Plantilla equivalente a config.RESTCOUNTRIES_API_URL."""
+        return f"http://{self.host}:{self.port}/v3.1/name/{{country}}"
+
+    @property
+    def randomuser_url(self) -> str:
+        """Equivalente a config.RANDOMUSER_API_URL."""
+        return f"http://{self.host}:{self.port}/api/"
+
+    def _handle(self, handler: BaseHTTPRequestHandler) -> None:
+        url = urlparse(handler.path)
+        path = url.path
+        if path.rstrip("/") == "/api":
+            query = parse_qs(url.query)
+            time.sleep(self.users_latency)
+            self._send(handler, 200, randomuser_payload(
+                int(query.get("results", ["1"])[0]),
+                seed=query.get("seed", [""])[0],
+                page=int(query.get("page", ["1"])[0]),
+            ))
+            return
+
+        if not path.startswith("/v3.1/name/"):
+            self._send(handler, 404, {"status": 404, "message": "Not Found"})
+            return
+
+        country = unquote(path[len("/v3.1/name/"):])
+        time.sleep(self.slow.get(country, self.latency))
+
+        if country not in COUNTRIES:
+            self._send(handler, 404, {"status": 404, "message": "Not Found"})
+            return
+
+        region, population = COUNTRIES[country]
+        self._send(handler, 200, [{
+            "name": {"common": country, "official": country},
+            "region": region,
+            "population": population,
+        }])
+
+    @staticmethod
+    def _send(handler: BaseHTTPRequestHandler, status: int, payload) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def start(self) -> "FakeAPIServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,424 @@
+# -*- coding: utf-8 -*-
+"""
+Comprobaciones de regresión del proyecto, sin red y sobre directorios
+temporales (no tocan data/, plots/ ni cache/).
+
+Cada función check_* prepara un caso concreto y falla con AssertionError si
+el comportamiento no es el esperado.
+
+Uso:
+    python scripts_project/run_checks.py [nombre_del_check ...]
+"""
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+
+# Configurar encoding UTF-8 para Windows
+if sys.platform == 'win32':
+    sys.stdout.reconfigure(encoding='utf-8')
+    sys.stderr.reconfigure(encoding='utf-8')
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+
+def print_header(text):
+    """Imprime un encabezado formateado."""
+    print("\n" + "=" * 70)
+    print(f" {text}")
+    print("=" * 70 + "\n")
+
+
+def _user(email, uuid="", age=30, country="Spain"):
+    return {"gender": "female", "first_name": "Ana", "last_name": "Pérez", "country": country,
+            "age": age, "email": email, "uuid": uuid}
+
+
+def check_sql_upgrade_from_pre_upsert_db():
+    """Una base de datos anterior al upsert (sin user_key ni uuid) no se duplica al recargar."""
+    from src.loaders.sql_loader import SQLLoader
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "usuarios.db")
+        conn = sqlite3.connect(db_path)
+        # Esquema original (6 columnas, sin clave) con un duplicado de las cargas en modo append
+        conn.execute("CREATE TABLE users (first_name TEXT, last_name TEXT, gender TEXT, "
+                     "country TEXT, age INTEGER, email TEXT)")
+        conn.executemany("INSERT INTO users VALUES (?, ?, ?, ?, ?, ?)", [
+            ("Ana", "Pérez", "female", "Spain", 30, "a@x.com"),
+            ("Ana", "Pérez", "female", "Spain", 30, "a@x.com"),
+            ("Luis", "Gil", "male", "France", 40, "b@x.com"),
+        ])
+        conn.commit()
+        conn.close()
+
+        batch = [_user("a@x.com", "U1", age=31), _user("b@x.com", "U2")]
+        for _ in range(2):
+            SQLLoader("usuarios.db").load(batch, tmp)
+
+        conn = sqlite3.connect(db_path)
+        rows = conn.execute("SELECT user_key, email, age FROM users ORDER BY email").fetchall()
+        conn.close()
+        assert rows == [("U1", "a@x.com", 31), ("U2", "b@x.com", 30)], rows
+
+
+def check_sql_repairs_duplicated_legacy_rows():
+    """Las filas antiguas ya duplicadas (clave email y clave uuid) se eliminan al abrir la base de datos."""
+    from src.loaders.sql_loader import SQLLoader
+
+    with tempfile.TemporaryDirectory() as tmp:
+        SQLLoader("usuarios.db").load([_user("a@x.com", "U1")], tmp)
+        conn = sqlite3.connect(os.path.join(tmp, "usuarios.db"))
+        conn.execute("INSERT INTO users (email, user_key, age) VALUES ('a@x.com', 'a@x.com', 30)")
+        conn.commit()
+        conn.close()
+
+        SQLLoader("usuarios.db").load([_user("c@x.com", "U3")], tmp)
+        conn = sqlite3.connect(os.path.join(tmp, "usuarios.db"))
+        keys = [row[0] for row in conn.execute("SELECT user_key FROM users ORDER BY user_key")]
+        conn.close()
+        assert keys == ["U1", "U3"], keys
+
+
+def check_sql_run_counts_exclude_legacy_repair():
+    """etl_runs.rows_updated no cuenta los cambios de clave de las filas antiguas adoptadas."""
+    from src.loaders.sql_loader import SQLLoader
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "usuarios.db")
+        conn = sqlite3.connect(db_path)
+        conn.execute("CREATE TABLE users (first_name TEXT, last_name TEXT, gender TEXT, "
+                     "country TEXT, age INTEGER, email TEXT)")
+        conn.executemany("INSERT INTO users VALUES (?, ?, ?, ?, ?, ?)", [
+            ("Ana", "Pérez", "female", "Spain", 30, "a@x.com"),
+            ("Ana", "Pérez", "female", "Spain", 30, "b@x.com"),
+        ])
+        conn.commit()
+        conn.close()
+
+        # a@x.com se adopta (cambio de clave) y se actualiza (uuid nuevo); c@x.com es nuevo
+        SQLLoader("usuarios.db").load([_user("a@x.com", "U1"), _user("c@x.com", "U3")], tmp)
+        conn = sqlite3.connect(db_path)
+        counts = conn.execute("SELECT rows_seen, rows_inserted, rows_updated FROM etl_runs").fetchall()
+        conn.close()
+        assert counts == [(2, 1, 1)], counts
+
+
+def check_sql_failed_load_rolls_back():
+    """Una carga que falla a medias no confirma filas, ni etl_runs, ni borra los datos anteriores."""
+    from src.loaders.sql_loader import SQLLoader
+
+    def failing_batches():
+        yield [_user("b@x.com", "U2"), _user("c@x.com", "U3")]
+        raise RuntimeError("fallo simulado")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        SQLLoader("usuarios.db").load([_user("a@x.com", "U1")], tmp)
+        try:
+            SQLLoader("usuarios.db", mode="replace").load_batches(failing_batches(), tmp)
+        except RuntimeError:
+            pass
+        else:
+            raise AssertionError("la excepción de la carga no se propagó")
+
+        conn = sqlite3.connect(os.path.join(tmp, "usuarios.db"))
+        keys = [row[0] for row in conn.execute("SELECT user_key FROM users")]
+        runs = conn.execute("SELECT COUNT(*) FROM etl_runs").fetchone()[0]
+        conn.close()
+        assert keys == ["U1"], keys
+        assert runs == 1, runs
+
+
+def check_streaming_failure_aborts_loaders():
+    """Si la extracción falla a mitad de un run en streaming, no se confirma ningún lote ni etl_runs."""
+    from src.controller.etl_controller import ETLController
+    from src.loaders.sql_loader import SQLLoader
+    from src.models.user_batch import UserBatch
+    from src.models.user_model import User
+    from src.services.country_cache import CountryCache
+
+    def failing_stream(n_users, seed=None):
+        yield UserBatch.from_users([User(**_user("b@x.com", "U2"))])
+        raise RuntimeError("fallo simulado")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        SQLLoader("usuarios.db").load([_user("a@x.com", "U1")], tmp)
+        controller = ETLController()
+        controller.output_dir = controller.cache_dir = tmp
+        controller.etl_service.stream_users = failing_stream
+        # Sin red: el país del lote se trata como desconocido
+        controller._open_country_cache = lambda: CountryCache(os.path.join(tmp, "countries.db"), offline=True)
+        try:
+            controller._run_streaming(10)
+        except RuntimeError:
+            pass
+        else:
+            raise AssertionError("la excepción de la extracción no se propagó")
+
+        conn = sqlite3.connect(os.path.join(tmp, "usuarios.db"))
+        keys = [row[0] for row in conn.execute("SELECT user_key FROM users")]
+        runs = conn.execute("SELECT COUNT(*) FROM etl_runs").fetchone()[0]
+        conn.close()
+        assert keys == ["U1"], keys
+        assert runs == 1, runs
+
+
+def _run_config(code, **environ):
+    """Ejecuta `code` en un proceso aparte (config se lee del entorno al importarse) y devuelve su salida."""
+    env = {key: value for key, value in os.environ.items() if not key.startswith("ETL_")}
+    env.update(environ)
+    result = subprocess.run([sys.executable, "-c", code], cwd=PROJECT_ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    return result.stdout.strip()
+
+
+def check_config_precedence():
+    """Orden documentado: config.py < perfil < variables ETL_<NOMBRE> < argumentos."""
+    code = ("import src.config as c; "
+            "c.configure('small', {'DEFAULT_SEED': 'cli', 'PLOT_WORKERS': None}); "
+            "print(c.DEFAULT_N_USERS, c.DEFAULT_SEED, c.PLOT_DPI, c.PLOT_WORKERS, c.ACTIVE_PROFILE)")
+    output = _run_config(code, ETL_DEFAULT_N_USERS="777", ETL_DEFAULT_SEED="env", ETL_PLOT_WORKERS="3")
+    # Entorno sobre perfil (777, 3), argumento sobre entorno (cli), perfil sobre config.py (100)
+    assert output.split() == ["777", "cli", "100", "3", "small"], output
+
+
+def check_config_seed_stays_text():
+    """`--seed 0x10` (o ETL_DEFAULT_SEED=0x10) es la semilla "0x10", no el entero 16."""
+    code = ("import src.config as c; from src.main import build_parser, collect_overrides; "
+            "args = build_parser().parse_args(['run', '--seed', '0x10']); "
+            "c.configure(None, collect_overrides(args)); print(repr(c.DEFAULT_SEED))")
+    assert _run_config(code) == "'0x10'", _run_config(code)
+    for seed in ("0x10", "1e3", "True", "[1]"):
+        output = _run_config("import src.config as c; print(repr(c.DEFAULT_SEED))", ETL_DEFAULT_SEED=seed)
+        assert output == repr(seed), (seed, output)
+
+
+def check_config_text_seed_after_profile_int_seed():
+    """Tras un perfil con `default_seed = 42`, una semilla de texto sigue siendo válida."""
+    with tempfile.TemporaryDirectory() as tmp:
+        profile = os.path.join(tmp, "seed.toml")
+        with open(profile, "w", encoding="utf-8") as f:
+            f.write("default_seed = 42\n")
+        code = f"import src.config as c; c.configure({profile!r}, {{'DEFAULT_SEED': 'abc'}}); print(repr(c.DEFAULT_SEED))"
+        assert _run_config(code) == "'abc'", _run_config(code)
+        code = f"import src.config as c; c.configure({profile!r}); print(repr(c.DEFAULT_SEED))"
+        assert _run_config(code, ETL_DEFAULT_SEED="abc") == "'abc'", _run_config(code, ETL_DEFAULT_SEED="abc")
+        assert _run_config(code) == "'42'", _run_config(code)
+
+
+def _enriched_users(n):
+    from src.models.user_model import User
+
+    countries = [("Spain", 47_000_000), ("France", 68_000_000), ("Norway", 5_400_000), ("Iran", 86_000_000)]
+    users = []
+    for i in range(n):
+        country, population = countries[min(i % 7, 3)]
+        users.append(User(gender="male" if i % 3 else "female", first_name="Ana", last_name="Pérez",
+                          country=country, age=18 + (i * 7) % 60, email=f"u{i}@mail{i % 5}.com",
+                          uuid=f"U{i}", age_group="18-30", email_domain=f"mail{i % 5}.com",
+                          is_outlier=i % 17 == 0, region="Europe", population=population))
+    return users
+
+
+def check_sketch_view_matches_exact_view():
+    """Con menos países que la capacidad del top-k, la vista de sketches coincide con la exacta."""
+    from src.services.transformer_service import SketchStatistics
+    from src.utils.aggregates import AggregateView
+
+    users = _enriched_users(500)
+    exact = AggregateView.from_users(users)
+    sketches = SketchStatistics()
+    for start in range(0, len(users), 100):
+        part = SketchStatistics()
+        part.update(users[start:start + 100])
+        sketches.merge(part)
+    view = sketches.view()
+
+    assert len(view) == len(exact)
+    assert dict(view.top_countries(10)) == dict(exact.top_countries(10))
+    for country in exact.countries:
+        assert view.ages_of(country).histogram == exact.ages_of(country).histogram, country
+        assert view.genders_of(country) == exact.genders_of(country), country
+    assert view.numeric_fields() == exact.numeric_fields()
+    for x, y in (("age", "population"), ("age", "is_outlier"), ("population", "is_outlier")):
+        assert abs(view.correlation(x, y) - exact.correlation(x, y)) < 1e-9, (x, y)
+    assert sketches.result()["error_bounds"]["total_countries"] == "exacto"
+
+
+def check_sketch_view_is_bounded():
+    """Las tablas por país de los sketches solo guardan los países del top-k."""
+    from src.services.transformer_service import SketchStatistics
+    from src.utils.sketches import SpaceSaving
+
+    sketches = SketchStatistics()
+    sketches.countries = SpaceSaving(capacity=2)
+    sketches.update(_enriched_users(400))
+    tracked = set(sketches.countries.counters)
+    assert {c for c, _ in sketches.country_ages} <= tracked
+    assert {c for c, _ in sketches.country_genders} <= tracked
+    assert len(sketches.view().countries) == 2
+    assert sketches.result()["error_bounds"]["total_countries"].startswith("cota inferior")
+
+
+def check_iter_dicts_matches_to_dicts():
+    """iter_dicts da las mismas filas que to_dicts, en bloques del tamaño pedido."""
+    from src.models.user_batch import UserBatch, iter_dicts, to_dicts
+
+    users = _enriched_users(25)
+    for data in (users, UserBatch.from_users(users)):
+        chunks = list(iter_dicts(data, 10))
+        assert [len(chunk) for chunk in chunks] == [10, 10, 5], [len(chunk) for chunk in chunks]
+        assert [row for chunk in chunks for row in chunk] == to_dicts(data)
+    assert list(iter_dicts(UserBatch(), 10)) == []
+
+
+def check_dashboard_head_errors_have_no_body():
+    """Un HEAD con respuesta de error no envía cuerpo (la conexión keep-alive sigue siendo válida)."""
+    import http.client
+    import threading
+    sys.path.insert(0, os.path.join(PROJECT_ROOT, "scripts_project"))
+    from serve_dashboard import make_server
+
+    with tempfile.TemporaryDirectory() as tmp:
+        server = make_server("127.0.0.1", 0, root=tmp, data_dir=tmp, quiet=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", server.server_address[1], timeout=5)
+            for path in ("/no-existe.html", "/api/stats", "/api/users"):
+                conn.request("HEAD", path)
+                response = conn.getresponse()
+                assert response.status == 404, (path, response.status)
+                assert int(response.getheader("Content-Length")) > 0, path
+                response.read()
+            # Si un HEAD hubiera enviado cuerpo, esta respuesta empezaría con ese JSON
+            conn.request("GET", "/no-existe.html")
+            response = conn.getresponse()
+            assert response.status == 404, response.status
+            assert b"error" in response.read()
+            conn.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+def check_read_users_reports_missing_age():
+    """Un CSV con la edad vacía da un ValueError con la línea, no un error de array."""
+    from src.loaders.csv_loader import CSVLoader, read_users
+
+    with tempfile.TemporaryDirectory() as tmp:
+        loader = CSVLoader("usuarios.csv", compression=None, partition_by=None)
+        loader.load([_user("a@x.com", "U1"), _user("b@x.com", "U2")], tmp)
+        with open(loader.filepath, encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        header = lines[0].split(",")
+        cells = lines[2].split(",")
+        cells[header.index("age")] = ""
+        lines[2] = ",".join(cells)
+        with open(loader.filepath, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+        try:
+            read_users(loader.filepath)
+        except ValueError as e:
+            assert "línea 3" in str(e) and "'age'" in str(e), e
+        else:
+            raise AssertionError("read_users aceptó una edad vacía")
+
+
+def check_dashboard_api_sqlite_errors():
+    """La API responde 404 si la base de datos no tiene la tabla users y 503 si no se puede leer."""
+    import http.client
+    import threading
+    sys.path.insert(0, os.path.join(PROJECT_ROOT, "scripts_project"))
+    from serve_dashboard import make_server
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "usuarios.db")
+        server = make_server("127.0.0.1", 0, root=tmp, data_dir=tmp, quiet=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", server.server_address[1], timeout=5)
+
+            def status(path):
+                conn.request("GET", path)
+                response = conn.getresponse()
+                response.read()
+                return response.status
+
+            sqlite3.connect(db_path).execute("CREATE TABLE otra (x)").connection.close()
+            assert status("/api/users") == 404
+            assert status("/api/aggregates?country=Spain") == 404
+
+            with open(db_path, "wb") as f:
+                f.write(b"esto no es una base de datos SQLite" * 200)
+            assert status("/api/users?sort=age") == 503
+            assert status("/api/aggregates") == 503
+            conn.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+def check_dashboard_sort_columns_are_indexed():
+    """Las páginas del dashboard por cualquier columna de SORT_COLUMNS usan un índice, sin ordenar en memoria."""
+    sys.path.insert(0, os.path.join(PROJECT_ROOT, "scripts_project"))
+    from dashboard_queries import SORT_COLUMNS
+    from src.loaders.sql_loader import SQLLoader
+
+    with tempfile.TemporaryDirectory() as tmp:
+        SQLLoader("usuarios.db").load([u.to_dict() for u in _enriched_users(50)], tmp)
+        conn = sqlite3.connect(os.path.join(tmp, "usuarios.db"))
+        try:
+            for sort, column in SORT_COLUMNS.items():
+                if column == "rowid":
+                    continue
+                for direction, comparison in (("ASC", ">"), ("DESC", "<")):
+                    plan = conn.execute(
+                        f"EXPLAIN QUERY PLAN SELECT rowid, * FROM users WHERE ({column}, rowid) {comparison} (?, ?) "
+                        f"ORDER BY {column} {direction}, rowid {direction} LIMIT 51", ("x", 1)
+                    ).fetchall()
+                    details = " / ".join(row[-1] for row in plan)
+                    assert "TEMP B-TREE" not in details, (sort, direction, details)
+        finally:
+            conn.close()
+
+
+def check_resume_requires_seed():
+    """Sin seed no se reanuda: los checkpoints de ejecuciones sin seed no son de la misma ejecución."""
+    from src.controller.etl_controller import ETLController
+
+    controller = ETLController()
+    for options in ({"resume": True}, {"from_stage": "load"}):
+        try:
+            controller.run(n_users=10, seed=None, **options)
+        except ValueError as e:
+            assert "--seed" in str(e), e
+        else:
+            raise AssertionError(f"run({options}) sin seed no se rechazó")
+
+
+def main(names=None):
+    checks = {name: func for name, func in globals().items() if name.startswith("check_")}
+    selected = names or list(checks)
+    unknown = set(selected) - set(checks)
+    if unknown:
+        print(f"Checks desconocidos: {sorted(unknown)}")
+        return False
+
+    print_header("COMPROBACIONES DE REGRESIÓN")
+    failed = 0
+    for name in selected:
+        try:
+            checks[name]()
+            print(f"   ✓ {name}")
+        except Exception as e:
+            failed += 1
+            print(f"   ✗ {name}: {type(e).__name__}: {e}")
+    print(f"\n   {len(selected) - failed}/{len(selected)} comprobaciones correctas")
+    return failed == 0
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main(sys.argv[1:]) else 1)
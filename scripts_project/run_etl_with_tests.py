@@ -86,6 +86,13 @@ def verify_sqlite():
             for col in columns:
                 print(f"   - {col[1]} ({col[2]})")
         
+        # Si el loader generó las tablas de resumen, las consultas de
+        # agregados se resuelven en O(grupos) en lugar de recorrer users
+        table_names = {t[0] for t in tables}
+        has_summaries = {"users_by_country_gender", "users_age_histogram"} <= table_names
+        if has_summaries:
+            print("\n   ✓ Usando tablas de resumen para los agregados")
+
         # 3. Contar total de usuarios
         print("\n3. Verificando datos:")
         cursor.execute("SELECT COUNT(*) FROM users")
@@ -99,7 +106,10 @@ def verify_sqlite():
         
         # 4. Verificar distribución por género
         print("\n4. Verificando distribución por género:")
-        cursor.execute("SELECT gender, COUNT(*) as count FROM users GROUP BY gender")
+        if has_summaries:
+            cursor.execute("SELECT gender, SUM(n) as count FROM users_by_country_gender GROUP BY gender")
+        else:
+            cursor.execute("SELECT gender, COUNT(*) as count FROM users GROUP BY gender")
         gender_dist = cursor.fetchall()
         
         for gender, count in gender_dist:
@@ -107,9 +117,10 @@ def verify_sqlite():
         
         # 5. Top 5 países
         print("\n5. Top 5 países más representados:")
-        cursor.execute("""
-            SELECT country, COUNT(*) as count 
-            FROM users 
+        source = "(SELECT country, n FROM users_by_country_gender)" if has_summaries else "(SELECT country, 1 AS n FROM users)"
+        cursor.execute(f"""
+            SELECT country, SUM(n) as count 
+            FROM {source}
             GROUP BY country 
             ORDER BY count DESC 
             LIMIT 5
@@ -121,12 +132,13 @@ def verify_sqlite():
         
         # 6. Estadísticas de edad
         print("\n6. Estadísticas de edad:")
-        cursor.execute("""
+        source = "users_age_histogram" if has_summaries else "(SELECT age, 1 AS n FROM users)"
+        cursor.execute(f"""
             SELECT 
                 MIN(age) as min_age,
                 MAX(age) as max_age,
-                CAST(AVG(age) AS FLOAT) as avg_age
-            FROM users
+                CAST(SUM(age * n) AS FLOAT) / SUM(n) as avg_age
+            FROM {source}
         """)
         stats = cursor.fetchone()
         
@@ -139,7 +151,7 @@ def verify_sqlite():
         
         # 7. Ejemplo de consulta compleja
         print("\n7. Ejecutando consulta compleja (rangos de edad):")
-        cursor.execute("""
+        cursor.execute(f"""
             SELECT 
                 CASE 
                     WHEN age < 18 THEN 'Menores'
@@ -151,8 +163,8 @@ def verify_sqlite():
                     WHEN age < 75 THEN '65-74'
                     ELSE '75+'
                 END as age_range,
-                COUNT(*) as count
-            FROM users
+                SUM(n) as count
+            FROM {source}
             GROUP BY age_range
             ORDER BY 
                 CASE age_range
@@ -1,53 +1,428 @@
 """
-Servidor HTTP simple para servir el dashboard HTML.
+Servidor HTTP para servir el dashboard HTML.
 Permite visualizar el dashboard en el navegador con las imágenes y datos.
+
+Pensado para que muchos usuarios vean el dashboard a la vez:
+
+- Un hilo por conexión (ThreadingHTTPServer) y conexiones persistentes
+  (HTTP/1.1 keep-alive): un cliente lento no bloquea al resto.
+- Caché de archivos en memoria que se invalida cuando cambia el mtime o el
+  tamaño del archivo; los textos (HTML, JSON, SVG, CSV...) se comprimen con
+  gzip una sola vez, al entrar en la caché.
+- ETag y Last-Modified en todas las respuestas: el navegador revalida y
+  recibe 304 sin cuerpo si nada ha cambiado.
+- API JSON sobre la base de datos SQLite del ETL (ver dashboard_queries.py):
+    /api/stats                                   resumen del dashboard (como stats.json)
+    /api/users?country=Spain&sort=age&limit=50   página de usuarios filtrada y ordenada;
+                                                 la siguiente con &cursor=<next_cursor>
+    /api/aggregates?country=Spain&gender=female  total, edades, géneros, países y
+                                                 regiones del filtro
+  Responden 400 si los parámetros no son válidos, 404 si todavía no hay
+  datos y 503 si la base de datos no se puede leer (p. ej. bloqueada).
+
+Uso:
+    python scripts_project/serve_dashboard.py [--host 0.0.0.0] [--port 8000] [--no-browser]
 """
-import http.server
-import socketserver
+import argparse
+import gzip
+import hashlib
+import json
+import mimetypes
 import os
+import sqlite3
+import sys
+import threading
 import webbrowser
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
+from urllib.parse import parse_qs, unquote, urlsplit
+
+PROJECT_ROOT = Path(__file__).parent.parent.absolute()
+sys.path.insert(0, str(PROJECT_ROOT))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.config import (DASHBOARD_CACHE_BYTES, DASHBOARD_HOST, DASHBOARD_PORT, DATA_DIR,
+                        SQLITE_FILENAME, STATS_FILENAME, project_path)
+from dashboard_queries import QueryError, UserQueries
+
+PORT = DASHBOARD_PORT
+
+# Tipos que se comprimen con gzip (las imágenes PNG ya van comprimidas)
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "image/svg+xml")
+# Por debajo de este tamaño gzip no compensa
+MIN_GZIP_BYTES = 1024
+# Archivos más grandes no entran en la caché: se envían desde disco
+MAX_CACHED_FILE_BYTES = 16 * 2 ** 20
+
+mimetypes.add_type("image/svg+xml", ".svg")
+mimetypes.add_type("application/javascript", ".js")
+
+
+class CachedFile:
+    """Contenido de un archivo listo para servir (y su versión comprimida)."""
+
+    __slots__ = ("version", "body", "gzip_body", "content_type", "etag", "last_modified")
+
+    def __init__(self, path: str, version: tuple, content_type: str):
+        with open(path, "rb") as f:
+            self.body = f.read()
+        self.version = version
+        self.content_type = content_type
+        self.etag = '"%x-%x"' % version
+        self.last_modified = formatdate(version[0] / 1e9, usegmt=True)
+        self.gzip_body = None
+        if content_type.startswith(COMPRESSIBLE_TYPES) and len(self.body) >= MIN_GZIP_BYTES:
+            compressed = gzip.compress(self.body, compresslevel=6, mtime=0)
+            if len(compressed) < len(self.body):
+                self.gzip_body = compressed
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + len(self.gzip_body or b"")
+
+
+class FileCache:
+    """
+    Caché LRU de archivos en memoria, limitada a `max_bytes`.
+
+    Cada acceso comprueba el mtime y el tamaño con os.stat (barato): si el
+    ETL ha reescrito el archivo, se vuelve a leer.
+    """
+
+    def __init__(self, max_bytes: int = DASHBOARD_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+
+    def get(self, path: str, stat: os.stat_result):
+        """Entrada de `path` (leída de disco si no está o ha cambiado), o None si es demasiado grande."""
+        version = (stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is not None and entry.version == version:
+                self.entries.move_to_end(path)
+                return entry
+        if stat.st_size > MAX_CACHED_FILE_BYTES:
+            return None
+
+        content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        entry = CachedFile(path, version, content_type)
+        with self.lock:
+            old = self.entries.pop(path, None)
+            if old is not None:
+                self.total_bytes -= old.size
+            self.entries[path] = entry
+            self.total_bytes += entry.size
+            while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+                _, evicted = self.entries.popitem(last=False)
+                self.total_bytes -= evicted.size
+        return entry
+
+
+class StatsAPI:
+    """
+    Datos de la API leídos de la base de datos SQLite del ETL.
+
+    /api/stats se calcula desde las tablas de resumen (no recorre users) y se
+    guarda hasta que cambia la base de datos.
+    """
+
+    def __init__(self, data_dir: str):
+        self.data_dir = data_dir
+        self.db_path = os.path.join(data_dir, SQLITE_FILENAME)
+        self._stats = None
+        self._stats_version = None
+        self.lock = threading.Lock()
+
+    def db_version(self):
+        """(mtime, tamaño) de la base de datos, o None si no existe."""
+        try:
+            stat = os.stat(self.db_path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def connect(self) -> sqlite3.Connection:
+        """Conexión de solo lectura (una por petición: sqlite3 no se comparte entre hilos)."""
+        conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def stats(self):
+        """Resumen del dashboard, o None si todavía no hay base de datos."""
+        version = self.db_version()
+        if version is None:
+            return self._stats_file()
+        with self.lock:
+            if self._stats_version != version:
+                # Importación diferida: el servidor arranca sin cargar el pipeline
+                from src.controller.etl_controller import dashboard_stats
+                from src.loaders.sql_loader import SQLLoader
+                from src.services.transformer_service import StatsAccumulator
+
+                view = SQLLoader(SQLITE_FILENAME).read_aggregates(self.data_dir)
+                if view is None:
+                    return self._stats_file()
+                self._stats = dashboard_stats(StatsAccumulator().merge(view).result(), view)
+                self._stats_version = version
+            return self._stats
+
+    def _stats_file(self):
+        """stats.json tal cual, para instalaciones sin base de datos."""
+        try:
+            with open(os.path.join(self.data_dir, STATS_FILENAME), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
 
-PORT = 8000
+class ETLHandler(BaseHTTPRequestHandler):
+    """Handler con CORS, caché, ETag/304, gzip y la API JSON."""
+
+    protocol_version = "HTTP/1.1"
+    # Conexiones keep-alive inactivas se cierran tras este tiempo (segundos)
+    timeout = 30
+
+    root = str(PROJECT_ROOT)
+    cache = None
+    api = None
+    queries = None
+    quiet = False
 
-class ETLHandler(http.server.SimpleHTTPRequestHandler):
-    """Handler personalizado para servir archivos con CORS habilitado."""
-    
     def end_headers(self):
         # Habilitar CORS para permitir cargar recursos locales
         self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
+        self.send_header('Access-Control-Allow-Methods', 'GET, HEAD, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', '*')
         super().end_headers()
-    
+
     def log_message(self, format, *args):
         """Personalizar los mensajes de log."""
-        print(f"[SERVIDOR] {args[0]}")
+        if not self.quiet:
+            print(f"[SERVIDOR] {args[0]}")
+
+    # ----------------------------
+    # RUTAS
+    # ----------------------------
+    def do_GET(self):
+        self._dispatch(send_body=True)
+
+    def do_HEAD(self):
+        self._dispatch(send_body=False)
+
+    def do_OPTIONS(self):
+        self.send_response(HTTPStatus.NO_CONTENT)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _dispatch(self, send_body: bool):
+        url = urlsplit(self.path)
+        path = unquote(url.path)
+        if path in ("/", "/dashboard", "/dashboard/"):
+            self.send_response(HTTPStatus.FOUND)
+            self.send_header("Location", "/dashboard/dashboard.html")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        elif path == "/api/stats":
+            self._api_stats(send_body)
+        elif path in ("/api/users", "/api/aggregates"):
+            self._api_query(path, parse_qs(url.query), send_body)
+        else:
+            self._static(path, send_body)
+
+    # ----------------------------
+    # ARCHIVOS ESTÁTICOS
+    # ----------------------------
+    def _static(self, path: str, send_body: bool):
+        filepath = os.path.realpath(os.path.join(self.root, path.lstrip("/")))
+        # Solo archivos dentro de la raíz del proyecto
+        if not filepath.startswith(self.root + os.sep):
+            return self._error(HTTPStatus.FORBIDDEN, "Ruta no permitida")
+        try:
+            stat = os.stat(filepath)
+        except OSError:
+            return self._error(HTTPStatus.NOT_FOUND, "No encontrado")
+        if not os.path.isfile(filepath):
+            return self._error(HTTPStatus.NOT_FOUND, "No encontrado")
+
+        entry = self.cache.get(filepath, stat)
+        if entry is None:
+            return self._stream_file(filepath, stat, send_body)
+        if self._not_modified(entry.etag, stat.st_mtime):
+            return
+        body = entry.body
+        use_gzip = entry.gzip_body is not None and self._accepts_gzip()
+        if use_gzip:
+            body = entry.gzip_body
+        self._send(HTTPStatus.OK, body, entry.content_type, entry.etag, entry.last_modified,
+                   gzipped=use_gzip, vary=entry.gzip_body is not None, send_body=send_body)
+
+    def _stream_file(self, filepath: str, stat: os.stat_result, send_body: bool):
+        """Archivos grandes (p. ej. el CSV completo): directamente desde disco, por bloques."""
+        etag = '"%x-%x"' % (stat.st_mtime_ns, stat.st_size)
+        if self._not_modified(etag, stat.st_mtime):
+            return
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", mimetypes.guess_type(filepath)[0] or "application/octet-stream")
+        self.send_header("Content-Length", str(stat.st_size))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", formatdate(stat.st_mtime, usegmt=True))
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        if send_body:
+            with open(filepath, "rb") as f:
+                while True:
+                    chunk = f.read(1 << 20)
+                    if not chunk:
+                        break
+                    self.wfile.write(chunk)
+
+    # ----------------------------
+    # API
+    # ----------------------------
+    def _api_stats(self, send_body: bool):
+        stats = self.api.stats()
+        if stats is None:
+            return self._error(HTTPStatus.NOT_FOUND, "Todavía no hay datos: ejecuta el ETL")
+        self._send_json(stats, send_body)
+
+    def _api_query(self, path: str, query: dict, send_body: bool):
+        if self.queries.version() is None:
+            return self._error(HTTPStatus.NOT_FOUND, "Todavía no hay base de datos: ejecuta el ETL")
+        params = {name: values[0] for name, values in query.items()}
+        try:
+            if path == "/api/users":
+                result = self.queries.page(params)
+            else:
+                result = self.queries.aggregates(params)
+        except QueryError as e:
+            return self._error(HTTPStatus.BAD_REQUEST, str(e))
+        except sqlite3.Error as e:
+            # Base de datos creada pero sin datos todavía (p. ej. primera carga en curso)
+            if "no such table" in str(e):
+                return self._error(HTTPStatus.NOT_FOUND, "Todavía no hay datos: ejecuta el ETL")
+            # Bloqueada, a mitad de escritura o dañada: se puede reintentar más tarde
+            self.log_error("%s", f"Error de SQLite en {path}: {e}")
+            return self._error(HTTPStatus.SERVICE_UNAVAILABLE, "Base de datos no disponible, reinténtalo")
+        self._send_json(result, send_body)
+
+    def _send_json(self, data, send_body: bool):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()[:20]
+        if self._not_modified(etag):
+            return
+        use_gzip = len(body) >= MIN_GZIP_BYTES and self._accepts_gzip()
+        if use_gzip:
+            body = gzip.compress(body, compresslevel=6, mtime=0)
+        self._send(HTTPStatus.OK, body, "application/json; charset=utf-8", etag,
+                   gzipped=use_gzip, vary=True, send_body=send_body)
+
+    # ----------------------------
+    # UTILIDADES HTTP
+    # ----------------------------
+    def _accepts_gzip(self) -> bool:
+        return "gzip" in self.headers.get("Accept-Encoding", "")
+
+    def _not_modified(self, etag: str, mtime: float = None) -> bool:
+        """Responde 304 si el cliente ya tiene esta versión (If-None-Match / If-Modified-Since)."""
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match is not None:
+            fresh = etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*"
+        elif mtime is not None and self.headers.get("If-Modified-Since"):
+            try:
+                fresh = int(mtime) <= parsedate_to_datetime(self.headers["If-Modified-Since"]).timestamp()
+            except (TypeError, ValueError):
+                fresh = False
+        else:
+            fresh = False
+        if fresh:
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+        return fresh
+
+    def _send(self, status, body: bytes, content_type: str, etag: str = None, last_modified: str = None,
+              gzipped: bool = False, vary: bool = False, send_body: bool = True):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        # no-cache: el navegador guarda la respuesta pero revalida (304) en cada uso
+        self.send_header("Cache-Control", "no-cache")
+        if etag:
+            self.send_header("ETag", etag)
+        if last_modified:
+            self.send_header("Last-Modified", last_modified)
+        if gzipped:
+            self.send_header("Content-Encoding", "gzip")
+        if vary:
+            self.send_header("Vary", "Accept-Encoding")
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def _error(self, status, message: str):
+        body = json.dumps({"error": message}, ensure_ascii=False).encode("utf-8")
+        # HEAD: mismas cabeceras (Content-Length incluido), sin cuerpo
+        self._send(status, body, "application/json; charset=utf-8", send_body=self.command != "HEAD")
+
+
+class DashboardServer(ThreadingHTTPServer):
+    """Servidor con un hilo por conexión; los hilos no impiden cerrar el proceso."""
+
+    daemon_threads = True
+    request_queue_size = 128
+
+
+def make_server(host: str = "", port: int = PORT, root: str = None, data_dir: str = None,
+                quiet: bool = False) -> DashboardServer:
+    """Crea el servidor (sin arrancarlo) con su caché y su API."""
+    root = os.path.realpath(root or PROJECT_ROOT)
+    data_dir = data_dir or project_path(DATA_DIR)
+    handler = type("DashboardHandler", (ETLHandler,), {
+        "root": root,
+        "cache": FileCache(),
+        "api": StatsAPI(data_dir),
+        "queries": UserQueries(os.path.join(data_dir, SQLITE_FILENAME)),
+        "quiet": quiet,
+    })
+    return DashboardServer((host, port), handler)
+
 
 def main():
     """Inicia el servidor HTTP para el dashboard."""
-    # Cambiar al directorio raíz del proyecto (subir dos niveles desde scripts_project)
-    project_root = Path(__file__).parent.parent.absolute()
-    os.chdir(project_root)
-    
-    with socketserver.TCPServer(("", PORT), ETLHandler) as httpd:
+    parser = argparse.ArgumentParser(description="Servidor del dashboard ETL")
+    parser.add_argument("--host", default="", help="Interfaz de escucha (por defecto, todas)")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--no-browser", action="store_true", help="No abrir el navegador")
+    parser.add_argument("--quiet", action="store_true", help="No mostrar cada petición")
+    args = parser.parse_args()
+
+    url = f"http://{DASHBOARD_HOST}:{args.port}/dashboard/dashboard.html"
+    with make_server(args.host, args.port, quiet=args.quiet) as httpd:
         print("=" * 70)
         print(" SERVIDOR DASHBOARD ETL")
         print("=" * 70)
-        print(f"\n✓ Servidor iniciado en puerto {PORT}")
-        print(f"✓ Directorio raíz: {project_root}")
-        print(f"\n🌐 Abriendo dashboard en el navegador...")
-        print(f"\n📍 URL: http://localhost:{PORT}/dashboard/dashboard.html")
+        print(f"\n✓ Servidor iniciado en puerto {args.port} (un hilo por conexión)")
+        print(f"✓ Directorio raíz: {PROJECT_ROOT}")
+        print(f"✓ API: http://{DASHBOARD_HOST}:{args.port}/api/stats, /api/users y /api/aggregates")
+        print(f"\n📍 URL: {url}")
         print("\n⚠ Presiona Ctrl+C para detener el servidor")
         print("=" * 70 + "\n")
-        
+
         # Abrir el navegador automáticamente
-        try:
-            webbrowser.open(f'http://localhost:{PORT}/dashboard/dashboard.html')
-        except:
-            print("⚠ No se pudo abrir el navegador automáticamente.")
-            print("   Abre manualmente: http://localhost:8000/dashboard/dashboard.html")
-        
+        if not args.no_browser:
+            print(f"🌐 Abriendo dashboard en el navegador...")
+            try:
+                webbrowser.open(url)
+            except Exception:
+                print("⚠ No se pudo abrir el navegador automáticamente.")
+                print(f"   Abre manualmente: {url}")
+
         try:
             httpd.serve_forever()
         except KeyboardInterrupt:
@@ -55,4 +430,3 @@ def main():
 
 if __name__ == "__main__":
     main()
-
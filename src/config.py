@@ -3,8 +3,22 @@ config.py
 ---------
 Configuración centralizada del proyecto ETL.
 Contiene todas las URLs, parámetros y constantes.
+
+Los valores de este módulo son los de por defecto. Se pueden sustituir sin
+tocar el código, en este orden de prioridad (de menor a mayor):
+
+1. Un perfil TOML: variable de entorno ETL_PROFILE con el nombre de un
+   perfil de profiles/ (p. ej. "large") o la ruta de un archivo .toml.
+2. Variables de entorno ETL_<NOMBRE>, p. ej. ETL_DEFAULT_N_USERS=50000.
+3. Argumentos de la línea de comandos (src/main.py), que llaman a `configure`.
+
+Los cambios deben aplicarse antes de importar el resto de módulos de src,
+que leen estos valores al importarse.
 """
 
+import ast
+import os
+
 # ==============================================================================
 # URLs DE APIs
 # ==============================================================================
@@ -29,9 +43,66 @@ MAX_USERS_PER_REQUEST = 5000
 # Semilla para reproducibilidad (opcional)
 DEFAULT_SEED = None
 
+# Procesar página a página (memoria constante) en lugar de todo en memoria
+DEFAULT_STREAM = False
+
+# Usuarios por petición a RandomUser (como mucho MAX_USERS_PER_REQUEST);
+# en modo streaming es también el tamaño de cada lote
+EXTRACTION_PAGE_SIZE = MAX_USERS_PER_REQUEST
+
 # Timeout para peticiones HTTP (segundos)
 API_TIMEOUT = 30
 
+# Número máximo de páginas que se descargan en paralelo
+EXTRACTION_MAX_WORKERS = 8
+
+# Reintentos por página ante errores de red o HTTP 5xx/429
+API_MAX_RETRIES = 3
+
+# Espera base (segundos) entre reintentos; se duplica en cada intento
+API_RETRY_BACKOFF = 1.0
+
+# Decodificador JSON de las respuestas de RandomUser:
+#   "auto"   -> orjson si está instalado; si no, ijson (con backend en C) o json
+#   "orjson" -> el más rápido (pip install orjson)
+#   "ijson"  -> lee `results` registro a registro sin construir la respuesta
+#               entera en memoria (pip install ijson)
+#   "json"   -> biblioteca estándar
+JSON_BACKEND = "auto"
+
+# ==============================================================================
+# CACHÉ DE RESPUESTAS (RANDOMUSER)
+# ==============================================================================
+# Las respuestas de RandomUser pedidas con seed se guardan en disco, indexadas
+# por URL (results, page y seed), y se reutilizan en las siguientes ejecuciones:
+#   "off"       -> siempre se descarga
+#   "readwrite" -> se usa lo guardado y se guardan las páginas nuevas
+#   "replay"    -> sin red: los usuarios salen solo del almacén (requiere seed;
+#                  con COUNTRY_CACHE_OFFLINE = True tampoco se consulta RestCountries)
+RESPONSE_CACHE = "readwrite"
+
+# Directorio del almacén (None = <CACHE_DIR>/responses)
+RESPONSE_CACHE_DIR = None
+
+# ==============================================================================
+# CACHÉ DE PAÍSES (RESTCOUNTRIES)
+# ==============================================================================
+
+# Validez de una entrada de país en caché (segundos): 30 días
+COUNTRY_CACHE_TTL = 30 * 24 * 3600
+
+# Validez de una respuesta 404 en caché (segundos): 1 día
+COUNTRY_CACHE_NEGATIVE_TTL = 24 * 3600
+
+# Modo offline: usar solo la caché, sin peticiones a RestCountries
+COUNTRY_CACHE_OFFLINE = False
+
+# Consultas simultáneas a RestCountries
+COUNTRY_LOOKUP_WORKERS = 8
+
+# Plazo por petición a RestCountries (segundos): (conexión, lectura)
+COUNTRY_API_TIMEOUT = (3.05, 10)
+
 # ==============================================================================
 # ARCHIVOS Y DIRECTORIOS
 # ==============================================================================
@@ -40,11 +111,72 @@ API_TIMEOUT = 30
 CSV_FILENAME = "usuarios.csv"
 SQLITE_FILENAME = "usuarios.db"
 STATS_FILENAME = "stats.json"
+COUNTRY_CACHE_FILENAME = "country_cache.db"
+
+# Raíz del proyecto (carpeta que contiene src/)
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
-# Directorios relativos desde la raíz del proyecto
+# Directorios relativos desde la raíz del proyecto (o rutas absolutas).
+# El dashboard lee data/stats.json y plots/: si se cambian, se sirve solo la API
 DATA_DIR = "data"
 PLOTS_DIR = "plots"
 DASHBOARD_DIR = "dashboard"
+CACHE_DIR = "cache"
+
+# Perfiles de configuración (archivos <nombre>.toml)
+PROFILES_DIR = "profiles"
+
+# Salidas activas: "csv", "sqlite" y "columnar" (Parquet/Arrow, requiere pyarrow)
+LOADERS = ("csv", "sqlite", "columnar")
+
+# Filas que se convierten a dict y se pasan juntas a los loaders en modo por
+# lotes (solo hay un bloque de dicts en memoria a la vez)
+LOAD_CHUNK_SIZE = 10000
+
+# ==============================================================================
+# PARÁMETROS DE CARGA (CSV)
+# ==============================================================================
+
+# Tamaño del búfer de escritura (bytes): se escribe al disco en bloques grandes
+CSV_BUFFER_SIZE = 1 << 20
+
+# Compresión al vuelo: None, "gzip" (.gz) o "zstd" (.zst, requiere zstandard)
+CSV_COMPRESSION = None
+
+# Partición en varios archivos: None, "country" o "run_date"
+# (data/usuarios/country=Spain/usuarios.csv, data/usuarios/run_date=2025-01-31/...)
+CSV_PARTITION_BY = None
+
+# ==============================================================================
+# PARÁMETROS DE CARGA (SQLITE)
+# ==============================================================================
+
+# Filas por llamada a executemany
+SQL_CHUNK_SIZE = 10000
+
+# Carga rápida: journal_mode=WAL y synchronous=OFF durante la carga
+# (más rápido, pero un corte de luz a mitad de carga puede dejar la BD inconsistente)
+SQL_FAST_LOAD = True
+
+# Modo de carga: "upsert" (incremental: inserta nuevos y actualiza solo los
+# que han cambiado, clave natural login.uuid o email) o "replace" (vacía la
+# tabla y la vuelve a cargar)
+SQL_LOAD_MODE = "upsert"
+
+# ==============================================================================
+# PARÁMETROS DE CARGA (COLUMNAR: PARQUET / ARROW)
+# ==============================================================================
+# Requiere pyarrow (opcional): si no está instalado no se genera este archivo
+
+# Formato: "parquet" (comprimido, para análisis) o "arrow" (Arrow IPC; sin
+# compresión se lee directamente desde el memory-map, sin copias)
+COLUMNAR_FORMAT = "parquet"
+
+# Filas por row group: unidad mínima de lectura y de compresión
+COLUMNAR_ROW_GROUP_SIZE = 65536
+
+# Códec de compresión ("zstd", "snappy", "lz4"...; None = sin compresión)
+COLUMNAR_COMPRESSION = "zstd"
 
 # ==============================================================================
 # PARÁMETROS DE TRANSFORMACIÓN
@@ -71,6 +203,19 @@ POPULAR_EMAIL_DOMAINS = [
 # Coeficiente IQR para detección de outliers
 OUTLIER_IQR_COEFFICIENT = 1.5
 
+# Backend de estadísticas en modo streaming:
+#   "exact"  -> contadores exactos (memoria proporcional a países/dominios distintos)
+#   "sketch" -> sketches combinables de memoria constante (KLL, Space-Saving,
+#               Count-Min) con cotas de error publicadas en stats.json; los
+#               gráficos por país solo incluyen los países del top-k
+STATS_BACKEND = "exact"
+
+# Tamaño de los sketches
+SKETCH_KLL_K = 200
+SKETCH_TOPK_CAPACITY = 100
+SKETCH_CMS_WIDTH = 2048
+SKETCH_CMS_DEPTH = 5
+
 # ==============================================================================
 # PARÁMETROS DE VISUALIZACIÓN
 # ==============================================================================
@@ -88,6 +233,74 @@ PLOT_FIGSIZE = {
 # Color principal para gráficos
 PLOT_COLOR = "#1f77b4"
 
+# Formatos de salida por defecto: PNG para descarga y SVG (ligero y nítido)
+# para el dashboard
+PLOT_FORMATS = ("png", "svg")
+
+# Ajustes por gráfico (DPI y formatos); lo que no se indique usa PLOT_DPI y
+# PLOT_FORMATS. Ejemplo: {"matriz_correlacion": {"dpi": 150, "formats": ("png",)}}
+PLOT_SETTINGS = {}
+
+# Procesos para renderizar los gráficos en paralelo (None = núcleos disponibles)
+PLOT_WORKERS = None
+
+# Gráficos a generar por nombre (p. ej. ("top_paises", "distribucion_edades"));
+# None = todos, () = ninguno
+PLOT_CHARTS = None
+
+# Reutilizar un gráfico si sus datos y ajustes no han cambiado desde la última
+# ejecución (se guarda un hash junto a cada gráfico, en <nombre>.hash)
+PLOT_SKIP_UNCHANGED = True
+
+# ==============================================================================
+# CHECKPOINTS
+# ==============================================================================
+# El pipeline por lotes guarda el resultado de extracción y transformación en
+# <CACHE_DIR>/checkpoints/<clave de la ejecución>/: `run --resume` continúa
+# desde la última etapa completada y `run --from-stage load` recarga sin
+# volver a llamar a las APIs
+
+# Guardar checkpoints de cada etapa (leerlos con --resume/--from-stage
+# funciona aunque esté desactivado)
+CHECKPOINTS = True
+
+# ==============================================================================
+# MÉTRICAS DE EJECUCIÓN
+# ==============================================================================
+# Cada ejecución guarda en data/metrics.json la duración, filas y memoria de
+# cada etapa
+
+# Medir el pico de memoria Python de cada etapa con tracemalloc
+# (preciso, pero ralentiza bastante el proceso; el pico de RSS se mide siempre)
+METRICS_TRACE_MEMORY = False
+
+# Escribir también data/metrics.prom en formato de texto de Prometheus
+METRICS_PROMETHEUS = False
+
+# Etapa a perfilar con cProfile (p. ej. "country_enrichment" o "load:SQLLoader");
+# genera data/profile_<etapa>.prof (p. ej. profile_load_SQLLoader.prof) y un
+# resumen en .txt. None = desactivado
+METRICS_PROFILE_STAGE = None
+
+# ==============================================================================
+# LOGGING
+# ==============================================================================
+
+# Archivo de log (directorio relativo a la raíz del proyecto)
+LOG_DIR = "logs"
+LOG_FILENAME = "etl.log"
+
+# Nivel mínimo: "DEBUG", "INFO", "WARNING"...
+LOG_LEVEL = "INFO"
+
+# Formato del archivo: "text" o "json" (una línea JSON por registro, con los
+# campos de `extra=`); la consola siempre usa texto
+LOG_FORMAT = "text"
+
+# Escritura en un hilo aparte (QueueHandler + QueueListener): registrar un
+# mensaje solo lo encola. False = escritura directa
+LOG_ASYNC = True
+
 # ==============================================================================
 # PARÁMETROS DEL DASHBOARD
 # ==============================================================================
@@ -101,6 +314,9 @@ DASHBOARD_HOST = "localhost"
 # URL completa del dashboard
 DASHBOARD_URL = f"http://{DASHBOARD_HOST}:{DASHBOARD_PORT}/dashboard/dashboard.html"
 
+# Memoria máxima de la caché de archivos del servidor (bytes)
+DASHBOARD_CACHE_BYTES = 128 * 2 ** 20
+
 # ==============================================================================
 # TOP N PARA ESTADÍSTICAS
 # ==============================================================================
@@ -112,13 +328,19 @@ TOP_EMAIL_DOMAINS_COUNT = 5
 # FUNCIONES AUXILIARES
 # ==============================================================================
 
-def build_randomuser_url(n_users: int = None, seed: str = None) -> str:
+def project_path(path: str) -> str:
+    """Ruta absoluta de `path`, relativa a la raíz del proyecto si no es absoluta."""
+    return path if os.path.isabs(path) else os.path.join(PROJECT_ROOT, path)
+
+
+def build_randomuser_url(n_users: int = None, seed: str = None, page: int = None) -> str:
     """
     Construye la URL completa para la API RandomUser.
     
     Args:
         n_users: Número de usuarios a extraer
         seed: Semilla para reproducibilidad
+        page: Número de página (1..N); junto con seed hace reproducible cada página
         
     Returns:
         URL completa con parámetros
@@ -126,6 +348,9 @@ def build_randomuser_url(n_users: int = None, seed: str = None) -> str:
     n_users = n_users or DEFAULT_N_USERS
     url = f"{RANDOMUSER_API_URL}?results={n_users}"
     
+    if page:
+        url += f"&page={page}"
+
     if seed:
         url += f"&seed={seed}"
     
@@ -142,4 +367,150 @@ def build_restcountries_url(country: str) -> str:
     Returns:
         URL completa con parámetros
     """
-    return f"https://restcountries.com/v3.1/name/{country}?{RESTCOUNTRIES_FIELDS}"
+    return f"{RESTCOUNTRIES_API_URL.format(country=country)}?{RESTCOUNTRIES_FIELDS}"
+
+
+# ==============================================================================
+# PERFILES Y SUSTITUCIONES
+# ==============================================================================
+
+# Perfil aplicado (nombre o ruta), para dejarlo en las métricas de la ejecución
+ACTIVE_PROFILE = None
+
+# Prefijo de las variables de entorno que sustituyen valores de este módulo
+ENV_PREFIX = "ETL_"
+
+# Tipo de las opciones cuyo valor por defecto es None (el resto toma el tipo
+# de su valor por defecto)
+_OPTIONAL_TYPES = {
+    "DEFAULT_SEED": str,
+    "RESPONSE_CACHE_DIR": str,
+    "CSV_COMPRESSION": str,
+    "CSV_PARTITION_BY": str,
+    "PLOT_WORKERS": int,
+    "PLOT_CHARTS": tuple,
+    "METRICS_PROFILE_STAGE": str,
+}
+
+
+def settings() -> dict:
+    """Valores configurables: las constantes en mayúsculas de este módulo."""
+    return {name: value for name, value in globals().items()
+            if name.isupper() and not name.startswith("_")
+            and name not in ("ACTIVE_PROFILE", "ENV_PREFIX", "PROJECT_ROOT")}
+
+
+def _coerce(name: str, value):
+    """
+    Adapta `value` al tipo de `name` (el de su valor por defecto, no el
+    actual: un perfil no cambia cómo se interpretan las sustituciones
+    posteriores). Los textos solo se evalúan como literales de Python en las
+    opciones de tipo tupla, lista o diccionario.
+    """
+    # TOML no tiene null: "none" deja el valor a None
+    if isinstance(value, str) and value.lower() == "none":
+        return None
+    kind = _SETTING_TYPES[name]
+    if kind is bool:
+        if isinstance(value, str):
+            return value.strip().lower() in ("1", "true", "yes", "si", "sí", "on")
+        return bool(value)
+    if kind in (int, float) and isinstance(value, str):
+        return kind(value)
+    if kind is str and not isinstance(value, str):
+        # p. ej. `default_seed = 42` en un perfil: la semilla es el texto "42"
+        return str(value)
+    if kind in (tuple, list, dict):
+        if isinstance(value, str):
+            try:
+                parsed = ast.literal_eval(value)
+            except (ValueError, SyntaxError):
+                parsed = None
+            # Texto sin comillas: un valor simple o una lista separada por comas
+            value = parsed if isinstance(parsed, (tuple, list, dict)) else [
+                v.strip() for v in value.split(",") if v.strip()]
+        if isinstance(value, list) and kind is tuple:
+            return tuple(value)
+    return value
+
+
+def apply_settings(values: dict) -> None:
+    """
+    Sustituye valores de configuración. Los nombres no distinguen mayúsculas
+    y los desconocidos producen ValueError (para no ignorar erratas).
+    """
+    known = settings()
+    for key, value in values.items():
+        name = key.upper()
+        if name not in known:
+            raise ValueError(f"Opción de configuración desconocida: {key!r}")
+        globals()[name] = _coerce(name, value)
+    if {"DASHBOARD_HOST", "DASHBOARD_PORT"} & {key.upper() for key in values}:
+        globals()["DASHBOARD_URL"] = f"http://{DASHBOARD_HOST}:{DASHBOARD_PORT}/dashboard/dashboard.html"
+
+
+def load_profile(profile: str) -> dict:
+    """
+    Lee un perfil TOML: `profile` es un nombre de profiles/ (sin .toml) o una
+    ruta. Las tablas ([extraccion], [graficos]...) solo agrupan: sus claves se
+    aplanan.
+    """
+    try:
+        import tomllib
+    except ImportError:  # Python < 3.11
+        try:
+            import tomli as tomllib
+        except ImportError:
+            raise ImportError("Leer perfiles TOML requiere Python 3.11+ o tomli (pip install tomli)")
+
+    path = profile if profile.endswith(".toml") else os.path.join(project_path(PROFILES_DIR), f"{profile}.toml")
+    with open(path, "rb") as f:
+        data = tomllib.load(f)
+    values = {}
+    for key, value in data.items():
+        if isinstance(value, dict) and key.upper() not in settings():
+            values.update(value)
+        else:
+            values[key] = value
+    return values
+
+
+def configure(profile: str = None, overrides: dict = None) -> None:
+    """
+    Aplica un perfil y después `overrides` (los argumentos de la CLI).
+    Debe llamarse antes de importar el controlador o los servicios.
+
+    Las variables ETL_<NOMBRE> se vuelven a aplicar después del perfil para
+    respetar el orden config.py < perfil < variables ETL_<NOMBRE> < argumentos.
+    """
+    global ACTIVE_PROFILE
+    if profile:
+        apply_settings(load_profile(profile))
+        ACTIVE_PROFILE = profile
+        apply_settings(_environment_overrides())
+    apply_settings({name: value for name, value in (overrides or {}).items() if value is not None})
+
+
+def _environment_overrides() -> dict:
+    """Valores ETL_<NOMBRE> del entorno que corresponden a opciones conocidas."""
+    known = settings()
+    return {
+        key[len(ENV_PREFIX):]: value for key, value in os.environ.items()
+        if key.startswith(ENV_PREFIX) and key[len(ENV_PREFIX):] in known
+    }
+
+
+def _configure_from_environment() -> None:
+    """Perfil de ETL_PROFILE y valores ETL_<NOMBRE> del entorno."""
+    global ACTIVE_PROFILE
+    profile = os.environ.get(ENV_PREFIX + "PROFILE")
+    if profile:
+        apply_settings(load_profile(profile))
+        ACTIVE_PROFILE = profile
+    apply_settings(_environment_overrides())
+
+
+# Tipos fijados antes de aplicar perfiles y variables de entorno
+_SETTING_TYPES = {name: _OPTIONAL_TYPES.get(name, type(value)) for name, value in settings().items()}
+
+_configure_from_environment()
@@ -1,81 +1,475 @@
 import os
 import json
+import secrets
+import src.config as config
+from src.config import (CACHE_DIR, DATA_DIR, PLOTS_DIR, COLUMNAR_FORMAT, COUNTRY_CACHE_FILENAME,
+                        RESPONSE_CACHE, RESPONSE_CACHE_DIR,
+                        CSV_FILENAME, SQLITE_FILENAME, LOADERS, LOAD_CHUNK_SIZE, STATS_BACKEND, STATS_FILENAME,
+                        DEFAULT_N_USERS, DEFAULT_SEED, DEFAULT_STREAM, CHECKPOINTS, project_path,
+                        METRICS_TRACE_MEMORY, METRICS_PROMETHEUS, METRICS_PROFILE_STAGE)
 from src.services.etl_service import ETLService
-from src.services.transformer_service import TransformerService
+from src.services.country_cache import CountryCache
+from src.services.response_store import RESPONSE_CACHE_MODES, ResponseStore
+from src.services.transformer_service import TransformerService, StatsAccumulator, SketchStatistics
 from src.services.visualization_service import VisualizationService
-from src.loaders.csv_loader import CSVLoader
+from src.loaders.csv_loader import CSVLoader, read_users
 from src.loaders.sql_loader import SQLLoader
+from src.loaders.columnar_loader import ColumnarLoader, PYARROW_AVAILABLE
+from src.utils.aggregates import AggregateView
+from src.utils.checkpoints import STAGES, STAGE_INPUT, CheckpointStore
 from src.utils.logger import setup_logger
+from src.utils.metrics import RunMetrics
+from src.utils.stats import AgeStats
+from src.models.user_batch import column, iter_dicts, to_dicts
 
 logger = setup_logger(__name__)
 
+# CSV intermedio entre `extract` y `load` (usuarios limpios sin enriquecer)
+RAW_USERS_FILENAME = "usuarios_raw.csv"
+
 class ETLController:
     """Controlador principal del flujo ETL completo."""
 
     def __init__(self):
         self.etl_service = ETLService()
-        self.output_dir = os.path.join(os.path.dirname(__file__), "../../data")
-        self.plots_dir = os.path.join(os.path.dirname(__file__), "../../plots")
+        # Directorios de config (DATA_DIR, PLOTS_DIR, CACHE_DIR), relativos a la raíz del proyecto
+        self.output_dir = project_path(DATA_DIR)
+        self.plots_dir = project_path(PLOTS_DIR)
+        self.cache_dir = project_path(CACHE_DIR)
         os.makedirs(self.output_dir, exist_ok=True)
         os.makedirs(self.plots_dir, exist_ok=True)
         self.visualizer = VisualizationService(output_dir=self.plots_dir)
+        self.metrics = RunMetrics()
 
-    def run(self, n_users: int = 1000, seed: str = None):
-        logger.info("=== Iniciando proceso ETL extendido ===")
+    def run(self, n_users: int = DEFAULT_N_USERS, seed: str = DEFAULT_SEED, stream: bool = DEFAULT_STREAM,
+            resume: bool = False, from_stage: str = None) -> bool:
+        """
+        Ejecuta el pipeline completo.
 
-        # 1. Extracción y limpieza
-        users = self.etl_service.extract_users(n_users, seed=seed)
-        users = self.etl_service.clean_users(users)
+        Cada etapa se mide con RunMetrics (duración, filas, filas/s y memoria)
+        y las métricas se guardan en data/metrics.json al terminar.
 
-        # 2. Transformación inicial básica
-        basic_stats = self.etl_service.transform_users(users)
-        logger.info(f"Estadísticas básicas: {basic_stats}")
+        En modo por lotes el resultado de cada etapa se guarda como checkpoint
+        (ver src/utils/checkpoints.py), asociado a n_users, seed y la config.
 
-        # 3. Transformación avanzada sin pandas
-        transformer = TransformerService(users)
-        transformer.enrich_data()
-        transformer.detect_outliers()
-        transformer.enrich_with_country_data()
-        advanced_stats = transformer.compute_statistics()
-        users = transformer.get_users()  # Sustituimos get_dataframe()
+        Args:
+            n_users: Número de usuarios a extraer
+            seed: Semilla opcional para reproducibilidad
+            stream: Si es True, procesa y carga página a página (memoria constante)
+            resume: Continuar tras la última etapa completada de una ejecución
+                    anterior con los mismos parámetros (requiere seed)
+            from_stage: Empezar en esta etapa (STAGES) con el checkpoint de la
+                        anterior (requiere seed)
+
+        Returns:
+            False si no hay checkpoint desde el que empezar.
+        """
+        if from_stage is not None and from_stage not in STAGES:
+            raise ValueError(f"Etapa no válida: {from_stage!r} (opciones: {list(STAGES)})")
+        if (resume or from_stage) and not seed:
+            raise ValueError("--resume y --from-stage necesitan --seed: sin ella no se sabe qué ejecución continuar")
+        if stream:
+            if resume or from_stage:
+                raise ValueError("--resume y --from-stage solo se admiten en modo por lotes (sin --stream)")
+            return self._measured("stream", self._run_streaming, n_users, seed, n_users=n_users, seed=seed)
+        return self._measured("batch", self._run_batch, n_users, seed, resume, from_stage,
+                              n_users=n_users, seed=seed, resume=resume, from_stage=from_stage)
+
+    def extract(self, n_users: int = DEFAULT_N_USERS, seed: str = DEFAULT_SEED, filename: str = RAW_USERS_FILENAME) -> str:
+        """
+        Solo extracción y limpieza: guarda los usuarios sin enriquecer en
+        data/<filename> para procesarlos después con `load`.
+
+        Returns:
+            Ruta del CSV escrito.
+        """
+        def extract_only(n_users, seed):
+            users = self._extract_stage(n_users, seed)
+            loader = CSVLoader(filename, compression=None, partition_by=None)
+            with self.metrics.stage("load:CSVLoader", rows_in=len(users)):
+                loader.load_batches(iter_dicts(users, LOAD_CHUNK_SIZE), self.output_dir)
+            return loader.filepath
+
+        return self._measured("extract", extract_only, n_users, seed, n_users=n_users, seed=seed)
+
+    def load(self, filename: str = RAW_USERS_FILENAME, plots: bool = False) -> bool:
+        """
+        Transforma y carga los usuarios guardados por `extract` (sin volver a
+        llamar a RandomUser) y actualiza stats.json; los gráficos solo se
+        generan con plots=True.
+
+        Returns:
+            False si no existe el CSV de `extract`.
+        """
+        def load_only(path):
+            if not os.path.exists(path):
+                logger.error("No existe %s: ejecuta antes `extract`.", path)
+                return False
+            logger.info("=== Cargando usuarios desde %s ===", path)
+            with self.metrics.stage("read") as m:
+                users = read_users(path)
+                m.add_rows(rows_out=len(users))
+            users, view, advanced_stats = self._transform_stage(users)
+            self._load_stage(users)
+            if plots:
+                self._generate_plots(view)
+            self._save_stats_for_dashboard(advanced_stats, view)
+            return True
+
+        return self._measured("load", load_only, os.path.join(self.output_dir, filename))
+
+    def refresh_stats(self) -> bool:
+        """
+        Regenera stats.json desde las tablas de resumen de la base de datos,
+        sin extraer, transformar ni cargar matplotlib.
+
+        Returns:
+            False si todavía no hay base de datos.
+        """
+        def stats_only():
+            with self.metrics.stage("read") as m:
+                view = SQLLoader(SQLITE_FILENAME).read_aggregates(self.output_dir)
+                m.add_rows(rows_out=len(view) if view is not None else 0)
+            if view is None:
+                logger.error("No hay base de datos en %s: ejecuta antes el pipeline.", self.output_dir)
+                return False
+            with self.metrics.stage("stats", rows_in=len(view)):
+                advanced_stats = StatsAccumulator().merge(view).result()
+            self._save_stats_for_dashboard(advanced_stats, view)
+            return True
+
+        return self._measured("stats", stats_only)
 
-        logger.info(f"Estadísticas avanzadas: {advanced_stats}")
+    def _measured(self, mode: str, stages, *args, **info):
+        """Ejecuta `stages(*args)` con métricas nuevas y las guarda al terminar."""
+        self.metrics = RunMetrics(trace_memory=METRICS_TRACE_MEMORY, profile_stage=METRICS_PROFILE_STAGE)
+        self.metrics.info.update({"mode": mode, "profile": config.ACTIVE_PROFILE, **info})
+        try:
+            return stages(*args)
+        finally:
+            self._save_metrics()
 
-        # 4. Carga de datos (convertimos objetos a dict)
-        data_dicts = [u.__dict__ for u in users]
-        CSVLoader("usuarios.csv").load(data_dicts, self.output_dir)
-        SQLLoader("usuarios.db").load(data_dicts, self.output_dir)
+    def _run_batch(self, n_users: int, seed: str = None, resume: bool = False, from_stage: str = None) -> bool:
+        """
+        Pipeline con todos los usuarios en memoria, etapa a etapa, guardando
+        un checkpoint al terminar cada una.
+        """
+        logger.info("=== Iniciando proceso ETL extendido ===")
+        if not seed:
+            # Los checkpoints se asocian a la seed: sin ella todas las ejecuciones
+            # con el mismo n_users compartirían clave con usuarios distintos
+            seed = secrets.token_hex(8)
+            self.metrics.info["seed"] = seed
+            logger.info("Ejecución sin seed: se usará seed='%s' (para reanudarla: --seed %s --resume)", seed, seed)
+        checkpoints = CheckpointStore(os.path.join(self.cache_dir, "checkpoints"), n_users, seed, enabled=CHECKPOINTS)
+        start = self._start_stage(checkpoints, resume, from_stage)
+        if start is None:
+            return False
+        if not start:
+            return True
+        self.metrics.info["start_stage"] = start
+        stages = STAGES[STAGES.index(start):]
+
+        # Entrada de la primera etapa desde el checkpoint de la anterior
+        users = view = advanced_stats = None
+        source = STAGE_INPUT[start]
+        if source is not None:
+            with self.metrics.stage("checkpoint:read") as m:
+                data = checkpoints.load(source)
+                if source == "extract":
+                    users = data
+                else:
+                    users, view, advanced_stats = data
+                m.add_rows(rows_out=len(users))
+            logger.info("Checkpoint '%s' cargado (%d usuarios): se continúa en '%s'", source, len(users), start)
+        checkpoints.invalidate_from(start)
+
+        # 1-3. Extracción, limpieza y transformación
+        if "extract" in stages:
+            users = self._extract_stage(n_users, seed)
+            self._checkpoint(checkpoints, "extract", users, rows=len(users))
+        if "transform" in stages:
+            users, view, advanced_stats = self._transform_stage(users)
+            self._checkpoint(checkpoints, "transform", (users, view, advanced_stats), rows=len(users))
+
+        # 4. Carga de datos
+        if "load" in stages:
+            self._load_stage(users)
+            self._checkpoint(checkpoints, "load", rows=len(users))
 
         # 5. Visualizaciones
-        logger.info("Generando visualizaciones...")
-        # Gráficos originales
-        self.visualizer.plot_age_distribution(users)
-        self.visualizer.plot_gender_distribution(users)
-        self.visualizer.plot_top_countries(users)
-        self.visualizer.plot_age_by_country(users)
-        self.visualizer.plot_correlation_matrix(users)
-        # Nuevos gráficos
-        self.visualizer.plot_region_distribution(users)
-        self.visualizer.plot_age_groups_distribution(users)
-        self.visualizer.plot_gender_by_top_countries(users)
+        if "plots" in stages:
+            self._generate_plots(view)
+            self._checkpoint(checkpoints, "plots")
 
         # 6. Guardar estadísticas para el dashboard
-        self._save_stats_for_dashboard(advanced_stats, len(users))
+        self._save_stats_for_dashboard(advanced_stats, view)
+        self._checkpoint(checkpoints, "stats")
 
         logger.info("=== Proceso ETL completado con éxito ===")
-    
-    def _save_stats_for_dashboard(self, stats: dict, total_users: int):
+        return True
+
+    def _start_stage(self, checkpoints: CheckpointStore, resume: bool, from_stage: str):
+        """
+        Etapa por la que empieza la ejecución: `from_stage`, la siguiente a la
+        última completada (resume) o extract. Devuelve "" si con resume ya
+        estaban todas completadas y None si falta el checkpoint necesario.
+        """
+        if from_stage is None and resume:
+            last = checkpoints.last_completed()
+            if last == STAGES[-1]:
+                logger.info("La ejecución %s ya estaba completa: no hay nada que reanudar.", checkpoints.key)
+                return ""
+            from_stage = STAGES[STAGES.index(last) + 1] if last else STAGES[0]
+            logger.info("Reanudando la ejecución %s desde '%s'", checkpoints.key, from_stage)
+        start = from_stage or STAGES[0]
+
+        source = STAGE_INPUT[start]
+        if source is not None and not checkpoints.has_data(source):
+            logger.error("No hay checkpoint de '%s' para estos parámetros (%s) en %s: ejecuta antes el "
+                         "pipeline completo.", source, checkpoints.key, checkpoints.path)
+            return None
+        return start
+
+    def _checkpoint(self, checkpoints: CheckpointStore, stage: str, data=None, rows: int = None):
+        """Marca la etapa como completada y guarda su resultado (si hay)."""
+        if not checkpoints.enabled:
+            return
+        with self.metrics.stage(f"checkpoint:{stage}", rows_in=rows):
+            checkpoints.save(stage, data, rows=rows)
+
+    def _extract_stage(self, n_users: int, seed: str = None):
+        """Extrae y limpia los usuarios."""
+        metrics = self.metrics
+        responses = self.etl_service.responses = self._open_response_store()
+        try:
+            with metrics.stage("extract") as m:
+                users = self.etl_service.extract_users(n_users, seed=seed)
+                m.add_rows(rows_out=len(users))
+        finally:
+            if responses is not None:
+                responses.close()
+        with metrics.stage("clean", rows_in=len(users)) as m:
+            users = self.etl_service.clean_users(users)
+            m.add_rows(rows_out=len(users))
+        return users
+
+    def _transform_stage(self, users):
+        """
+        Enriquece los usuarios y calcula las estadísticas.
+
+        Returns:
+            (usuarios enriquecidos, vista agregada, estadísticas avanzadas)
+        """
+        metrics = self.metrics
+
+        # Transformación inicial básica (el acumulador de edades se
+        # calcula una vez y se comparte con TransformerService)
+        with metrics.stage("basic_stats", rows_in=len(users)):
+            age_stats = AgeStats.from_values(column(users, "age"))
+            basic_stats = self.etl_service.transform_users(users, age_stats=age_stats)
+        logger.info("Estadísticas básicas: %s", basic_stats)
+
+        # Transformación avanzada sin pandas
+        country_cache = self._open_country_cache()
+        transformer = TransformerService(users, country_cache=country_cache, age_stats=age_stats)
+        try:
+            with metrics.stage("enrich", rows_in=len(users)):
+                transformer.enrich_data()
+                transformer.detect_outliers()
+            with metrics.stage("country_enrichment", rows_in=len(users)):
+                transformer.enrich_with_country_data()
+        finally:
+            # También si falla: espera a los refrescos en segundo plano de la caché
+            country_cache.close()
+        users = transformer.get_users()  # Sustituimos get_dataframe()
+
+        # Una sola pasada sobre los usuarios alimenta estadísticas y gráficos
+        with metrics.stage("stats", rows_in=len(users)):
+            view = AggregateView.from_users(users)
+            advanced_stats = transformer.compute_statistics(view)
+
+        logger.info("Estadísticas avanzadas: %s", advanced_stats)
+        return users, view, advanced_stats
+
+    def _load_stage(self, users):
+        """
+        Escribe los usuarios con todos los loaders, convertidos a dict en
+        bloques de LOAD_CHUNK_SIZE filas: cada bloque se escribe en todos los
+        loaders antes de crear el siguiente. Si falla, se abortan como en
+        streaming.
+        """
+        metrics = self.metrics
+        loaders = self._build_loaders()
+        for loader in loaders:
+            loader.open(self.output_dir)
+
+        completed = False
+        try:
+            for data_dicts in metrics.iter_stage("to_dicts", iter_dicts(users, LOAD_CHUNK_SIZE)):
+                for loader in loaders:
+                    with metrics.stage(f"load:{type(loader).__name__}", rows_in=len(data_dicts)):
+                        loader.write_batch(data_dicts)
+            completed = True
+        finally:
+            if completed:
+                for loader in loaders:
+                    with metrics.stage(f"load:{type(loader).__name__}"):
+                        loader.close()
+            else:
+                self._abort_loaders(loaders)
+
+    def _run_streaming(self, n_users: int, seed: str = None):
+        """
+        Pipeline en streaming: cada página extraída se limpia, se enriquece y
+        se escribe en CSV/SQLite antes de pasar a la siguiente.
+
+        Solo se mantienen en memoria las páginas en vuelo y la vista agregada
+        (AggregateView), de la que salen las estadísticas y todos los gráficos
+        sobre el total de usuarios. Con STATS_BACKEND="sketch" no hay vista
+        exacta: los gráficos salen de los sketches (SketchStatistics.view). Las métricas de cada etapa se acumulan
+        lote a lote.
+
+        Si una página o un lote falla, los loaders se cierran con
+        close(success=False): SQLite deshace todos los lotes de la ejecución
+        y no se registra en etl_runs.
+        """
+        logger.info("=== Iniciando proceso ETL en modo streaming ===")
+        metrics = self.metrics
+
+        country_cache = self._open_country_cache()
+        responses = self.etl_service.responses = self._open_response_store()
+        transformer = TransformerService([], country_cache=country_cache)
+        accumulator = SketchStatistics() if STATS_BACKEND == "sketch" else StatsAccumulator()
+        loaders = self._build_loaders()
+        for loader in loaders:
+            loader.open(self.output_dir)
+
+        completed = False
+        try:
+            batches = metrics.iter_stage("extract", self.etl_service.stream_users(n_users, seed=seed))
+            for batch in batches:
+                with metrics.stage("clean", rows_in=len(batch)) as m:
+                    batch = self.etl_service.clean_users(batch)
+                    m.add_rows(rows_out=len(batch))
+                with metrics.stage("enrich", rows_in=len(batch)):
+                    batch = transformer.process_batch(batch)
+                with metrics.stage("stats", rows_in=len(batch)):
+                    accumulator.update(batch)
+
+                with metrics.stage("to_dicts", rows_in=len(batch)):
+                    data_dicts = to_dicts(batch)
+                for loader in loaders:
+                    with metrics.stage(f"load:{type(loader).__name__}", rows_in=len(data_dicts)):
+                        loader.write_batch(data_dicts)
+                # Con LOG_FORMAT="json" los campos de `extra` quedan como claves del registro
+                logger.debug("Lote cargado: %d usuarios", len(data_dicts),
+                             extra={"event": "batch_loaded", "rows": len(data_dicts)})
+            completed = True
+        finally:
+            if completed:
+                for loader in loaders:
+                    with metrics.stage(f"load:{type(loader).__name__}"):
+                        loader.close()
+            else:
+                self._abort_loaders(loaders)
+            country_cache.close()
+            if responses is not None:
+                responses.close()
+
+        advanced_stats = accumulator.result()
+        # StatsAccumulator ya es una vista agregada; con sketches, la vista acotada de sus resultados
+        view = accumulator if isinstance(accumulator, AggregateView) else accumulator.view()
+
+        self._generate_plots(view)
+
+        self._save_stats_for_dashboard(advanced_stats, view)
+
+        logger.info("=== Proceso ETL en streaming completado con éxito ===")
+        return True
+
+    @staticmethod
+    def _abort_loaders(loaders: list) -> None:
+        """
+        Cierra los loaders de una carga fallida sin confirmarla (SQLite deshace
+        la transacción). Un error al abortar se registra sin ocultar el error
+        original de la carga.
+        """
+        for loader in loaders:
+            try:
+                loader.close(success=False)
+            except Exception as e:
+                logger.error("No se pudo abortar %s: %s", type(loader).__name__, e)
+
+    def _build_loaders(self) -> list:
+        """
+        Loaders de salida activos en LOADERS: CSV, SQLite y, si pyarrow está
+        instalado, Parquet/Arrow.
+        """
+        unknown = set(LOADERS) - {"csv", "sqlite", "columnar"}
+        if unknown:
+            raise ValueError(f"Loaders desconocidos en LOADERS: {sorted(unknown)}")
+        loaders = []
+        if "csv" in LOADERS:
+            loaders.append(CSVLoader(CSV_FILENAME))
+        if "sqlite" in LOADERS:
+            loaders.append(SQLLoader(SQLITE_FILENAME))
+        if "columnar" in LOADERS:
+            if PYARROW_AVAILABLE:
+                loaders.append(ColumnarLoader(f"usuarios.{COLUMNAR_FORMAT}"))
+            else:
+                logger.info("pyarrow no está instalado: se omite la salida Parquet/Arrow.")
+        return loaders
+
+    def _open_country_cache(self) -> CountryCache:
+        """Abre la caché persistente de países (ver COUNTRY_CACHE_* en config)."""
+        return CountryCache(os.path.join(self.cache_dir, COUNTRY_CACHE_FILENAME))
+
+    def _open_response_store(self):
+        """Almacén de respuestas de RandomUser según RESPONSE_CACHE (None si está en "off")."""
+        if RESPONSE_CACHE not in RESPONSE_CACHE_MODES:
+            raise ValueError(f"RESPONSE_CACHE no válido: {RESPONSE_CACHE!r} (opciones: {list(RESPONSE_CACHE_MODES)})")
+        if RESPONSE_CACHE == "off":
+            return None
+        root = project_path(RESPONSE_CACHE_DIR) if RESPONSE_CACHE_DIR else os.path.join(self.cache_dir, "responses")
+        return ResponseStore(root, replay=RESPONSE_CACHE == "replay")
+
+    def _generate_plots(self, view: AggregateView):
+        """Genera los gráficos activos en paralelo (backend Agg, sin ventanas)."""
+        if not self.visualizer.charts:
+            logger.info("Sin gráficos activos (PLOT_CHARTS vacío): se omiten las visualizaciones.")
+            return
+        logger.info("Generando visualizaciones...")
+        with self.metrics.stage("plots"):
+            self.visualizer.render_all(view)
+        # Tiempo de dibujo de cada gráfico (medido dentro de cada proceso)
+        for name, seconds in self.visualizer.timings.items():
+            self.metrics.record(f"plot:{name}", seconds)
+
+    def _save_metrics(self):
+        """Guarda las métricas de la ejecución y resume las etapas en el log."""
+        paths = self.metrics.save(self.output_dir, prometheus=METRICS_PROMETHEUS)
+        logger.info("Métricas por etapa (guardadas en %s):\n%s", ", ".join(paths), self.metrics.summary())
+
+    def _save_stats_for_dashboard(self, stats: dict, view: AggregateView):
         """Guarda estadísticas en formato JSON para el dashboard HTML."""
-        dashboard_stats = {
-            "total_users": total_users,
-            "avg_age": stats.get("avg_age", 0),
-            "total_countries": len(stats.get("top_countries", {})),
-            "gender_distribution": stats.get("gender_distribution", {}),
-            "top_countries": dict(list(stats.get("top_countries", {}).items())[:10])
-        }
-        
-        stats_path = os.path.join(self.output_dir, "stats.json")
+        stats_path = os.path.join(self.output_dir, STATS_FILENAME)
         with open(stats_path, "w", encoding="utf-8") as f:
-            json.dump(dashboard_stats, f, indent=2, ensure_ascii=False)
+            json.dump(dashboard_stats(stats, view), f, indent=2, ensure_ascii=False)
         
-        logger.info(f"Estadísticas para dashboard guardadas en {stats_path}")
+        logger.info("Estadísticas para dashboard guardadas en %s", stats_path)
+
+
+def dashboard_stats(stats: dict, view: AggregateView) -> dict:
+    """Resumen que consume el dashboard (stats.json y /api/stats del servidor)."""
+    dashboard = {
+        "total_users": len(view),
+        "avg_age": stats.get("avg_age", 0),
+        "total_countries": len(view.countries),
+        "gender_distribution": stats.get("gender_distribution", {}),
+        "top_countries": dict(list(stats.get("top_countries", {}).items())[:10])
+    }
+    # Con el backend de sketches se publican también las cotas de error
+    if "error_bounds" in stats:
+        dashboard["error_bounds"] = stats["error_bounds"]
+    return dashboard
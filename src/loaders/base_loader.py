@@ -1,14 +1,56 @@
 from abc import ABC, abstractmethod
-from typing import Any
+from typing import Any, Dict, Iterable, List
 
 class BaseLoader(ABC):
-    """Interfaz base para todas las clases de carga de datos."""
+    """
+    Interfaz base para todas las clases de carga de datos.
+
+    Cada loader se usa como un escritor en tres pasos: `open` prepara el
+    destino, `write_batch` añade un lote de filas (se puede llamar muchas
+    veces) y `close` confirma y libera recursos. Si la carga falla a medias
+    se llama a `close(success=False)`, que descarta lo escrito cuando el
+    destino lo permite (SQLite) en lugar de confirmarlo. `load` y
+    `load_batches` son atajos construidos sobre esos tres pasos.
+    """
 
-    @abstractmethod
     def load(self, data: Any, output_dir: str) -> None:
         """
         Carga los datos a un destino (archivo, base de datos, etc.)
         :param data: Datos a cargar.
         :param output_dir: Carpeta donde se guardarán los resultados.
         """
+        self.load_batches([data], output_dir)
+
+    def load_batches(self, batches: Iterable[List[Dict[str, Any]]], output_dir: str) -> None:
+        """
+        Carga un iterable de lotes sin materializarlo entero en memoria.
+        :param batches: Iterable (p. ej. un generador) de listas de filas.
+        :param output_dir: Carpeta donde se guardarán los resultados.
+        """
+        self.open(output_dir)
+        try:
+            for batch in batches:
+                self.write_batch(batch)
+        except BaseException:
+            self.close(success=False)
+            raise
+        self.close()
+
+    @abstractmethod
+    def open(self, output_dir: str) -> None:
+        """Prepara el destino dentro de output_dir."""
+        pass
+
+    @abstractmethod
+    def write_batch(self, batch: List[Dict[str, Any]]) -> None:
+        """Escribe un lote de filas en el destino abierto."""
+        pass
+
+    @abstractmethod
+    def close(self, success: bool = True) -> None:
+        """
+        Confirma lo escrito y libera los recursos del destino.
+        :param success: False si la carga se interrumpió: se descarta lo escrito
+                        (o se avisa de que el destino ha quedado incompleto).
+        """
         pass
@@ -0,0 +1,170 @@
+import importlib.util
+import os
+from typing import Any, Dict, List, Optional, Sequence
+from src.config import COLUMNAR_COMPRESSION, COLUMNAR_FORMAT, COLUMNAR_ROW_GROUP_SIZE
+from src.loaders.base_loader import BaseLoader
+from src.models.user_model import user_fields
+from src.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# pyarrow es opcional: sin él el pipeline sigue generando CSV y SQLite. Solo
+# se comprueba que esté instalado; se importa al usarlo (su carga es lenta)
+PYARROW_AVAILABLE = importlib.util.find_spec("pyarrow") is not None
+
+
+def _arrow():
+    """Módulos de pyarrow (pyarrow, pyarrow.ipc, pyarrow.parquet), importados al primer uso."""
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+    return pyarrow, pyarrow.ipc, pyarrow.parquet
+
+
+COLUMNAR_FORMATS = ("parquet", "arrow")
+
+# Campos con pocos valores distintos: se guardan como diccionario (categóricos)
+CATEGORICAL_FIELDS = (
+    "gender", "country", "age_group", "age_category",
+    "email_domain", "email_preference", "region",
+)
+
+
+def users_arrow_schema() -> "pa.Schema":
+    """Esquema Arrow de la tabla de usuarios generado desde User."""
+    pa = _arrow()[0]
+    base_types = {str: pa.string(), int: pa.int64(), bool: pa.bool_(), float: pa.float64()}
+    columns = []
+    for name, tp in user_fields():
+        if name in CATEGORICAL_FIELDS:
+            arrow_type = pa.dictionary(pa.int32(), pa.string())
+        elif name == "age":
+            arrow_type = pa.int16()
+        else:
+            arrow_type = base_types.get(tp, pa.string())
+        columns.append(pa.field(name, arrow_type))
+    return pa.schema(columns)
+
+
+def read_columnar(path: str, columns: Optional[Sequence[str]] = None) -> "pa.Table":
+    """
+    Lee un archivo generado por ColumnarLoader con memory-map.
+
+    Solo se leen (y descomprimen) las columnas pedidas; en Arrow IPC sin
+    compresión los datos se usan directamente desde el mapa de memoria.
+    """
+    if not PYARROW_AVAILABLE:
+        raise ImportError("Leer archivos columnares requiere pyarrow (pip install pyarrow)")
+    pa, pa_ipc, pq = _arrow()
+    if path.endswith(".arrow"):
+        with pa.memory_map(path) as source:
+            table = pa_ipc.open_file(source).read_all()
+        return table.select(list(columns)) if columns else table
+    return pq.read_table(path, columns=list(columns) if columns else None, memory_map=True)
+
+
+class ColumnarLoader(BaseLoader):
+    """
+    Carga los datos en un archivo columnar tipado y comprimido (Parquet o
+    Arrow IPC) con pyarrow.
+
+    Las filas se acumulan hasta completar un row group de `row_group_size`
+    filas y se escriben columna a columna con los tipos del modelo User. Los
+    campos categóricos (CATEGORICAL_FIELDS) se codifican como diccionario; el
+    diccionario de cada columna se mantiene entre lotes y en Arrow IPC solo se
+    escriben sus ampliaciones (dictionary deltas).
+
+    Los archivos se leen con `read_columnar`, que usa memory-map y lee solo
+    las columnas pedidas.
+    """
+
+    def __init__(self, filename: str = "users.parquet", fmt: str = COLUMNAR_FORMAT,
+                 row_group_size: int = COLUMNAR_ROW_GROUP_SIZE,
+                 compression: Optional[str] = COLUMNAR_COMPRESSION) -> None:
+        if not PYARROW_AVAILABLE:
+            raise ImportError("ColumnarLoader requiere pyarrow (pip install pyarrow)")
+        if fmt not in COLUMNAR_FORMATS:
+            raise ValueError(f"Formato columnar no válido: {fmt!r} (opciones: {COLUMNAR_FORMATS})")
+        self.filename = filename
+        self.fmt = fmt
+        self.row_group_size = max(1, row_group_size)
+        self.compression = compression
+        self.schema = users_arrow_schema()
+        self.filepath = None
+        self._writer = None
+        self._buffer = []
+        self._dictionaries = {}
+        self._rows = 0
+
+    def open(self, output_dir: str) -> None:
+        os.makedirs(output_dir, exist_ok=True)
+        self.filepath = os.path.join(output_dir, self.filename)
+        self._buffer = []
+        self._dictionaries = {name: {} for name in CATEGORICAL_FIELDS}
+        self._rows = 0
+
+    def write_batch(self, batch: List[Dict[str, Any]]) -> None:
+        if not batch:
+            return
+        self._buffer.extend(batch)
+        while len(self._buffer) >= self.row_group_size:
+            rows = self._buffer[:self.row_group_size]
+            del self._buffer[:self.row_group_size]
+            self._write_row_group(rows)
+
+    def _column(self, field: "pa.Field", values: list) -> "pa.Array":
+        """Construye la columna Arrow; los categóricos usan el diccionario acumulado."""
+        pa = _arrow()[0]
+        if not pa.types.is_dictionary(field.type):
+            return pa.array(values, type=field.type)
+        codes = self._dictionaries[field.name]
+        indices = [None if v is None else codes.setdefault(v, len(codes)) for v in values]
+        return pa.DictionaryArray.from_arrays(
+            pa.array(indices, type=pa.int32()), pa.array(list(codes), type=pa.string())
+        )
+
+    def _write_row_group(self, rows: List[Dict[str, Any]]) -> None:
+        pa, pa_ipc, pq = _arrow()
+        record_batch = pa.record_batch(
+            [self._column(field, [row.get(field.name) for row in rows]) for field in self.schema],
+            schema=self.schema,
+        )
+
+        # El archivo se crea con el primer row group
+        if self._writer is None:
+            if self.fmt == "parquet":
+                self._writer = pq.ParquetWriter(self.filepath, self.schema,
+                                                compression=self.compression or "none")
+            else:
+                options = pa_ipc.IpcWriteOptions(compression=self.compression,
+                                                 emit_dictionary_deltas=True)
+                self._writer = pa_ipc.new_file(self.filepath, self.schema, options=options)
+
+        if self.fmt == "parquet":
+            self._writer.write_table(pa.Table.from_batches([record_batch]),
+                                     row_group_size=self.row_group_size)
+        else:
+            self._writer.write_batch(record_batch)
+        self._rows += len(rows)
+
+    def close(self, success: bool = True) -> None:
+        if not success:
+            # Carga interrumpida: no se escribe lo pendiente y se cierra el archivo
+            self._buffer = []
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+                logger.warning("Carga interrumpida: %s queda incompleto (%d filas)", self.filepath, self._rows)
+            return
+
+        if self._buffer:
+            self._write_row_group(self._buffer)
+            self._buffer = []
+
+        if self._writer is None:
+            logger.warning("No hay datos para exportar en %s.", self.fmt)
+            return
+
+        self._writer.close()
+        self._writer = None
+        logger.info("Datos guardados correctamente en %s (%d filas, %s)", self.filepath, self._rows, self.fmt)
@@ -1,28 +1,187 @@
 import csv
+import gzip
+import io
 import os
-from typing import List, Dict, Any
+import re
+from dataclasses import MISSING, fields
+from datetime import date
+from typing import Any, Dict, Iterable
+from src.config import CSV_BUFFER_SIZE, CSV_COMPRESSION, CSV_PARTITION_BY
 from src.loaders.base_loader import BaseLoader
+from src.models.user_batch import UserBatch
+from src.models.user_model import User, user_fields
 from src.utils.logger import setup_logger
 
+# zstandard es opcional: solo hace falta con compression="zstd"
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - depende del entorno
+    zstandard = None
+
 logger = setup_logger(__name__)
 
+CSV_COMPRESSIONS = {None: "", "gzip": ".gz", "zstd": ".zst"}
+CSV_PARTITIONS = (None, "country", "run_date")
+
+# Partición de las filas sin valor en la columna de partición
+UNKNOWN_PARTITION = "desconocido"
+
+# Caracteres no permitidos en el nombre de una carpeta de partición
+_UNSAFE_PATH_CHARS = re.compile(r"[^\w\- .]")
+
+
+def _partition_dirname(key: str, value: Any) -> str:
+    """Nombre de carpeta estilo Hive (clave=valor) seguro para el sistema de archivos."""
+    text = UNKNOWN_PARTITION if value in (None, "") else str(value)
+    return f"{key}={_UNSAFE_PATH_CHARS.sub('_', text)}"
+
+
 class CSVLoader(BaseLoader):
-    """Carga datos en un archivo CSV dentro del directorio especificado."""
+    """
+    Carga datos en un archivo CSV dentro del directorio especificado.
 
-    def __init__(self, filename: str = "users.csv") -> None:
-        self.filename = filename
+    Las columnas se fijan desde los campos de User (`user_fields`), no desde
+    la primera fila: los campos que falten en una fila se dejan vacíos y los
+    que sobren se ignoran. Cada lote se escribe en cuanto llega a través de un
+    búfer de `buffer_size` bytes, así que la memoria no depende del total.
 
-    def load(self, data: List[Dict[str, Any]], output_dir: str) -> None:
-        if not data:
-            logger.warning("No hay datos para exportar en CSV.")
-            return
+    Opciones:
+        compression: None, "gzip" (.gz) o "zstd" (.zst, requiere zstandard);
+                     se comprime al vuelo mientras se escribe.
+        partition_by: None, "country" o "run_date". Con partición se escribe un
+                      archivo por valor en <nombre>/<clave>=<valor>/<archivo>.
+    """
+
+    def __init__(self, filename: str = "users.csv", compression: str = CSV_COMPRESSION,
+                 partition_by: str = CSV_PARTITION_BY, buffer_size: int = CSV_BUFFER_SIZE) -> None:
+        if compression not in CSV_COMPRESSIONS:
+            raise ValueError(f"Compresión CSV no válida: {compression!r} (opciones: {list(CSV_COMPRESSIONS)})")
+        if compression == "zstd" and zstandard is None:
+            raise ImportError("La compresión zstd requiere zstandard (pip install zstandard)")
+        if partition_by not in CSV_PARTITIONS:
+            raise ValueError(f"Partición CSV no válida: {partition_by!r} (opciones: {CSV_PARTITIONS})")
+        self.filename = filename + CSV_COMPRESSIONS[compression]
+        self.compression = compression
+        self.partition_by = partition_by
+        self.buffer_size = max(io.DEFAULT_BUFFER_SIZE, buffer_size)
+        self.fieldnames = [name for name, _ in user_fields()]
+        self.filepath = None
+        self.run_date = None
+        self._files = {}  # ruta -> (archivo, writer)
+        self._rows = 0
 
+    def open(self, output_dir: str) -> None:
         os.makedirs(output_dir, exist_ok=True)
-        filepath = os.path.join(output_dir, self.filename)
+        self.run_date = date.today().isoformat()
+        if self.partition_by:
+            # Con partición, filepath es la carpeta raíz de los archivos
+            self.filepath = os.path.join(output_dir, self.filename.split(".")[0])
+        else:
+            self.filepath = os.path.join(output_dir, self.filename)
+        self._rows = 0
 
-        with open(filepath, "w", newline="", encoding="utf-8") as f:
-            writer = csv.DictWriter(f, fieldnames=data[0].keys())
+    def _open_stream(self, path: str):
+        """Abre el archivo de texto con búfer grande y, si procede, compresión al vuelo."""
+        if self.compression is None:
+            return open(path, "w", newline="", encoding="utf-8", buffering=self.buffer_size)
+        if self.compression == "gzip":
+            raw = gzip.GzipFile(path, "wb", compresslevel=6)
+        else:
+            raw = zstandard.ZstdCompressor(level=3).stream_writer(open(path, "wb"))
+        return io.TextIOWrapper(io.BufferedWriter(raw, self.buffer_size), encoding="utf-8", newline="")
+
+    def _writer(self, path: str) -> csv.DictWriter:
+        """Writer del archivo `path`; se crea (con cabecera) la primera vez que se usa."""
+        entry = self._files.get(path)
+        if entry is None:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            stream = self._open_stream(path)
+            writer = csv.DictWriter(stream, fieldnames=self.fieldnames, restval="", extrasaction="ignore")
             writer.writeheader()
-            writer.writerows(data)
+            entry = self._files[path] = (stream, writer)
+        return entry[1]
+
+    def _partition_path(self, key: str, value: Any) -> str:
+        return os.path.join(self.filepath, _partition_dirname(key, value), self.filename)
+
+    def write_batch(self, batch: Iterable[Dict[str, Any]]) -> None:
+        rows = batch if isinstance(batch, list) else list(batch)
+        if not rows:
+            return
+
+        if self.partition_by == "country":
+            groups = {}
+            for row in rows:
+                groups.setdefault(row.get("country"), []).append(row)
+            for country, group in groups.items():
+                self._writer(self._partition_path("country", country)).writerows(group)
+        elif self.partition_by == "run_date":
+            self._writer(self._partition_path("run_date", self.run_date)).writerows(rows)
+        else:
+            self._writer(self.filepath).writerows(rows)
+        self._rows += len(rows)
+
+    def close(self, success: bool = True) -> None:
+        if not self._files:
+            if success:
+                logger.warning("No hay datos para exportar en CSV.")
+            return
+
+        for stream, _ in self._files.values():
+            stream.close()
+        n_files = len(self._files)
+        self._files = {}
+        if not success:
+            # El CSV se escribe directamente en su destino: no se puede deshacer
+            logger.warning("Carga interrumpida: %s queda incompleto (%d filas)", self.filepath, self._rows)
+            return
+        logger.info(
+            "Datos guardados correctamente en %s (%d filas%s)", self.filepath, self._rows,
+            f", {n_files} archivos" if self.partition_by else ""
+        )
+
+
+def read_users(path: str) -> UserBatch:
+    """
+    Lee un CSV escrito por CSVLoader (sin partición; .gz y .zst incluidos) y
+    devuelve los usuarios con los tipos del modelo.
+
+    Raises:
+        ValueError: si falta un entero obligatorio (age) o no es un número,
+                    con la línea del CSV.
+    """
+    if path.endswith(".gz"):
+        stream = gzip.open(path, "rt", newline="", encoding="utf-8")
+    elif path.endswith(".zst"):
+        if zstandard is None:
+            raise ImportError("Leer archivos .zst requiere zstandard (pip install zstandard)")
+        stream = io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(open(path, "rb")),
+                                  encoding="utf-8", newline="")
+    else:
+        stream = open(path, newline="", encoding="utf-8")
+
+    types = dict(user_fields())
+    # Celda vacía -> valor por defecto del campo ("" en los obligatorios, None en los derivados)
+    defaults = {f.name: "" if f.default is MISSING else f.default for f in fields(User)}
+
+    def convert(name: str, value: str, line: int):
+        if value == "":
+            if types[name] is int and defaults[name] == "":
+                # Un entero obligatorio (age) no tiene valor por defecto
+                raise ValueError(f"{path}, línea {line}: falta el valor de {name!r}")
+            return defaults[name]
+        if types[name] is bool:
+            return value == "True"
+        if types[name] is int:
+            try:
+                return int(value)
+            except ValueError:
+                raise ValueError(f"{path}, línea {line}: {name}={value!r} no es un entero") from None
+        return value
 
-        logger.info(f"Datos guardados correctamente en {filepath}")
+    with stream:
+        reader = csv.DictReader(stream)
+        return UserBatch.from_users(
+            User(**{name: convert(name, row[name], reader.line_num) for name in types if name in row})
+            for row in reader
+        )
@@ -1,53 +1,295 @@
 import sqlite3
 import os
-from typing import List, Dict, Any
+import uuid
+from datetime import datetime, timezone
+from itertools import islice
+from typing import List, Dict, Any, Optional, Tuple
+from src.config import SQL_CHUNK_SIZE, SQL_FAST_LOAD, SQL_LOAD_MODE
 from src.loaders.base_loader import BaseLoader
+from src.models.user_model import user_fields
+from src.utils.aggregates import AggregateView
 from src.utils.logger import setup_logger
 
 logger = setup_logger(__name__)
 
+# Tipo Python del modelo -> afinidad de columna en SQLite
+SQLITE_TYPES = {str: "TEXT", int: "INTEGER", bool: "INTEGER", float: "REAL"}
+
+# Columnas gestionadas por el loader (no vienen del modelo User)
+LOAD_COLUMNS = [("user_key", "TEXT"), ("run_id", "TEXT"), ("loaded_at", "TEXT")]
+
+LOAD_MODES = ("upsert", "replace")
+
+# Filas de bases de datos anteriores al upsert: su clave es el email y no tienen uuid
+LEGACY_ROW = "user_key = email AND (uuid IS NULL OR uuid = '')"
+
+# Índices secundarios que se crean (si no existen) tras la carga masiva.
+# (country, age) sirve también para filtrar solo por país, y permite paginar
+# los usuarios de un país ordenados por edad sin ordenar en memoria.
+# Cada índice de una columna lleva el rowid al final: es el orden
+# (columna, rowid) con el que el dashboard pagina por esa columna
+# (SORT_COLUMNS en scripts_project/dashboard_queries.py)
+SECONDARY_INDEXES = {
+    "idx_users_country_age": "country, age",
+    "idx_users_country": "country",
+    "idx_users_gender": "gender",
+    "idx_users_age": "age",
+    "idx_users_first_name": "first_name",
+    "idx_users_last_name": "last_name",
+    "idx_users_email": "email",
+}
+
+# Tablas de resumen: nombre -> (definición, consulta que la rellena)
+SUMMARY_TABLES = {
+    "users_by_country_gender": (
+        "country TEXT, gender TEXT, n INTEGER NOT NULL, PRIMARY KEY (country, gender)",
+        "SELECT country, gender, COUNT(*) FROM users GROUP BY country, gender",
+    ),
+    "users_age_histogram": (
+        "age INTEGER PRIMARY KEY, n INTEGER NOT NULL",
+        "SELECT age, COUNT(*) FROM users GROUP BY age",
+    ),
+    "users_by_region": (
+        "region TEXT PRIMARY KEY, n INTEGER NOT NULL",
+        "SELECT region, COUNT(*) FROM users GROUP BY region",
+    ),
+}
+
+
+def users_table_schema() -> List[Tuple[str, str]]:
+    """Columnas de la tabla users (nombre, tipo SQLite) generadas desde User."""
+    return [(name, SQLITE_TYPES.get(tp, "TEXT")) for name, tp in user_fields()] + LOAD_COLUMNS
+
+
 class SQLLoader(BaseLoader):
-    """Carga los datos en una base de datos SQLite."""
+    """
+    Carga los datos en una base de datos SQLite.
+
+    La carga es masiva: las filas se insertan con `executemany` en bloques de
+    `chunk_size` y toda la carga va en una única transacción que se confirma
+    en `close` (o se deshace con `close(success=False)` si la carga falla). Con `fast=True` se activa journal_mode=WAL y synchronous=OFF
+    mientras dura la carga.
 
-    def __init__(self, db_name: str = "users.db") -> None:
+    La carga es idempotente: cada usuario tiene una clave natural `user_key`
+    (login.uuid, o el email si no hay uuid) con índice único, y se escribe con
+    INSERT ... ON CONFLICT DO UPDATE. En modo "upsert" las filas que no han
+    cambiado no se tocan, así que `run_id`/`loaded_at` indican la última
+    ejecución que modificó cada fila. Cada carga queda registrada en la tabla
+    `etl_runs`, cuyo último `loaded_at` sirve como marca de agua para lecturas
+    incrementales (`WHERE loaded_at > ?`).
+
+    Al terminar la carga se crean índices sobre (country, age), gender y age y se
+    recalculan las tablas de resumen (SUMMARY_TABLES) dentro de la misma
+    transacción, de modo que los conteos por país/género, el histograma de
+    edades y los conteos por región se consultan en O(grupos) y no en O(filas).
+    """
+
+    def __init__(self, db_name: str = "users.db", chunk_size: int = SQL_CHUNK_SIZE,
+                 fast: bool = SQL_FAST_LOAD, mode: str = SQL_LOAD_MODE,
+                 run_id: Optional[str] = None) -> None:
+        if mode not in LOAD_MODES:
+            raise ValueError(f"Modo de carga no válido: {mode!r} (opciones: {LOAD_MODES})")
         self.db_name = db_name
+        self.chunk_size = max(1, chunk_size)
+        self.fast = fast
+        self.mode = mode
+        self.run_id = run_id or uuid.uuid4().hex[:12]
+        self.loaded_at = None
+        self.db_path = None
+        self.columns = [name for name, _ in users_table_schema() if name not in dict(LOAD_COLUMNS)]
 
-    def load(self, data: List[Dict[str, Any]], output_dir: str) -> None:
-        if not data:
-            logger.warning("No hay datos para exportar en SQL.")
-            return
+        all_columns = self.columns + [name for name, _ in LOAD_COLUMNS]
+        tracked = self.columns
+        self._upsert_sql = (
+            f"INSERT INTO users ({', '.join(all_columns)}) "
+            f"VALUES ({', '.join('?' for _ in all_columns)}) "
+            f"ON CONFLICT(user_key) DO UPDATE SET "
+            + ", ".join(f"{c} = excluded.{c}" for c in tracked + ["run_id", "loaded_at"])
+            + " WHERE " + " OR ".join(f"users.{c} IS NOT excluded.{c}" for c in tracked)
+        )
+        self._conn = None
+        self._has_legacy_rows = False
+        self._rows = 0
+        self._rows_before = 0
+        # Filas insertadas o actualizadas por el upsert (sin las de `_adopt_legacy_rows`)
+        self._upsert_changes = 0
 
+    def open(self, output_dir: str) -> None:
         os.makedirs(output_dir, exist_ok=True)
-        db_path = os.path.join(output_dir, self.db_name)
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                first_name TEXT,
-                last_name TEXT,
-                gender TEXT,
-                country TEXT,
-                age INTEGER,
-                email TEXT
+        self.db_path = os.path.join(output_dir, self.db_name)
+        self.loaded_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        self._rows = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path)
+        if self.fast:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+
+        schema = users_table_schema()
+        conn.execute(
+            f"CREATE TABLE IF NOT EXISTS users ({', '.join(f'{n} {t}' for n, t in schema)})"
+        )
+        # Bases de datos de versiones anteriores solo tenían 6 columnas
+        existing = {row[1] for row in conn.execute("PRAGMA table_info(users)")}
+        for name, sql_type in schema:
+            if name not in existing:
+                conn.execute(f"ALTER TABLE users ADD COLUMN {name} {sql_type}")
+
+        # Filas antiguas sin clave: se eliminan los duplicados acumulados por
+        # las cargas en modo append y se usa el email como clave provisional.
+        # No tenían uuid, así que la primera carga que traiga el uuid de ese
+        # email se queda con la fila (ver `_adopt_legacy_rows`)
+        conn.execute("""
+            DELETE FROM users WHERE user_key IS NULL AND rowid NOT IN (
+                SELECT MAX(rowid) FROM users WHERE user_key IS NULL GROUP BY email
+            )
+        """)
+        conn.execute("UPDATE users SET user_key = email WHERE user_key IS NULL")
+        # Bases de datos ya duplicadas por versiones anteriores (la misma
+        # persona con clave email y con clave uuid): sobra la fila antigua
+        conn.execute(f"""
+            DELETE FROM users WHERE {LEGACY_ROW} AND email IN (
+                SELECT email FROM users WHERE uuid IS NOT NULL AND uuid != ''
             )
         """)
+        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_users_user_key ON users (user_key)")
+        self._has_legacy_rows = conn.execute(f"SELECT 1 FROM users WHERE {LEGACY_ROW} LIMIT 1").fetchone() is not None
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_users_loaded_at ON users (loaded_at)")
 
-        for u in data:
-            cursor.execute("""
-                INSERT INTO users (first_name, last_name, gender, country, age, email)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (
-                u.get("first_name"),
-                u.get("last_name"),
-                u.get("gender"),
-                u.get("country"),
-                u.get("age"),
-                u.get("email"),
-            ))
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS etl_runs (
+                run_id TEXT PRIMARY KEY,
+                loaded_at TEXT NOT NULL,
+                mode TEXT NOT NULL,
+                rows_seen INTEGER NOT NULL,
+                rows_inserted INTEGER NOT NULL,
+                rows_updated INTEGER NOT NULL
+            )
+        """)
+
+        if self.mode == "replace":
+            conn.execute("DELETE FROM users")
+
+        self._rows_before = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+        self._upsert_changes = 0
+        return conn
+
+    def write_batch(self, batch: List[Dict[str, Any]]) -> None:
+        if not batch:
+            return
+
+        # La base de datos se abre con el primer lote no vacío
+        if self._conn is None:
+            self._conn = self._connect()
+
+        columns = self.columns
+        run_id, loaded_at = self.run_id, self.loaded_at
+        rows = (
+            tuple(u.get(c) for c in columns)
+            + (u.get("uuid") or u.get("email"), run_id, loaded_at)
+            for u in batch
+        )
+        while True:
+            chunk = list(islice(rows, self.chunk_size))
+            if not chunk:
+                break
+            if self._has_legacy_rows:
+                self._adopt_legacy_rows(chunk)
+            changes_before = self._conn.total_changes
+            self._conn.executemany(self._upsert_sql, chunk)
+            self._upsert_changes += self._conn.total_changes - changes_before
+        self._rows += len(batch)
 
-        conn.commit()
-        conn.close()
-        logger.info(f"Datos insertados correctamente en {db_path}")
+    def _adopt_legacy_rows(self, chunk: List[tuple]) -> None:
+        """
+        Pasa a la clave uuid las filas antiguas (clave email, sin uuid) de los
+        usuarios del bloque, para que el upsert las actualice en lugar de
+        insertar un duplicado.
+        """
+        email, uuid_ = self.columns.index("email"), self.columns.index("uuid")
+        self._conn.executemany(
+            f"UPDATE OR IGNORE users SET user_key = ? WHERE user_key = ? AND {LEGACY_ROW}",
+            [(row[uuid_], row[email]) for row in chunk if row[uuid_] and row[email]]
+        )
+
+    def close(self, success: bool = True) -> None:
+        if self._conn is None:
+            if success:
+                logger.warning("No hay datos para exportar en SQL.")
+            return
+
+        if not success:
+            # Carga interrumpida: no se confirma nada (ni etl_runs ni resúmenes)
+            self._conn.rollback()
+            self._conn.close()
+            self._conn = None
+            logger.warning("Carga en %s interrumpida: se deshacen las %d filas escritas (run_id=%s)",
+                           self.db_path, self._rows, self.run_id)
+            return
+
+        rows_after = self._conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+        inserted = max(0, rows_after - self._rows_before)
+        updated = max(0, self._upsert_changes - inserted)
+        self._conn.execute(
+            "INSERT INTO etl_runs (run_id, loaded_at, mode, rows_seen, rows_inserted, rows_updated) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (self.run_id, self.loaded_at, self.mode, self._rows, inserted, updated)
+        )
+        self._build_indexes_and_summaries()
+
+        self._conn.commit()
+        if self.fast:
+            # Vuelca el WAL al fichero principal para que quede autocontenido
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self._conn.close()
+        self._conn = None
+        logger.info(
+            "Datos cargados en %s (modo %s, run_id=%s): %d filas leídas, %d insertadas, "
+            "%d actualizadas, %d en total",
+            self.db_path, self.mode, self.run_id, self._rows, inserted, updated, rows_after
+        )
+
+    def _build_indexes_and_summaries(self) -> None:
+        """Crea los índices secundarios y recalcula las tablas de resumen."""
+        for index_name, column in SECONDARY_INDEXES.items():
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON users ({column})")
+
+        for table, (definition, query) in SUMMARY_TABLES.items():
+            self._conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({definition})")
+            self._conn.execute(f"DELETE FROM {table}")
+            self._conn.execute(f"INSERT INTO {table} {query}")
+
+    def read_aggregates(self, output_dir: str) -> Optional[AggregateView]:
+        """
+        Reconstruye los conteos por país/género, el histograma de edades y los
+        conteos por región desde las tablas de resumen de output_dir, sin
+        recorrer la tabla users (o None si no hay base de datos).
+        """
+        db_path = os.path.join(output_dir, self.db_name)
+        if not os.path.exists(db_path):
+            return None
+        conn = sqlite3.connect(db_path)
+        try:
+            existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            if "users" not in existing:
+                return None
 
+            def rows(table):
+                # Bases de datos anteriores a las tablas de resumen: se agrupa sobre users
+                if table in existing:
+                    return conn.execute(f"SELECT * FROM {table}")
+                return conn.execute(SUMMARY_TABLES[table][1])
 
+            view = AggregateView()
+            for country, gender, n in rows("users_by_country_gender"):
+                view.total += n
+                view.countries[country] += n
+                view.genders[gender] += n
+                view.country_genders[(country, gender)] += n
+            view.ages.update_histogram({age: n for age, n in rows("users_age_histogram")})
+            for region, n in rows("users_by_region"):
+                view.regions[region or "N/A"] += n
+            return view
+        finally:
+            conn.close()
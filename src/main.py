@@ -3,27 +3,170 @@ main.py
 ---------
 Punto de entrada del proyecto ETL.
 Orquesta el flujo de extracción, transformación, carga y visualización.
+
+Uso:
+    python -m src.main                      # pipeline completo (config por defecto)
+    python -m src.main [opciones globales] run [--n-users N] [--seed S] [--stream] ...
+    python -m src.main run --seed S --resume              # continuar una ejecución fallida
+    python -m src.main run --seed S --from-stage load     # recargar desde el checkpoint, sin red
+    python -m src.main run --seed S --response-cache replay  # usuarios desde las respuestas guardadas, sin red
+    python -m src.main extract [--n-users N] [--seed S] [--output usuarios_raw.csv]
+    python -m src.main load [--input usuarios_raw.csv] [--plots]
+    python -m src.main stats                # regenera stats.json desde la base de datos
+
+Opciones globales (antes del subcomando):
+    --profile large                         # perfil de profiles/ o ruta a un .toml
+    --data-dir/--plots-dir/--cache-dir DIR  # directorios de salida y de caché
+    --set NOMBRE=VALOR                      # cualquier valor de src/config.py
+
+Prioridad: config.py < perfil < variables ETL_<NOMBRE> < argumentos.
+
+Cada subcomando importa solo lo que necesita: requests se carga al extraer,
+matplotlib al dibujar y pyarrow al escribir Parquet/Arrow, así que `stats`
+arranca sin ninguno de ellos.
 """
 
+import argparse
 import os
 import sys
 
 # Asegurar que el directorio raíz esté en el PATH
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from src.controller.etl_controller import ETLController
+from src import config
+from src.utils.checkpoints import STAGES
+
+# Opciones de subcomando -> (valor de config, tipo, ayuda)
+PIPELINE_OPTIONS = {
+    "--n-users": ("DEFAULT_N_USERS", int, "Usuarios a extraer"),
+    "--seed": ("DEFAULT_SEED", str, "Semilla de RandomUser (resultados reproducibles)"),
+    "--batch-size": ("EXTRACTION_PAGE_SIZE", int, "Usuarios por petición / por lote en streaming"),
+    "--workers": ("EXTRACTION_MAX_WORKERS", int, "Páginas descargadas en paralelo"),
+    "--response-cache": ("RESPONSE_CACHE", str, "Respuestas de RandomUser en disco: off, readwrite o replay (sin red)"),
+    "--country-workers": ("COUNTRY_LOOKUP_WORKERS", int, "Consultas simultáneas a RestCountries"),
+    "--plot-workers": ("PLOT_WORKERS", int, "Procesos para dibujar los gráficos"),
+    "--loaders": ("LOADERS", str, "Salidas separadas por comas (csv,sqlite,columnar)"),
+    "--charts": ("PLOT_CHARTS", str, "Gráficos separados por comas, o 'none'"),
+}
+COMMAND_OPTIONS = {
+    "run": ("--n-users", "--seed", "--batch-size", "--workers", "--response-cache", "--country-workers",
+            "--plot-workers", "--loaders", "--charts"),
+    "extract": ("--n-users", "--seed", "--batch-size", "--workers", "--response-cache"),
+    "load": ("--country-workers", "--plot-workers", "--loaders", "--charts"),
+    "stats": (),
+}
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m src.main", description="ETL de usuarios de RandomUser.")
+    parser.add_argument("--profile", help="Perfil de profiles/ (p. ej. small, large) o ruta a un .toml")
+    parser.add_argument("--data-dir", help="Directorio de salida de datos (DATA_DIR)")
+    parser.add_argument("--plots-dir", help="Directorio de los gráficos (PLOTS_DIR)")
+    parser.add_argument("--cache-dir", help="Directorio de la caché de países (CACHE_DIR)")
+    parser.add_argument("--set", action="append", default=[], metavar="NOMBRE=VALOR",
+                        help="Sustituye un valor de src/config.py (repetible)")
+    commands = parser.add_subparsers(dest="command")
+
+    subparsers = {
+        "run": commands.add_parser("run", help="Pipeline completo (opción por defecto)"),
+        "extract": commands.add_parser("extract", help="Solo extracción y limpieza a un CSV intermedio"),
+        "load": commands.add_parser("load", help="Transformar y cargar el CSV de `extract`"),
+        "stats": commands.add_parser("stats", help="Regenerar stats.json desde la base de datos existente"),
+    }
+    for command, options in COMMAND_OPTIONS.items():
+        for option in options:
+            _, tp, help_text = PIPELINE_OPTIONS[option]
+            subparsers[command].add_argument(option, type=tp, help=help_text)
+
+    subparsers["run"].add_argument("--stream", action="store_true", default=None,
+                                   help="Procesar página a página (memoria constante)")
+    subparsers["run"].add_argument("--resume", action="store_true",
+                                   help="Continuar tras la última etapa completada con los mismos parámetros")
+    subparsers["run"].add_argument("--from-stage", choices=STAGES, default=None,
+                                   help="Empezar en esta etapa usando el checkpoint de la anterior")
+    subparsers["extract"].add_argument("--output", default=None, help="CSV intermedio dentro del directorio de datos")
+    subparsers["load"].add_argument("--input", default=None, help="CSV intermedio dentro del directorio de datos")
+    subparsers["load"].add_argument("--plots", action="store_true", help="Generar también los gráficos")
+    return parser
+
+
+def collect_overrides(args: argparse.Namespace) -> dict:
+    """Valores de config indicados en la línea de comandos (los no indicados quedan fuera)."""
+    overrides = {}
+    for item in args.set:
+        name, sep, value = item.partition("=")
+        if not sep:
+            raise SystemExit(f"--set espera NOMBRE=VALOR (recibido: {item!r})")
+        overrides[name.strip()] = value.strip()
+
+    # Rutas de la CLI relativas al directorio actual
+    for option, name in (("data_dir", "DATA_DIR"), ("plots_dir", "PLOTS_DIR"), ("cache_dir", "CACHE_DIR")):
+        if getattr(args, option) is not None:
+            overrides[name] = os.path.abspath(getattr(args, option))
+
+    for option in COMMAND_OPTIONS.get(args.command or "run", ()):
+        value = getattr(args, option[2:].replace("-", "_"), None)
+        if value is None:
+            continue
+        # En PLOT_CHARTS None significa "todos": "--charts none" desactiva los gráficos
+        if option == "--charts" and value.lower() == "none":
+            value = ()
+        overrides[PIPELINE_OPTIONS[option][0]] = value
+    if getattr(args, "stream", None):
+        overrides["DEFAULT_STREAM"] = True
+    return overrides
+
+
+def main(argv=None):
+    """Ejecuta el subcomando indicado (por defecto, el proceso ETL completo)."""
+    args = build_parser().parse_args(argv)
+    command = args.command or "run"
+
+    # La configuración se fija antes de importar el controlador y los servicios
+    try:
+        config.configure(profile=args.profile, overrides=collect_overrides(args))
+    except (OSError, ValueError, ImportError) as e:
+        print(f"Configuración no válida: {e}", file=sys.stderr)
+        return 2
+
+    if config.RESPONSE_CACHE == "replay" and command in ("run", "extract") and not config.DEFAULT_SEED:
+        print("El modo replay necesita --seed (solo se guardan las respuestas pedidas con seed)", file=sys.stderr)
+        return 2
 
-def main():
-    """Ejecuta el proceso ETL completo."""
-    print("Iniciando proceso ETL de usuarios...\n")
+    from src.controller.etl_controller import ETLController, RAW_USERS_FILENAME
 
     # Instanciamos el controlador principal del proceso
     controller = ETLController()
 
-    # Ejecutamos el pipeline (por defecto extrae 100 usuarios)
-    controller.run(n_users=1000)
+    if command == "run":
+        # Sin subcomando no existen las opciones de `run`
+        resume, from_stage = getattr(args, "resume", False), getattr(args, "from_stage", None)
+        if config.DEFAULT_STREAM and (resume or from_stage):
+            print("--resume y --from-stage solo se admiten en modo por lotes (sin --stream)", file=sys.stderr)
+            return 2
+        if (resume or from_stage) and not config.DEFAULT_SEED:
+            print("--resume y --from-stage necesitan --seed (la de la ejecución que se quiere continuar)",
+                  file=sys.stderr)
+            return 2
+        print("Iniciando proceso ETL de usuarios...\n")
+        if not controller.run(n_users=config.DEFAULT_N_USERS, seed=config.DEFAULT_SEED,
+                              stream=config.DEFAULT_STREAM, resume=resume, from_stage=from_stage):
+            return 1
+        print("\nProceso ETL finalizado con éxito.")
+    elif command == "extract":
+        path = controller.extract(n_users=config.DEFAULT_N_USERS, seed=config.DEFAULT_SEED,
+                                  filename=args.output or RAW_USERS_FILENAME)
+        print(f"Usuarios extraídos en {path}")
+    elif command == "load":
+        if not controller.load(filename=args.input or RAW_USERS_FILENAME, plots=args.plots):
+            return 1
+        print("Carga finalizada con éxito.")
+    elif command == "stats":
+        if not controller.refresh_stats():
+            return 1
+        print("stats.json actualizado.")
+    return 0
 
-    print("\nProceso ETL finalizado con éxito.")
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,441 @@
+"""
+user_batch.py
+---------
+Almacén columnar compacto para lotes de usuarios.
+
+En lugar de un objeto User (con su propio __dict__) por usuario, UserBatch
+guarda una columna por campo:
+
+- Edades en array('H') (2 bytes por usuario).
+- Textos repetidos (género, nombre, país, dominio, región, grupos...) con
+  codificación por diccionario: cada valor distinto se guarda una sola vez,
+  internado, y cada fila guarda solo un código entero en array('H') (que
+  pasa a array('I') si hay más de 65535 valores distintos).
+- Textos únicos (email, uuid) concatenados en UTF-8 en un único bytearray,
+  con un array de desplazamientos.
+- Población en array('q') y el flag de outlier en un bitset.
+
+Al iterar o indexar se obtienen vistas de fila (UserRow) que se comportan
+como User: se leen y asignan los mismos atributos, así que los servicios
+que trabajan con listas de User funcionan sin cambios sobre un UserBatch.
+"""
+
+import sys
+from array import array
+from collections import Counter
+from itertools import accumulate, islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+from src.models.user_model import User, user_fields
+
+# Campos de texto con pocos valores distintos -> codificación por diccionario
+DICT_FIELDS = (
+    "gender", "first_name", "last_name", "country", "age_group",
+    "age_category", "email_domain", "email_preference", "region",
+)
+# Campos de texto prácticamente únicos por usuario -> UTF-8 concatenado
+PLAIN_FIELDS = ("email", "uuid")
+
+FIELD_NAMES = [name for name, _ in user_fields()]
+
+# Centinela de "sin valor" en la columna de población
+_NO_POPULATION = -1
+
+
+class StringColumn:
+    """Columna de texto codificada por diccionario (el código 0 es None)."""
+
+    __slots__ = ("values", "index", "codes")
+
+    def __init__(self) -> None:
+        self.values: List[Optional[str]] = [None]
+        self.index: Dict[Optional[str], int] = {None: 0}
+        self.codes = array("H")
+
+    def code(self, value: Optional[str]) -> int:
+        code = self.index.get(value)
+        if code is None:
+            if isinstance(value, str):
+                value = sys.intern(value)
+            code = len(self.values)
+            self.values.append(value)
+            self.index[value] = code
+            if code > 0xFFFF and self.codes.typecode == "H":
+                self.codes = array("I", self.codes)
+        return code
+
+    def append(self, value: Optional[str]) -> None:
+        self.codes.append(self.code(value))
+
+    def __getitem__(self, i: int) -> Optional[str]:
+        return self.values[self.codes[i]]
+
+    def __setitem__(self, i: int, value: Optional[str]) -> None:
+        self.codes[i] = self.code(value)
+
+    def __iter__(self) -> Iterator[Optional[str]]:
+        values = self.values
+        return (values[c] for c in self.codes)
+
+    def counts(self) -> Counter:
+        """Frecuencia de cada valor, contando códigos enteros en vez de textos."""
+        values = self.values
+        return Counter({values[c]: n for c, n in Counter(self.codes).items()})
+
+    def extend_from(self, other: "StringColumn") -> None:
+        """Añade los códigos de otra columna traduciéndolos a este diccionario."""
+        remap = [self.code(v) for v in other.values]
+        self.codes.extend(remap[c] for c in other.codes)
+
+    def take(self, indices: Iterable[int]) -> "StringColumn":
+        column = StringColumn()
+        column.values = list(self.values)
+        column.index = dict(self.index)
+        codes = self.codes
+        column.codes = array(codes.typecode, (codes[i] for i in indices))
+        return column
+
+
+class BytesColumn:
+    """Columna de textos únicos: UTF-8 concatenado más desplazamientos de fin."""
+
+    __slots__ = ("data", "ends")
+
+    def __init__(self) -> None:
+        self.data = bytearray()
+        self.ends = array("I")
+
+    def append(self, value: Optional[str]) -> None:
+        self.data += (value or "").encode("utf-8")
+        self.ends.append(len(self.data))
+
+    def extend(self, values: Iterable[Optional[str]]) -> None:
+        for value in values:
+            self.append(value)
+
+    def __len__(self) -> int:
+        return len(self.ends)
+
+    def __getitem__(self, i: int) -> str:
+        start = self.ends[i - 1] if i else 0
+        return self.data[start:self.ends[i]].decode("utf-8")
+
+    def __setitem__(self, i: int, value: Optional[str]) -> None:
+        # Poco frecuente (email/uuid no se modifican en el pipeline): se reconstruye
+        values = list(self)
+        values[i] = value
+        self.data, self.ends = bytearray(), array("I")
+        self.extend(values)
+
+    def __iter__(self) -> Iterator[str]:
+        data, start = self.data, 0
+        for end in self.ends:
+            yield data[start:end].decode("utf-8")
+            start = end
+
+    def nbytes(self) -> int:
+        return len(self.data) + self.ends.itemsize * len(self.ends)
+
+
+class BitColumn:
+    """Columna booleana opcional: un bit de valor y un bit de "conocido" por fila."""
+
+    __slots__ = ("length", "known", "bits")
+
+    def __init__(self) -> None:
+        self.length = 0
+        self.known = bytearray()
+        self.bits = bytearray()
+
+    def append(self, value: Optional[bool]) -> None:
+        i = self.length
+        self.length += 1
+        if i % 8 == 0:
+            self.known.append(0)
+            self.bits.append(0)
+        self[i] = value
+
+    def __getitem__(self, i: int) -> Optional[bool]:
+        byte, mask = i >> 3, 1 << (i & 7)
+        if not self.known[byte] & mask:
+            return None
+        return bool(self.bits[byte] & mask)
+
+    def __setitem__(self, i: int, value: Optional[bool]) -> None:
+        byte, mask = i >> 3, 1 << (i & 7)
+        if value is None:
+            self.known[byte] &= ~mask
+            self.bits[byte] &= ~mask
+        else:
+            self.known[byte] |= mask
+            if value:
+                self.bits[byte] |= mask
+            else:
+                self.bits[byte] &= ~mask
+
+    def __iter__(self) -> Iterator[Optional[bool]]:
+        return (self[i] for i in range(self.length))
+
+    def count_true(self) -> int:
+        return sum(bin(b).count("1") for b in self.bits)
+
+
+class UserBatch:
+    """Lote columnar de usuarios; se indexa e itera como una lista de User."""
+
+    def __init__(self) -> None:
+        self.ages = array("H")
+        self.populations = array("q")
+        self.outliers = BitColumn()
+        self.strings: Dict[str, StringColumn] = {name: StringColumn() for name in DICT_FIELDS}
+        self.plain: Dict[str, BytesColumn] = {name: BytesColumn() for name in PLAIN_FIELDS}
+
+    # ----------------------------
+    # CONSTRUCCIÓN
+    # ----------------------------
+    @classmethod
+    def from_users(cls, users: Iterable[User]) -> "UserBatch":
+        batch = cls()
+        batch.extend(users)
+        return batch
+
+    @classmethod
+    def from_columns(cls, columns: Dict[str, Sequence[Any]]) -> "UserBatch":
+        """
+        Construye un lote columna a columna, sin crear un User por fila (p. ej.
+        desde el parser de RandomUser). Todas las columnas tienen la misma
+        longitud; los campos que no estén en `columns` quedan vacíos (None).
+        """
+        batch = cls()
+        n = len(next(iter(columns.values()))) if columns else 0
+        if n == 0:
+            return batch
+
+        ages = columns.get("age")
+        batch.ages = array("H", ages) if ages is not None else array("H", [0]) * n
+        populations = columns.get("population")
+        if populations is not None:
+            batch.populations = array("q", (_NO_POPULATION if p is None else p for p in populations))
+        else:
+            batch.populations = array("q", [_NO_POPULATION]) * n
+        outliers = columns.get("is_outlier")
+        if outliers is not None:
+            for value in outliers:
+                batch.outliers.append(value)
+        else:
+            # Todas las filas sin valor: bits a cero
+            batch.outliers.length = n
+            batch.outliers.known = bytearray((n + 7) // 8)
+            batch.outliers.bits = bytearray((n + 7) // 8)
+
+        for name, column in batch.strings.items():
+            values = columns.get(name)
+            if values is None:
+                column.codes = array("H", [0]) * n
+            else:
+                # code() puede cambiar el tipo del array de códigos: se crea al final
+                codes = list(map(column.code, values))
+                column.codes = array(column.codes.typecode, codes)
+        for name, column in batch.plain.items():
+            encoded = [(value or "").encode("utf-8") for value in columns.get(name, ())] or [b""] * n
+            column.data = bytearray(b"".join(encoded))
+            column.ends = array("I", accumulate(map(len, encoded)))
+        return batch
+
+    def append(self, user: Any) -> None:
+        """Añade un User (o cualquier objeto con sus atributos)."""
+        self.ages.append(user.age)
+        population = user.population
+        self.populations.append(_NO_POPULATION if population is None else population)
+        self.outliers.append(user.is_outlier)
+        for name, column in self.strings.items():
+            column.append(getattr(user, name))
+        for name, column in self.plain.items():
+            column.append(getattr(user, name))
+
+    def extend(self, users: Iterable[Any]) -> None:
+        """Añade usuarios; si es otro UserBatch se copian las columnas directamente."""
+        if isinstance(users, UserBatch):
+            self.ages.extend(users.ages)
+            self.populations.extend(users.populations)
+            for value in users.outliers:
+                self.outliers.append(value)
+            for name, column in self.strings.items():
+                column.extend_from(users.strings[name])
+            for name, column in self.plain.items():
+                column.extend(users.plain[name])
+            return
+        for user in users:
+            self.append(user)
+
+    # ----------------------------
+    # ACCESO A CAMPOS
+    # ----------------------------
+    def get(self, i: int, name: str) -> Any:
+        if name == "age":
+            return self.ages[i]
+        if name == "population":
+            value = self.populations[i]
+            return None if value == _NO_POPULATION else value
+        if name == "is_outlier":
+            return self.outliers[i]
+        if name in self.strings:
+            return self.strings[name][i]
+        return self.plain[name][i]
+
+    def set(self, i: int, name: str, value: Any) -> None:
+        if name == "age":
+            self.ages[i] = value
+        elif name == "population":
+            self.populations[i] = _NO_POPULATION if value is None else value
+        elif name == "is_outlier":
+            self.outliers[i] = value
+        elif name in self.strings:
+            self.strings[name][i] = value
+        elif name in self.plain:
+            self.plain[name][i] = value
+        else:
+            raise AttributeError(f"User no tiene el campo {name!r}")
+
+    def column(self, name: str) -> Iterable[Any]:
+        """Iterable con todos los valores de un campo, sin crear vistas de fila."""
+        if name == "age":
+            return self.ages
+        if name == "population":
+            return (None if p == _NO_POPULATION else p for p in self.populations)
+        if name == "is_outlier":
+            return iter(self.outliers)
+        if name in self.strings:
+            return iter(self.strings[name])
+        return iter(self.plain[name])
+
+    def value_counts(self, name: str) -> Counter:
+        """Frecuencia de cada valor de un campo."""
+        if name in self.strings:
+            return self.strings[name].counts()
+        return Counter(self.column(name))
+
+    # ----------------------------
+    # PROTOCOLO DE SECUENCIA
+    # ----------------------------
+    def __len__(self) -> int:
+        return len(self.ages)
+
+    def __getitem__(self, i: int) -> "UserRow":
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("índice de usuario fuera de rango")
+        return UserRow(self, i)
+
+    def __iter__(self) -> Iterator["UserRow"]:
+        return (UserRow(self, i) for i in range(len(self)))
+
+    def take(self, indices: List[int]) -> "UserBatch":
+        """Nuevo lote con las filas indicadas (en ese orden)."""
+        batch = UserBatch()
+        ages, populations = self.ages, self.populations
+        batch.ages = array("H", (ages[i] for i in indices))
+        batch.populations = array("q", (populations[i] for i in indices))
+        for i in indices:
+            batch.outliers.append(self.outliers[i])
+        batch.strings = {name: column.take(indices) for name, column in self.strings.items()}
+        for name, column in self.plain.items():
+            batch.plain[name].extend(column[i] for i in indices)
+        return batch
+
+    def filter(self, predicate: Callable[["UserRow"], bool]) -> "UserBatch":
+        """Nuevo lote con las filas que cumplen el predicado."""
+        return self.take([row._index for row in self if predicate(row)])
+
+    # ----------------------------
+    # CONVERSIONES
+    # ----------------------------
+    def to_users(self) -> List[User]:
+        return [row.to_user() for row in self]
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        """Filas como diccionarios (formato que reciben los loaders), columna a columna."""
+        columns = [self.column(name) for name in FIELD_NAMES]
+        return [dict(zip(FIELD_NAMES, values)) for values in zip(*columns)]
+
+    def nbytes(self) -> int:
+        """Tamaño aproximado en memoria de las columnas (sin los diccionarios de valores)."""
+        size = self.ages.itemsize * len(self.ages) + self.populations.itemsize * len(self.populations)
+        size += len(self.outliers.known) + len(self.outliers.bits)
+        size += sum(c.codes.itemsize * len(c.codes) for c in self.strings.values())
+        size += sum(c.nbytes() for c in self.plain.values())
+        return size
+
+    def __repr__(self) -> str:
+        return f"UserBatch({len(self)} usuarios)"
+
+
+class UserRow:
+    """Vista de una fila de UserBatch con la misma interfaz de atributos que User."""
+
+    __slots__ = ("_batch", "_index")
+
+    def __init__(self, batch: UserBatch, index: int) -> None:
+        object.__setattr__(self, "_batch", batch)
+        object.__setattr__(self, "_index", index)
+
+    def __getattr__(self, name: str) -> Any:
+        if name in FIELD_NAMES:
+            return self._batch.get(self._index, name)
+        raise AttributeError(name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        self._batch.set(self._index, name, value)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: self._batch.get(self._index, name) for name in FIELD_NAMES}
+
+    def to_user(self) -> User:
+        """Copia independiente del lote (útil para conservar filas sueltas)."""
+        return User(**self.to_dict())
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, (UserRow, User)):
+            return all(getattr(self, n) == getattr(other, n) for n in FIELD_NAMES)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return "UserRow(" + ", ".join(f"{n}={getattr(self, n)!r}" for n in FIELD_NAMES) + ")"
+
+
+def to_dicts(users: Iterable[Any]) -> List[Dict[str, Any]]:
+    """Convierte un UserBatch o una lista de User en la lista de dicts de los loaders."""
+    if isinstance(users, UserBatch):
+        return users.to_dicts()
+    return [u.to_dict() for u in users]
+
+
+def iter_dicts(users: Iterable[Any], size: int) -> Iterator[List[Dict[str, Any]]]:
+    """Como `to_dicts`, pero en bloques de `size` filas que se crean según se piden."""
+    if isinstance(users, UserBatch):
+        rows = (dict(zip(FIELD_NAMES, values)) for values in zip(*(users.column(n) for n in FIELD_NAMES)))
+    else:
+        rows = (u.to_dict() for u in users)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def value_counts(users: Iterable[Any], name: str, default: Any = None) -> Counter:
+    """Frecuencias de un campo para un UserBatch o una lista de User (None -> default)."""
+    if isinstance(users, UserBatch):
+        counts = users.value_counts(name)
+    else:
+        counts = Counter(getattr(u, name) for u in users)
+    if default is not None and None in counts:
+        counts[default] += counts.pop(None)
+    return counts
+
+
+def column(users: Iterable[Any], name: str) -> Iterable[Any]:
+    """Valores de un campo para un UserBatch o una lista de User."""
+    if isinstance(users, UserBatch):
+        return users.column(name)
+    return (getattr(u, name) for u in users)
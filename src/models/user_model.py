@@ -1,4 +1,5 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, fields
+from typing import List, Optional, Tuple, Union, get_args, get_origin, get_type_hints
 
 @dataclass
 class User:
@@ -9,6 +10,16 @@ class User:
     country: str
     age: int
     email: str
+    # Identificador estable del usuario en la API (login.uuid)
+    uuid: str = ""
+    # Campos derivados, rellenados por TransformerService
+    age_group: Optional[str] = None
+    age_category: Optional[str] = None
+    email_domain: Optional[str] = None
+    email_preference: Optional[str] = None
+    is_outlier: Optional[bool] = None
+    region: Optional[str] = None
+    population: Optional[int] = None
 
     @staticmethod
     def from_api(data: dict) -> "User":
@@ -19,5 +30,27 @@ class User:
             last_name=data.get("name", {}).get("last", ""),
             country=data.get("location", {}).get("country", ""),
             age=data.get("dob", {}).get("age", 0),
-            email=data.get("email", "")
+            email=data.get("email", ""),
+            uuid=data.get("login", {}).get("uuid", "")
         )
+
+    def to_dict(self) -> dict:
+        """Devuelve los campos del usuario como diccionario (formato de los loaders)."""
+        return dict(self.__dict__)
+
+
+def user_fields() -> List[Tuple[str, type]]:
+    """
+    Devuelve el esquema de User enriquecido como pares (campo, tipo base).
+
+    Los tipos Optional[X] se resuelven a X, de modo que los loaders pueden
+    generar su esquema (columnas SQL, cabecera CSV...) a partir del modelo.
+    """
+    hints = get_type_hints(User)
+    schema = []
+    for f in fields(User):
+        tp = hints[f.name]
+        if get_origin(tp) is Union:
+            tp = next(a for a in get_args(tp) if a is not type(None))
+        schema.append((f.name, tp))
+    return schema
@@ -0,0 +1,140 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+from src.utils.logger import setup_logger
+from src.config import COUNTRY_CACHE_TTL, COUNTRY_CACHE_NEGATIVE_TTL, COUNTRY_CACHE_OFFLINE
+
+logger = setup_logger(__name__)
+
+# Función que descarga los datos de un país: devuelve un dict, None si el país
+# no existe (404, se guarda como caché negativa) o lanza excepción si el fallo
+# es transitorio (no se guarda).
+CountryFetcher = Callable[[str], Optional[dict]]
+
+
+class CountryCache:
+    """
+    Caché persistente en SQLite de los metadatos de país (región, población).
+
+    - Las entradas válidas (TTL) se sirven sin tocar la red.
+    - Los 404 se guardan como caché negativa con un TTL más corto.
+    - Una entrada caducada se devuelve igualmente y se refresca en segundo
+      plano (stale-while-revalidate), así la ejecución actual no espera.
+    - En modo offline nunca se hacen peticiones: lo que no está en caché
+      se trata como desconocido.
+    """
+
+    def __init__(self, db_path: str, ttl: int = COUNTRY_CACHE_TTL,
+                 negative_ttl: int = COUNTRY_CACHE_NEGATIVE_TTL,
+                 offline: bool = COUNTRY_CACHE_OFFLINE) -> None:
+        self.db_path = db_path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.offline = offline
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self._executor = None
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS countries (
+                    country TEXT PRIMARY KEY,
+                    found INTEGER NOT NULL,
+                    region TEXT,
+                    population INTEGER,
+                    fetched_at REAL NOT NULL
+                )
+            """)
+
+    @contextmanager
+    def _connect(self):
+        # Una conexión por operación: la caché se usa desde varios hilos
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _read(self, country: str):
+        with self._lock, self._connect() as conn:
+            return conn.execute(
+                "SELECT found, region, population, fetched_at FROM countries WHERE country = ?",
+                (country,)
+            ).fetchone()
+
+    def put(self, country: str, info: Optional[dict]) -> None:
+        """Guarda el resultado de una consulta (None = país no encontrado)."""
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO countries (country, found, region, population, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (country, info is not None,
+                 info.get("region") if info else None,
+                 info.get("population") if info else None,
+                 time.time())
+            )
+
+    def get(self, country: str, fetch: CountryFetcher) -> Optional[dict]:
+        """
+        Devuelve los datos del país usando la caché cuando es posible.
+
+        Args:
+            country: Nombre del país
+            fetch: Función que consulta la API si hace falta
+
+        Returns:
+            Diccionario con region/population, o None si no hay datos.
+        """
+        row = self._read(country)
+
+        if row is not None:
+            found, region, population, fetched_at = row
+            info = {"region": region, "population": population} if found else None
+            ttl = self.ttl if found else self.negative_ttl
+            self.hits += 1
+            if time.time() - fetched_at > ttl and not self.offline:
+                self._refresh_in_background(country, fetch)
+            return info
+
+        self.misses += 1
+        if self.offline:
+            return None
+
+        info = fetch(country)
+        self.put(country, info)
+        return info
+
+    def _refresh_in_background(self, country: str, fetch: CountryFetcher) -> None:
+        with self._lock:
+            if country in self._refreshing:
+                return
+            self._refreshing.add(country)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="country-refresh")
+        self._executor.submit(self._refresh, country, fetch)
+
+    def _refresh(self, country: str, fetch: CountryFetcher) -> None:
+        try:
+            self.put(country, fetch(country))
+            logger.info("Entrada de caché refrescada para %s", country)
+        except Exception as e:
+            # Se conserva la entrada caducada; se reintentará en otra ejecución
+            logger.warning("No se pudo refrescar %s en segundo plano: %s", country, e)
+        finally:
+            with self._lock:
+                self._refreshing.discard(country)
+
+    def close(self) -> None:
+        """Espera a que terminen los refrescos pendientes en segundo plano."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        logger.info("Caché de países: %d aciertos, %d fallos.", self.hits, self.misses)
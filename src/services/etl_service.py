@@ -1,38 +1,52 @@
-import requests
-from collections import Counter
-from typing import List, Dict, Any
+import secrets
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple, Iterator
 from src.models.user_model import User
+from src.models.user_batch import UserBatch, column, value_counts
+from src.services.randomuser_parser import parse_users
+from src.services.response_store import ResponseStore
+from src.utils.http import LazySession
 from src.utils.logger import setup_logger
-from src.config import DEFAULT_N_USERS, API_TIMEOUT, build_randomuser_url
+from src.utils.stats import AgeStats
+from src.config import (
+    DEFAULT_N_USERS, API_TIMEOUT, MAX_USERS_PER_REQUEST, EXTRACTION_PAGE_SIZE, EXTRACTION_MAX_WORKERS,
+    API_MAX_RETRIES, API_RETRY_BACKOFF, build_randomuser_url
+)
 
 logger = setup_logger(__name__)
 
-def _mean(data: list) -> float:
-    return sum(data) / len(data) if data else 0.0
-
-def _median(data: list) -> float:
-    n = len(data)
-    if n == 0:
-        return 0.0
-    sorted_data = sorted(data)
-    mid = n // 2
-    if n % 2 == 0:
-        return (sorted_data[mid-1] + sorted_data[mid]) / 2
-    return sorted_data[mid]
-
-def _pstdev(data: list) -> float:
-    n = len(data)
-    if n == 0:
-        return 0.0
-    mu = _mean(data)
-    return (sum((x - mu) ** 2 for x in data) / n) ** 0.5
 
 class ETLService:
     """Servicio ETL: extracción y transformación básica de usuarios."""
 
-    def extract_users(self, n: int = None, seed: str = None) -> List[User]:
+    # Sesión HTTP con pool de max_workers conexiones, creada en la primera petición
+    session = LazySession()
+
+    def __init__(self, page_size: int = EXTRACTION_PAGE_SIZE, max_workers: int = EXTRACTION_MAX_WORKERS,
+                 responses: Optional[ResponseStore] = None):
+        """
+        Args:
+            page_size: Usuarios por petición (límite de la API: MAX_USERS_PER_REQUEST)
+            max_workers: Número máximo de páginas descargadas en paralelo
+            responses: Almacén de respuestas para las peticiones con seed
+                       (None = descargar siempre)
+        """
+        self.page_size = max(1, min(page_size, MAX_USERS_PER_REQUEST))
+        self.max_workers = max(1, max_workers)
+        self.responses = responses
+        self.failed_pages: List[int] = []
+
+    def extract_users(self, n: int = None, seed: str = None) -> UserBatch:
         """
         Extrae usuarios desde la API RandomUser.
+
+        Si n supera el tamaño de página, la extracción se divide en páginas
+        (parámetros page/seed) que se descargan en paralelo con un número
+        acotado de hilos. Cada página tiene sus propios reintentos y el
+        resultado se une siempre en orden de página. Si una página falla
+        definitivamente se registra en `failed_pages` y se continúa con el resto.
         
         Args:
             n: Número de usuarios a extraer (por defecto desde config)
@@ -40,48 +54,167 @@ class ETLService:
                   la API devolverá siempre los mismos usuarios para ese seed.
                   
         Returns:
-            Lista de objetos User con los datos extraídos.
+            UserBatch (almacén columnar) con los usuarios extraídos; se indexa
+            e itera igual que una lista de User.
+        """
+        users = UserBatch()
+        for batch in self.stream_users(n, seed=seed):
+            users.extend(batch)
+        return users
+
+    def stream_users(self, n: int = None, seed: str = None) -> Iterator[UserBatch]:
+        """
+        Versión en streaming de `extract_users`: genera un lote de User por página.
+
+        Solo hay `max_workers` páginas en vuelo a la vez (ventana deslizante),
+        así que la memoria no depende de n y el consumidor puede empezar a
+        procesar la primera página mientras se descargan las siguientes.
+        Los lotes se entregan en orden de página.
+
+        Args:
+            n: Número de usuarios a extraer (por defecto desde config)
+            seed: Semilla opcional para reproducibilidad
+
+        Yields:
+            Un UserBatch por página descargada con éxito.
         """
         n = n or DEFAULT_N_USERS
+        pages = self._plan_pages(n)
+        paginated = len(pages) > 1
+        if self.responses is not None and self.responses.replay and not seed:
+            raise ValueError("El modo replay necesita una seed: sin ella no hay respuestas reproducibles")
+
+        # Sin seed, las páginas no serían coherentes entre sí: generamos uno
+        # para la ejecución y lo registramos para poder reproducirla.
+        if paginated and not seed:
+            seed = secrets.token_hex(8)
+            logger.info("Extracción paginada sin seed: se usará seed='%s'", seed)
+
         seed_msg = f" con seed='{seed}'" if seed else ""
-        logger.info(f"Iniciando extracción de {n} usuarios{seed_msg}...")
-
-        url = build_randomuser_url(n_users=n, seed=seed)
-            
-        try:
-            response = requests.get(url, timeout=API_TIMEOUT)
-            response.raise_for_status()
-            data = response.json().get("results", [])
-            users = [User.from_api(u) for u in data]
-            logger.info(f"Extracción completada: {len(users)} usuarios.")
-        except Exception as e:
-            logger.error(f"Error en la extracción: {e}")
-            users = []
+        logger.info("Iniciando extracción de %d usuarios%s en %d página(s)...", n, seed_msg, len(pages))
+
+        self.failed_pages = []
+        total = 0
+        workers = min(self.max_workers, len(pages))
+        remaining = iter(pages)
+        in_flight = deque()
 
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            def submit_next():
+                for page, size in remaining:
+                    in_flight.append((page, executor.submit(self._fetch_page, page, size, seed, paginated)))
+                    return
+
+            for _ in range(workers):
+                submit_next()
+
+            # Consumimos en orden de página, no en orden de llegada
+            while in_flight:
+                page, future = in_flight.popleft()
+                try:
+                    batch = future.result()
+                except Exception as e:
+                    logger.error("Error en la extracción de la página %d: %s", page, e)
+                    self.failed_pages.append(page)
+                    batch = None
+                submit_next()
+                if batch:
+                    total += len(batch)
+                    yield batch
+
+        if self.failed_pages:
+            logger.warning("Páginas fallidas: %s", self.failed_pages)
+        logger.info("Extracción completada: %d usuarios.", total)
+
+    def _plan_pages(self, n: int) -> List[Tuple[int, int]]:
+        """Divide n usuarios en páginas (número de página, usuarios a conservar)."""
+        if n <= self.page_size:
+            return [(1, n)]
+        n_pages = -(-n // self.page_size)
+        last = n - (n_pages - 1) * self.page_size
+        return [(page, self.page_size) for page in range(1, n_pages)] + [(n_pages, last)]
+
+    def _fetch_page(self, page: int, keep: int, seed: str, paginated: bool) -> UserBatch:
+        """
+        Descarga una página con reintentos y backoff exponencial.
+
+        Todas las páginas se piden con el mismo tamaño (la última se recorta a
+        `keep`), de modo que una misma seed produce siempre las mismas páginas.
+        Con seed, la página se lee del almacén de respuestas si ya está y, si
+        no, se guarda tras descargarla.
+        """
+        if paginated:
+            url = build_randomuser_url(n_users=self.page_size, seed=seed, page=page)
+        else:
+            url = build_randomuser_url(n_users=keep, seed=seed)
+
+        store = self.responses if seed else None
+        body = store.get(url) if store is not None else None
+        if body is not None:
+            return parse_users(body, limit=keep)
+        if store is not None and store.replay:
+            raise LookupError(f"la página no está en el almacén de respuestas ({url})")
+
+        body, users = self._download(url, page, keep)
+        if store is not None:
+            store.put(url, body)
         return users
 
-    def clean_users(self, users: List[User]) -> List[User]:
+    def _download(self, url: str, page: int, keep: int) -> Tuple[bytes, UserBatch]:
+        """Descarga `url` con reintentos; devuelve el cuerpo y sus `keep` primeros usuarios."""
+        import requests  # ya cargado por la sesión; aquí solo para sus excepciones
+
+        for attempt in range(1, API_MAX_RETRIES + 1):
+            try:
+                response = self.session.get(url, timeout=API_TIMEOUT)
+                response.raise_for_status()
+                # Se valida el JSON antes de guardarlo: un cuerpo truncado se reintenta
+                return response.content, parse_users(response.content, limit=keep)
+            except (requests.RequestException, ValueError) as e:
+                status = getattr(getattr(e, "response", None), "status_code", None)
+                # Los errores 4xx (salvo 429) no se arreglan reintentando
+                retryable = status is None or status == 429 or status >= 500
+                if not retryable or attempt == API_MAX_RETRIES:
+                    raise
+                wait = API_RETRY_BACKOFF * 2 ** (attempt - 1)
+                logger.warning("Página %d: intento %d fallido (%s); reintentando en %.1fs", page, attempt, e, wait)
+                time.sleep(wait)
+        return b"", UserBatch()
+
+    def clean_users(self, users: UserBatch) -> UserBatch:
         """Limpia usuarios eliminando registros incompletos o inválidos."""
-        cleaned = [u for u in users if u.email and u.age > 0 and u.country]
-        logger.info(f"Limpieza completada: {len(cleaned)} usuarios válidos de {len(users)} totales.")
+        def is_valid(u) -> bool:
+            return bool(u.email and u.age > 0 and u.country)
+
+        if isinstance(users, UserBatch):
+            cleaned = users.filter(is_valid)
+        else:
+            cleaned = [u for u in users if is_valid(u)]
+        logger.info("Limpieza completada: %d usuarios válidos de %d totales.", len(cleaned), len(users))
         return cleaned
 
-    def transform_users(self, users: List[User]) -> Dict[str, Any]:
-        """Calcula estadísticas descriptivas básicas."""
-        ages = [u.age for u in users]
-        genders = [u.gender for u in users]
-        countries = [u.country for u in users]
+    def transform_users(self, users: List[User], age_stats: AgeStats = None) -> Dict[str, Any]:
+        """
+        Calcula estadísticas descriptivas básicas.
+
+        Args:
+            users: Usuarios limpios
+            age_stats: Acumulador de edades ya calculado (p. ej. compartido con
+                       TransformerService); si se omite se calcula aquí.
+        """
+        if age_stats is None:
+            age_stats = AgeStats.from_values(column(users, "age"))
 
         stats = {
             "total_users": len(users),
-            "avg_age": round(_mean(ages), 2),
-            "median_age": round(_median(ages), 2),
-            "std_age": round(_pstdev(ages), 2),
-            "min_age": min(ages) if ages else 0,
-            "max_age": max(ages) if ages else 0,
-            "gender_distribution": dict(Counter(genders)),
-            "top_countries": Counter(countries).most_common(10),
+            "avg_age": round(age_stats.mean, 2),
+            "median_age": round(age_stats.median, 2),
+            "std_age": round(age_stats.pstdev, 2),
+            "min_age": age_stats.min,
+            "max_age": age_stats.max,
+            "gender_distribution": dict(value_counts(users, "gender")),
+            "top_countries": value_counts(users, "country").most_common(10),
         }
 
-        logger.info(f"Transformación básica completada con estadísticas: {stats}")
+        logger.info("Transformación básica completada con estadísticas: %s", stats)
         return stats
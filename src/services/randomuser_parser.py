@@ -0,0 +1,114 @@
+"""
+randomuser_parser.py
+--------------------
+Parser de las respuestas de RandomUser directo a un UserBatch.
+
+De cada registro solo se leen los campos que usa el pipeline (gender,
+name.first/last, location.country, dob.age, email, login.uuid), que se
+acumulan por columnas y se cargan de una vez en UserBatch.from_columns: no
+se crea un User por usuario ni se encadenan .get() sobre cada objeto.
+
+El decodificador JSON se elige con JSON_BACKEND en config: orjson (el más
+rápido) o ijson (recorre `results` registro a registro, sin tener toda la
+respuesta decodificada en memoria) si están instalados; si no, el módulo
+json de la biblioteca estándar. Ambos son opcionales y se importan al
+decodificar la primera respuesta.
+"""
+
+import io
+import json
+from importlib.util import find_spec
+from typing import Iterator, Optional
+from src.config import JSON_BACKEND
+from src.models.user_batch import UserBatch
+from src.models.user_model import User
+
+JSON_BACKENDS = ("auto", "orjson", "ijson", "json")
+
+# Columnas que salen de cada registro, en el orden de las tuplas de `_rows`
+API_FIELDS = ("gender", "first_name", "last_name", "country", "age", "email", "uuid")
+
+_backend = None
+
+
+def _ijson_is_fast() -> bool:
+    """ijson solo compensa con su backend en C (yajl2_c); el de Python puro es más lento que json."""
+    if find_spec("ijson") is None:
+        return False
+    import ijson
+    return ijson.backend == "yajl2_c"
+
+
+def json_backend() -> str:
+    """Decodificador que se usará (resuelve "auto" la primera vez)."""
+    global _backend
+    if _backend is None:
+        if JSON_BACKEND not in JSON_BACKENDS:
+            raise ValueError(f"JSON_BACKEND no válido: {JSON_BACKEND!r} (opciones: {list(JSON_BACKENDS)})")
+        backend = JSON_BACKEND
+        if backend == "auto":
+            if find_spec("orjson") is not None:
+                backend = "orjson"
+            elif _ijson_is_fast():
+                backend = "ijson"
+            else:
+                backend = "json"
+        elif backend != "json" and find_spec(backend) is None:
+            raise ImportError(f"JSON_BACKEND={backend!r} requiere {backend} (pip install {backend})")
+        _backend = backend
+    return _backend
+
+
+def _records(body: bytes, limit: Optional[int]) -> Iterator[dict]:
+    """Registros de `results` (como mucho `limit`); ValueError si el JSON no es válido."""
+    backend = json_backend()
+    if backend == "ijson":
+        import ijson
+        try:
+            # Se recorre toda la respuesta para detectar un cuerpo truncado,
+            # pero solo se entregan los `limit` primeros registros
+            for i, record in enumerate(ijson.items(io.BytesIO(body), "results.item")):
+                if limit is None or i < limit:
+                    yield record
+        except ijson.JSONError as e:
+            raise ValueError(f"JSON no válido: {e}") from e
+        return
+
+    if backend == "orjson":
+        import orjson
+        data = orjson.loads(body)
+    else:
+        data = json.loads(body)
+    results = data.get("results", [])
+    yield from (results if limit is None else results[:limit])
+
+
+def _rows(records: Iterator[dict]) -> Iterator[tuple]:
+    """Una tupla por registro con los valores de API_FIELDS."""
+    for record in records:
+        try:
+            name = record["name"]
+            yield (record["gender"], name["first"], name["last"], record["location"]["country"],
+                   record["dob"]["age"], record["email"], record["login"]["uuid"])
+        except (KeyError, TypeError):
+            # Registro incompleto: los mismos valores por defecto que User.from_api
+            user = User.from_api(record)
+            yield (user.gender, user.first_name, user.last_name, user.country,
+                   user.age, user.email, user.uuid)
+
+
+def parse_users(body: bytes, limit: Optional[int] = None) -> UserBatch:
+    """
+    Decodifica una respuesta de RandomUser y devuelve sus usuarios.
+
+    Args:
+        body: Cuerpo de la respuesta (bytes)
+        limit: Número máximo de usuarios (p. ej. la última página recortada)
+
+    Raises:
+        ValueError: si el cuerpo no es JSON válido.
+    """
+    rows = list(_rows(_records(body, limit)))
+    if not rows:
+        return UserBatch()
+    return UserBatch.from_columns(dict(zip(API_FIELDS, zip(*rows))))
@@ -0,0 +1,123 @@
+import gzip
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+from src.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Modos de la caché de respuestas (RESPONSE_CACHE en config)
+RESPONSE_CACHE_MODES = ("off", "readwrite", "replay")
+
+
+def canonical_url(url: str) -> str:
+    """URL con los parámetros ordenados: ?seed=a&results=5 y ?results=5&seed=a son la misma petición."""
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((parts.scheme, parts.netloc.lower(), parts.path, query, ""))
+
+
+class ResponseStore:
+    """
+    Almacén local de respuestas de RandomUser direccionado por contenido.
+
+    - Cada cuerpo se guarda una sola vez, comprimido con gzip, en
+      objects/<aa>/<sha256 del cuerpo>.json.gz; al leerlo se comprueba el
+      hash, así que un archivo dañado se trata como ausente.
+    - Un índice SQLite (index.db) asocia cada petición (URL canónica, con
+      results, page y seed) al hash de su cuerpo.
+    - En modo replay no se hace ninguna petición: las páginas se reconstruyen
+      solo desde el almacén y las que falten se dan por fallidas.
+
+    Solo tiene sentido para peticiones con seed: sin ella la API devuelve
+    usuarios distintos en cada llamada.
+    """
+
+    def __init__(self, root: str, replay: bool = False) -> None:
+        self.root = root
+        self.replay = replay
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    url TEXT PRIMARY KEY,
+                    digest TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    stored_at REAL NOT NULL
+                )
+            """)
+
+    @contextmanager
+    def _connect(self):
+        # Una conexión por operación: las páginas se descargan desde varios hilos
+        conn = sqlite3.connect(os.path.join(self.root, "index.db"), timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.root, "objects", digest[:2], f"{digest}.json.gz")
+
+    def get(self, url: str) -> Optional[bytes]:
+        """Cuerpo guardado para `url`, o None si no está (o está dañado)."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT digest FROM responses WHERE url = ?", (canonical_url(url),)).fetchone()
+        body = None
+        if row is not None:
+            digest = row[0]
+            path = self._object_path(digest)
+            try:
+                with gzip.open(path, "rb") as f:
+                    body = f.read()
+                if hashlib.sha256(body).hexdigest() != digest:
+                    raise ValueError("el hash no coincide")
+            except FileNotFoundError:
+                body = None
+            except (OSError, EOFError, ValueError) as e:
+                # Se borra para que la siguiente descarga lo vuelva a escribir
+                logger.warning("Respuesta guardada dañada (%s): %s; se descarta.", digest, e)
+                body = None
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+        with self._lock:
+            if body is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return body
+
+    def put(self, url: str, body: bytes) -> str:
+        """Guarda el cuerpo de `url` (si ya existe ese contenido, solo se indexa) y devuelve su hash."""
+        digest = hashlib.sha256(body).hexdigest()
+        path = self._object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Temporal por hilo y renombrado: nunca queda un objeto a medias
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with gzip.open(tmp_path, "wb", compresslevel=6) as f:
+                f.write(body)
+            os.replace(tmp_path, path)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (url, digest, size, stored_at) VALUES (?, ?, ?, ?)",
+                (canonical_url(url), digest, len(body), time.time())
+            )
+        return digest
+
+    def close(self) -> None:
+        logger.info("Caché de respuestas de RandomUser: %d aciertos, %d fallos%s.",
+                    self.hits, self.misses, " (modo replay)" if self.replay else "")
@@ -1,37 +1,56 @@
-import requests
+import logging
+import math
 from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Optional, Tuple
 from src.models.user_model import User
+from src.models.user_batch import column, value_counts
+from src.services.country_cache import CountryCache
+from src.utils.aggregates import NUMERIC_FIELDS, AggregateView, SketchView
+from src.utils.http import LazySession
 from src.utils.logger import setup_logger
-from src.config import API_TIMEOUT, POPULAR_EMAIL_DOMAINS, OUTLIER_IQR_COEFFICIENT, TOP_COUNTRIES_COUNT, TOP_EMAIL_DOMAINS_COUNT, build_restcountries_url
+from src.utils.stats import AgeStats
+from src.utils.sketches import KLLSketch, SpaceSaving, CountMinSketch
+from src.config import COUNTRY_API_TIMEOUT, COUNTRY_LOOKUP_WORKERS, POPULAR_EMAIL_DOMAINS, OUTLIER_IQR_COEFFICIENT, TOP_COUNTRIES_COUNT, TOP_EMAIL_DOMAINS_COUNT, SKETCH_KLL_K, SKETCH_TOPK_CAPACITY, SKETCH_CMS_WIDTH, SKETCH_CMS_DEPTH, build_restcountries_url
 
 logger = setup_logger(__name__)
 
-def _mean(data: list) -> float:
-    return sum(data) / len(data) if data else 0.0
-
-def _median(data: list) -> float:
-    n = len(data)
-    if n == 0:
-        return 0.0
-    sorted_data = sorted(data)
-    mid = n // 2
-    if n % 2 == 0:
-        return (sorted_data[mid-1] + sorted_data[mid]) / 2
-    return sorted_data[mid]
-
-def _pstdev(data: list) -> float:
-    n = len(data)
-    if n == 0:
-        return 0.0
-    mu = _mean(data)
-    return (sum((x - mu) ** 2 for x in data) / n) ** 0.5
-
 class TransformerService:
     """Transformaciones avanzadas y enriquecimiento de datos de usuarios (sin pandas)."""
 
-    def __init__(self, users: list[User]):
+    # Sesión HTTP con pool de max_workers conexiones, creada en la primera consulta
+    session = LazySession()
+
+    def __init__(self, users: list[User], country_cache: Optional[CountryCache] = None,
+                 max_workers: int = COUNTRY_LOOKUP_WORKERS, age_stats: Optional[AgeStats] = None):
+        self.users = users
+        # Acumulador de edades compartido (p. ej. con ETLService.transform_users);
+        # se calcula una sola vez y sirve a outliers y estadísticas
+        self.age_stats = age_stats
+        # Caché persistente opcional para las consultas a RestCountries
+        self.country_cache = country_cache
+        # Consultas de país simultáneas, todas sobre una única sesión HTTP
+        self.max_workers = max(1, max_workers)
+        # Datos de país ya consultados; se conservan entre lotes en modo streaming
+        self.country_data: dict = {}
+        # Límites IQR (inferior, superior) usados en la última detección de outliers
+        self.outlier_bounds: Optional[Tuple[float, float]] = None
+        logger.info("Inicializando Transformer con %d registros.", len(users))
+
+    def process_batch(self, users: list[User]) -> list[User]:
+        """
+        Aplica enriquecimiento, outliers y datos de país a un lote (modo streaming).
+
+        Los límites IQR se calculan con el primer lote y se reutilizan en los
+        siguientes (el primer lote es una página completa de la API, una muestra
+        suficiente), y los países ya consultados no se vuelven a pedir.
+        """
         self.users = users
-        logger.info(f"Inicializando Transformer con {len(users)} registros.")
+        self.age_stats = None
+        self.enrich_data()
+        self.detect_outliers(bounds=self.outlier_bounds)
+        self.enrich_with_country_data()
+        return self.users
 
     # ----------------------------
     # ENRIQUECIMIENTO DE DATOS
@@ -75,99 +94,306 @@ class TransformerService:
     # ----------------------------
     # DETECCIÓN DE OUTLIERS
     # ----------------------------
-    def detect_outliers(self):
-        """Detecta valores atípicos (outliers) de edad usando el método IQR."""
-        ages = [u.age for u in self.users]
-        if not ages:
+    def detect_outliers(self, bounds: Optional[Tuple[float, float]] = None):
+        """
+        Detecta valores atípicos (outliers) de edad usando el método IQR.
+
+        Args:
+            bounds: Límites (inferior, superior) ya calculados. Si se omiten,
+                    se calculan a partir de los usuarios actuales.
+        """
+        if not self.users:
             logger.warning("No hay datos para detectar outliers.")
             return
-            
-        q1, q3 = self._percentiles(ages, 25), self._percentiles(ages, 75)
-        iqr = q3 - q1
-        lower, upper = q1 - OUTLIER_IQR_COEFFICIENT * iqr, q3 + OUTLIER_IQR_COEFFICIENT * iqr
+
+        if bounds is None:
+            bounds = self._get_age_stats().iqr_bounds(OUTLIER_IQR_COEFFICIENT)
+        self.outlier_bounds = bounds
+        lower, upper = bounds
 
         for u in self.users:
             u.is_outlier = u.age < lower or u.age > upper
 
-        n_outliers = sum(u.is_outlier for u in self.users)
-        logger.info(f"Detectados {n_outliers} outliers de edad (método IQR).")
+        # El recuento es una pasada extra por lote: solo si se va a registrar
+        if logger.isEnabledFor(logging.INFO):
+            n_outliers = sum(1 for flag in column(self.users, "is_outlier") if flag)
+            logger.info("Detectados %d outliers de edad (método IQR).", n_outliers)
 
-    def _percentiles(self, data: list, percent: float) -> float:
-        """Calcula percentiles sin usar numpy."""
-        if not data:
-            return 0.0
-        data_sorted = sorted(data)
-        k = (len(data_sorted) - 1) * (percent / 100)
-        f, c = int(k), min(int(k) + 1, len(data_sorted) - 1)
-        if f == c:
-            return data_sorted[int(k)] if int(k) < len(data_sorted) else data_sorted[-1]
-        return data_sorted[f] + (data_sorted[c] - data_sorted[f]) * (k - f)
+    def _get_age_stats(self) -> AgeStats:
+        """Devuelve el acumulador de edades, calculándolo en una pasada si hace falta."""
+        if self.age_stats is None or self.age_stats.count != len(self.users):
+            self.age_stats = AgeStats.from_values(column(self.users, "age"))
+        return self.age_stats
 
     # ----------------------------
     # ENRIQUECIMIENTO EXTERNO (API RESTCOUNTRIES)
     # ----------------------------
     def enrich_with_country_data(self):
-        """Agrega información externa (región, población) usando RestCountries API."""
-        unique_countries = {u.country for u in self.users if u.country}
-        country_data = {}
-
-        for country in unique_countries:
-            try:
-                resp = requests.get(
-                    build_restcountries_url(country),
-                    timeout=API_TIMEOUT
-                )
-                if resp.status_code == 200:
-                    info = resp.json()[0]
-                    country_data[country] = {
-                        "region": info.get("region", "N/A"),
-                        "population": info.get("population", 0)
-                    }
-            except Exception as e:
-                logger.warning(f"No se pudo obtener información para {country}: {e}")
+        """
+        Agrega información externa (región, población) usando RestCountries API.
+
+        Las consultas de los países pendientes se lanzan en paralelo (como
+        máximo `max_workers` a la vez) y cada una tiene su propio plazo
+        (COUNTRY_API_TIMEOUT), así un país lento solo retrasa su resultado.
+        """
+        unique_countries = {c for c in value_counts(self.users, "country") if c} - self.country_data.keys()
+        country_data = self.country_data
+
+        if unique_countries:
+            workers = min(self.max_workers, len(unique_countries))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="country") as executor:
+                futures = {executor.submit(self._lookup_country, c): c for c in unique_countries}
+                for future in as_completed(futures):
+                    country = futures[future]
+                    try:
+                        country_data[country] = future.result()
+                    except Exception as e:
+                        logger.warning("No se pudo obtener información para %s: %s", country, e)
 
         for u in self.users:
-            u.region = country_data.get(u.country, {}).get("region", "N/A")
-            u.population = country_data.get(u.country, {}).get("population", 0)
+            info = country_data.get(u.country) or {}
+            u.region = info.get("region", "N/A")
+            u.population = info.get("population", 0)
 
         logger.info("Datos de países enriquecidos con información de RestCountries.")
 
+    def _lookup_country(self, country: str) -> Optional[dict]:
+        """Obtiene los datos de un país, pasando por la caché si existe."""
+        if self.country_cache is not None:
+            return self.country_cache.get(country, self._fetch_country)
+        return self._fetch_country(country)
+
+    def _fetch_country(self, country: str) -> Optional[dict]:
+        """
+        Consulta RestCountries para un país.
+
+        Returns:
+            Diccionario con region/population, o None si el país no existe (404).
+            Cualquier otro error se propaga para que no quede guardado en caché.
+        """
+        resp = self.session.get(build_restcountries_url(country), timeout=COUNTRY_API_TIMEOUT)
+        if resp.status_code == 404:
+            return None
+        resp.raise_for_status()
+        info = resp.json()[0]
+        return {
+            "region": info.get("region", "N/A"),
+            "population": info.get("population", 0)
+        }
+
     # ----------------------------
     # ESTADÍSTICAS AVANZADAS
     # ----------------------------
-    def compute_statistics(self) -> dict:
-        """Calcula estadísticas agregadas avanzadas sobre los usuarios."""
-        ages = [u.age for u in self.users]
-        genders = [u.gender for u in self.users]
-        countries = [u.country for u in self.users]
-        domains = [getattr(u, "email_domain", "unknown") for u in self.users]
-        regions = [getattr(u, "region", "N/A") for u in self.users]
-        age_groups = [getattr(u, "age_group", "unknown") for u in self.users]
-
-        # Calcular coeficiente de variación (CV = std / mean)
-        cv_age = round((_pstdev(ages) / _mean(ages)) * 100, 2) if _mean(ages) > 0 else 0
-
-        stats = {
-            "total_users": len(self.users),
-            "avg_age": round(_mean(ages), 2),
-            "median_age": round(_median(ages), 2),
-            "std_age": round(_pstdev(ages), 2),
-            "min_age": min(ages) if ages else 0,
-            "max_age": max(ages) if ages else 0,
-            "cv_age": cv_age,
-            "q1_age": round(self._percentiles(ages, 25), 2),
-            "q3_age": round(self._percentiles(ages, 75), 2),
-            "iqr_age": round(self._percentiles(ages, 75) - self._percentiles(ages, 25), 2),
-            "gender_distribution": dict(Counter(genders)),
-            "top_countries": dict(Counter(countries).most_common(TOP_COUNTRIES_COUNT)),
-            "top_email_domains": dict(Counter(domains).most_common(TOP_EMAIL_DOMAINS_COUNT)),
-            "regions": dict(Counter(regions)),
-            "age_groups": dict(Counter(age_groups)),
-        }
+    def compute_statistics(self, view: Optional[AggregateView] = None) -> dict:
+        """
+        Calcula estadísticas agregadas avanzadas sobre los usuarios.
+
+        Args:
+            view: Vista agregada ya construida sobre estos usuarios; si se
+                  indica, los conteos salen de ella sin recorrer los usuarios.
+        """
+        if view is not None:
+            stats = _build_statistics(len(view), self._get_age_stats(), view.genders, view.countries,
+                                      view.domains, view.regions, view.age_groups)
+            logger.info("Estadísticas avanzadas calculadas: %s", stats)
+            return stats
 
-        logger.info(f"Estadísticas avanzadas calculadas: {stats}")
+        stats = _build_statistics(
+            len(self.users),
+            self._get_age_stats(),
+            value_counts(self.users, "gender"),
+            value_counts(self.users, "country"),
+            value_counts(self.users, "email_domain", "unknown"),
+            value_counts(self.users, "region", "N/A"),
+            value_counts(self.users, "age_group", "unknown"),
+        )
+
+        logger.info("Estadísticas avanzadas calculadas: %s", stats)
         return stats
 
     def get_users(self) -> list[User]:
         """Devuelve la lista de usuarios transformados."""
         return self.users
+
+
+def _build_statistics(total: int, age_stats: AgeStats, genders: Counter, countries: Counter,
+                      domains: Counter, regions: Counter, age_groups: Counter) -> dict:
+    """Compone el diccionario de estadísticas avanzadas a partir de los agregados."""
+    return {
+        "total_users": total,
+        **age_stats.summary(),
+        "gender_distribution": dict(genders),
+        "top_countries": dict(countries.most_common(TOP_COUNTRIES_COUNT)),
+        "top_email_domains": dict(domains.most_common(TOP_EMAIL_DOMAINS_COUNT)),
+        "regions": dict(regions),
+        "age_groups": dict(age_groups),
+    }
+
+
+class StatsAccumulator(AggregateView):
+    """
+    Acumula las estadísticas de `compute_statistics` lote a lote (modo streaming).
+
+    Es una AggregateView: en lugar de guardar la lista de edades usa un
+    AgeStats (histograma + Welford) y contadores por categoría, así que la
+    memoria es constante respecto al número de usuarios, y la misma vista
+    alimenta los gráficos.
+    """
+
+    @property
+    def total_users(self) -> int:
+        return self.total
+
+    def result(self) -> dict:
+        """Devuelve un diccionario con las mismas claves que `compute_statistics`."""
+        stats = _build_statistics(self.total, self.ages, self.genders, self.countries,
+                                  self.domains, self.regions, self.age_groups)
+        logger.info("Estadísticas acumuladas calculadas: %s", stats)
+        return stats
+
+
+class SketchStatistics:
+    """
+    Alternativa a StatsAccumulator basada en sketches combinables (STATS_BACKEND="sketch").
+
+    - Edad: histograma exacto (AgeStats); las edades son enteros acotados.
+    - Población del país de cada usuario: cuantiles aproximados con KLL.
+    - Países y dominios de email: top-k con Space-Saving, ajustado con
+      Count-Min (se publica el menor de los dos conteos, ambos son cotas
+      superiores del real).
+    - Género, región y grupo de edad: contadores exactos (pocas categorías).
+    - Edades y géneros por país: solo de los países que están en el top-k.
+    - Correlaciones: sumas de productos de edad, población y outlier.
+
+    La memoria no depende del número de usuarios, y los sketches de varios
+    lotes o hilos se combinan con `merge`. `result()` devuelve las mismas
+    claves que `compute_statistics` más `population_quantiles` y `error_bounds`,
+    y `view()` la vista acotada (SketchView) para los gráficos y el dashboard.
+
+    Las tablas por país son exactas mientras haya menos de
+    SKETCH_TOPK_CAPACITY países distintos; si no, un país que sale del top-k
+    pierde su tabla y, si vuelve a entrar, solo cuenta desde ese momento.
+    """
+
+    def __init__(self):
+        self.total_users = 0
+        self.ages = AgeStats()
+        self.population = KLLSketch(k=SKETCH_KLL_K)
+        self.countries = SpaceSaving(SKETCH_TOPK_CAPACITY)
+        self.domains = SpaceSaving(SKETCH_TOPK_CAPACITY)
+        self.countries_cms = CountMinSketch(SKETCH_CMS_WIDTH, SKETCH_CMS_DEPTH)
+        self.domains_cms = CountMinSketch(SKETCH_CMS_WIDTH, SKETCH_CMS_DEPTH)
+        self.genders = Counter()
+        self.regions = Counter()
+        self.age_groups = Counter()
+        self.country_genders = Counter()  # (país del top-k, género) -> usuarios
+        self.country_ages = Counter()     # (país del top-k, edad) -> usuarios
+        self.moments = Counter()          # sumas para la correlación (ver SketchView)
+        self.has_population = False
+        self.has_outliers = False
+
+    def update(self, users: list[User]) -> None:
+        """Añade un lote de usuarios ya enriquecidos."""
+        self.total_users += len(users)
+        ages = list(column(users, "age"))
+        self.ages.update(ages)
+        populations = [p or 0 for p in column(users, "population")]
+        self.population.update(populations)
+        countries = list(column(users, "country"))
+        domains = [d or "unknown" for d in column(users, "email_domain")]
+        self.countries.update(countries)
+        self.countries_cms.update(countries)
+        self.domains.update(domains)
+        self.domains_cms.update(domains)
+        self.genders.update(value_counts(users, "gender"))
+        self.regions.update(value_counts(users, "region", "N/A"))
+        self.age_groups.update(value_counts(users, "age_group", "unknown"))
+
+        self.country_genders.update(zip(countries, column(users, "gender")))
+        self.country_ages.update(zip(countries, ages))
+        self._prune_country_tables()
+
+        outliers = list(column(users, "is_outlier"))
+        self.has_population = self.has_population or any(populations)
+        self.has_outliers = self.has_outliers or any(o is not None for o in outliers)
+        numeric = Counter(zip(ages, populations, (1 if o else 0 for o in outliers)))
+        for values, n in numeric.items():
+            self.moments["n"] += n
+            for i, a in enumerate(values):
+                self.moments[i] += a * n
+                for j in range(i, len(NUMERIC_FIELDS)):
+                    self.moments[(i, j)] += a * values[j] * n
+
+    def _prune_country_tables(self) -> None:
+        """Descarta las tablas por país de los países que ya no están en el top-k."""
+        tracked = self.countries.counters
+        for table in (self.country_genders, self.country_ages):
+            for key in [key for key in table if key[0] not in tracked]:
+                del table[key]
+
+    def merge(self, other: "SketchStatistics") -> "SketchStatistics":
+        """Combina los sketches de otro lote o hilo en este."""
+        self.total_users += other.total_users
+        self.ages.merge(other.ages)
+        self.population.merge(other.population)
+        self.countries.merge(other.countries)
+        self.countries_cms.merge(other.countries_cms)
+        self.domains.merge(other.domains)
+        self.domains_cms.merge(other.domains_cms)
+        self.genders.update(other.genders)
+        self.regions.update(other.regions)
+        self.age_groups.update(other.age_groups)
+        self.country_genders.update(other.country_genders)
+        self.country_ages.update(other.country_ages)
+        self._prune_country_tables()
+        self.moments.update(other.moments)
+        self.has_population = self.has_population or other.has_population
+        self.has_outliers = self.has_outliers or other.has_outliers
+        return self
+
+    def countries_exact(self) -> bool:
+        """True si ningún país ha salido del top-k (conteos por país exactos)."""
+        return len(self.countries.counters) < self.countries.capacity
+
+    def view(self) -> SketchView:
+        """Vista acotada con la que se generan los gráficos y stats.json."""
+        view = SketchView(Counter(self.moments))
+        view.total = self.total_users
+        view.ages = self.ages
+        view.genders = Counter(self.genders)
+        view.regions = Counter(self.regions)
+        view.age_groups = Counter(self.age_groups)
+        view.countries = self._top(self.countries, self.countries_cms, self.countries.capacity)
+        view.domains = self._top(self.domains, self.domains_cms, TOP_EMAIL_DOMAINS_COUNT)
+        view.country_genders = Counter(self.country_genders)
+        view.country_ages = Counter(self.country_ages)
+        view.has_population = self.has_population
+        view.has_outliers = self.has_outliers
+        return view
+
+    @staticmethod
+    def _top(summary: SpaceSaving, cms: CountMinSketch, n: int) -> Counter:
+        return Counter({item: min(count, cms.estimate(item)) for item, count in summary.most_common(n)})
+
+    def result(self) -> dict:
+        """Estadísticas aproximadas con sus cotas de error."""
+        stats = _build_statistics(
+            self.total_users, self.ages, self.genders,
+            self._top(self.countries, self.countries_cms, TOP_COUNTRIES_COUNT),
+            self._top(self.domains, self.domains_cms, TOP_EMAIL_DOMAINS_COUNT),
+            self.regions, self.age_groups,
+        )
+        stats["population_quantiles"] = {
+            f"p{int(q * 100)}": self.population.quantile(q) for q in (0.25, 0.5, 0.75, 0.9)
+        }
+        stats["error_bounds"] = {
+            "age": "exacto (histograma)",
+            "population_quantiles_rank_error": round(self.population.error_bound(), 4),
+            "top_countries_max_overcount": round(min(self.countries.error_bound(), self.countries_cms.error_bound()), 2),
+            "top_email_domains_max_overcount": round(min(self.domains.error_bound(), self.domains_cms.error_bound()), 2),
+            "count_min_confidence": round(1 - math.exp(-self.countries_cms.depth), 4),
+            "total_countries": ("exacto" if self.countries_exact()
+                                else f"cota inferior (más de {self.countries.capacity} países distintos)"),
+        }
+        logger.info("Estadísticas (sketches) calculadas: %s", stats)
+        return stats
@@ -1,283 +1,497 @@
-import matplotlib.pyplot as plt
-from collections import Counter
+from __future__ import annotations
+
+import hashlib
+import json
+import marshal
 import os
-from src.models.user_model import User
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from importlib.metadata import version
+from typing import TYPE_CHECKING, Optional, Sequence
+from src.config import PLOT_CHARTS, PLOT_DPI, PLOT_FORMATS, PLOT_SETTINGS, PLOT_WORKERS, PLOT_SKIP_UNCHANGED
+from src.utils.aggregates import AggregateView
+from src.utils.logger import setup_logger
+from src.utils.stats import AgeStats
+
+if TYPE_CHECKING:
+    from matplotlib.figure import Figure
+
+logger = setup_logger(__name__)
+
+
+def _figure_class():
+    """
+    Importa matplotlib (backend Agg, sin ventanas) solo cuando hay que dibujar:
+    importar este módulo no cuesta la carga de matplotlib ni de sus fuentes.
+    """
+    import matplotlib
+    matplotlib.use("Agg")  # Renderizado sin ventana: nunca bloquea ni necesita pantalla
+    from matplotlib.figure import Figure
+    return Figure
+
+
+@lru_cache(maxsize=None)
+def _matplotlib_version() -> str:
+    return version("matplotlib")
+
+# ----------------------------
+# DIBUJO DE CADA GRÁFICO
+# ----------------------------
+# Cada función recibe una Figure nueva y los datos ya agregados (pequeños y
+# serializables), de modo que se pueden ejecutar en otro proceso.
+
+def _draw_age_distribution(fig: Figure, data: dict) -> None:
+    ax = fig.subplots()
+    ax.hist(data["ages"], weights=data["counts"], bins=15, color="#1f77b4", edgecolor="black", alpha=0.7)
+    ax.set_title("Distribución de Edades")
+    ax.set_xlabel("Edad")
+    ax.set_ylabel("Frecuencia")
+    ax.grid(True, alpha=0.3)
+
+
+def _draw_gender_distribution(fig: Figure, data: dict) -> None:
+    ax = fig.subplots()
+    colors = ["#66c2a5", "#fc8d62"]
+    ax.bar(data["genders"], data["counts"], color=colors[:len(data["genders"])])
+    ax.set_title("Distribución por Género")
+    ax.set_xlabel("Género")
+    ax.set_ylabel("Cantidad")
+
+
+def _draw_top_countries(fig: Figure, data: dict) -> None:
+    ax = fig.subplots()
+    ax.barh(data["countries"], data["counts"], color="#4a90e2")
+    ax.set_title(f"Top {data['top_n']} Países con más Usuarios")
+    ax.set_xlabel("Cantidad")
+    ax.set_ylabel("País")
+
+
+def _draw_age_by_country(fig: Figure, data: dict) -> None:
+    ax = fig.subplots()
+    countries = data["countries"]
+    bp = ax.bxp(data["boxes"], patch_artist=True)
+    for patch in bp['boxes']:
+        patch.set_facecolor('#b3d9ff')
+    ax.set_xticks(range(1, len(countries) + 1))
+    ax.set_xticklabels(countries, rotation=45)
+    ax.set_title(f"Distribución de Edad por País (Top {data['top_n']})")
+    ax.set_xlabel("País")
+    ax.set_ylabel("Edad")
+    ax.grid(True, alpha=0.3, axis='y')
+
+
+def _draw_correlation_matrix(fig: Figure, data: dict) -> None:
+    ax = fig.subplots()
+    labels, corr_matrix = data["labels"], data["matrix"]
+    n = len(labels)
+    im = ax.imshow(corr_matrix, cmap="coolwarm", aspect="auto", vmin=-1, vmax=1)
+    fig.colorbar(im, ax=ax)
+    ax.set_xticks(range(n))
+    ax.set_xticklabels(labels, rotation=45, ha="right")
+    ax.set_yticks(range(n))
+    ax.set_yticklabels(labels)
+    ax.set_title("Matriz de Correlación")
+
+    # Anotar valores
+    for i in range(n):
+        for j in range(n):
+            ax.text(j, i, f"{corr_matrix[i][j]:.2f}", ha="center", va="center", color="black")
+
+
+def _draw_region_distribution(fig: Figure, data: dict) -> None:
+    ax = fig.subplots()
+    bars = ax.bar(data["regions"], data["counts"], color='#9b59b6', alpha=0.8, edgecolor='black')
+    ax.set_title("Distribución de Usuarios por Región Continental")
+    ax.set_xlabel("Región")
+    ax.set_ylabel("Cantidad de Usuarios")
+    ax.tick_params(axis='x', labelrotation=45)
+    for label in ax.get_xticklabels():
+        label.set_horizontalalignment('right')
+    ax.grid(True, alpha=0.3, axis='y')
+
+    # Añadir etiquetas de valores en las barras
+    for bar in bars:
+        height = bar.get_height()
+        ax.text(bar.get_x() + bar.get_width()/2., height,
+                f'{int(height)}',
+                ha='center', va='bottom')
+
+
+def _draw_age_groups_distribution(fig: Figure, data: dict) -> None:
+    ax = fig.subplots()
+    colors = ['#e74c3c', '#f39c12', '#3498db', '#2ecc71', '#9b59b6', '#34495e']
+    ax.pie(data["counts"], labels=data["groups"], autopct='%1.1f%%',
+           colors=colors[:len(data["groups"])], startangle=90)
+    ax.set_title("Distribución de Usuarios por Grupos de Edad")
+
+
+def _draw_gender_by_top_countries(fig: Figure, data: dict) -> None:
+    ax = fig.subplots()
+    countries, males, females = data["countries"], data["males"], data["females"]
+    x_pos = range(len(countries))
+    width = 0.6
+
+    ax.bar(x_pos, males, width, label='Hombre', color='#3498db', alpha=0.8)
+    ax.bar(x_pos, females, width, bottom=males, label='Mujer', color='#e74c3c', alpha=0.8)
+
+    ax.set_xlabel('País')
+    ax.set_ylabel('Cantidad de Usuarios')
+    ax.set_title(f"Distribución de Género por País (Top {data['top_n']})")
+    ax.set_xticks(list(x_pos))
+    ax.set_xticklabels(countries, rotation=45, ha='right')
+    ax.legend()
+    ax.grid(True, alpha=0.3, axis='y')
+
+
+def _box_stats(ages: AgeStats, whis: float = 1.5) -> dict:
+    """
+    Estadísticos de un boxplot (formato de Axes.bxp) a partir del histograma
+    de edades, con el mismo criterio que Axes.boxplot sobre la lista completa.
+    """
+    q1, median, q3 = ages.percentile(25), ages.median, ages.percentile(75)
+    low, high = q1 - whis * (q3 - q1), q3 + whis * (q3 - q1)
+    values = sorted(ages.histogram)
+    inside = [v for v in values if low <= v <= high]
+    return {
+        "med": median,
+        "q1": q1,
+        "q3": q3,
+        "whislo": min(min(inside), q1) if inside else q1,
+        "whishi": max(max(inside), q3) if inside else q3,
+        # Cada valor atípico distinto se dibuja una vez (los repetidos se solapan)
+        "fliers": [v for v in values if v < low or v > high],
+    }
+
+
+# Nombre del gráfico (= nombre de archivo) -> (función de dibujo, tamaño de figura)
+CHARTS = {
+    "distribucion_edades": (_draw_age_distribution, (8, 5)),
+    "distribucion_genero": (_draw_gender_distribution, (6, 4)),
+    "top_paises": (_draw_top_countries, (9, 6)),
+    "edad_por_pais": (_draw_age_by_country, (10, 6)),
+    "matriz_correlacion": (_draw_correlation_matrix, (6, 5)),
+    "distribucion_regiones": (_draw_region_distribution, (10, 6)),
+    "distribucion_grupos_edad": (_draw_age_groups_distribution, (10, 6)),
+    "genero_por_pais": (_draw_gender_by_top_countries, (12, 6)),
+}
+
+
+def chart_settings(name: str) -> dict:
+    """DPI y formatos de un gráfico (PLOT_SETTINGS sobre los valores por defecto)."""
+    settings = {"dpi": PLOT_DPI, "formats": tuple(PLOT_FORMATS)}
+    settings.update(PLOT_SETTINGS.get(name, {}))
+    return settings
+
+
+def render_chart(name: str, data: dict, output_dir: str, settings: dict) -> list:
+    """
+    Dibuja un gráfico y lo guarda en cada formato configurado.
+
+    Usa una Figure independiente (sin el estado global de pyplot) que se
+    libera al terminar, así que es seguro llamarla desde un proceso hijo.
+
+    Returns:
+        Rutas de los archivos generados.
+    """
+    draw, figsize = CHARTS[name]
+    fig = _figure_class()(figsize=figsize)
+    try:
+        draw(fig, data)
+        fig.tight_layout()
+        paths = []
+        for fmt in settings["formats"]:
+            filepath = os.path.join(output_dir, f"{name}.{fmt}")
+            fig.savefig(filepath, dpi=settings["dpi"], format=fmt, bbox_inches='tight')
+            paths.append(filepath)
+        return paths
+    finally:
+        fig.clear()
+
+
+def _render_chart_task(args: tuple) -> tuple:
+    """Renderiza un gráfico y devuelve (rutas, segundos empleados)."""
+    start = time.perf_counter()
+    paths = render_chart(*args)
+    return paths, time.perf_counter() - start
+
+
+def chart_hash(name: str, data: dict, settings: dict) -> str:
+    """
+    Huella de todo lo que determina un gráfico: datos agregados, ajustes,
+    tamaño, código de la función de dibujo y versión de matplotlib.
+    """
+    draw, figsize = CHARTS[name]
+    digest = hashlib.sha256()
+    digest.update(json.dumps(
+        {"data": data, "settings": settings, "figsize": figsize, "matplotlib": _matplotlib_version()},
+        sort_keys=True, default=str,
+    ).encode("utf-8"))
+    digest.update(marshal.dumps(draw.__code__))
+    return digest.hexdigest()
 
-plt.style.use("default")
 
 class VisualizationService:
     """Visualizaciones descriptivas y analíticas de usuarios."""
 
-    def __init__(self, output_dir: str = "plots"):
-        """Inicializa el servicio de visualización con directorio de salida."""
+    def __init__(self, output_dir: str = "plots", workers: int = PLOT_WORKERS,
+                 skip_unchanged: bool = PLOT_SKIP_UNCHANGED, charts: Optional[Sequence[str]] = PLOT_CHARTS):
+        """
+        Inicializa el servicio de visualización con directorio de salida.
+
+        Args:
+            output_dir: Carpeta donde se guardan los gráficos
+            workers: Procesos para `render_all` (None = núcleos disponibles, 1 = secuencial)
+            skip_unchanged: Reutilizar los gráficos cuyo hash no ha cambiado
+            charts: Nombres de los gráficos de `render_all` (None = todos los de CHARTS)
+        """
+        if isinstance(charts, str):
+            charts = (charts,)
+        unknown = set(charts or ()) - set(CHARTS)
+        if unknown:
+            raise ValueError(f"Gráficos desconocidos: {sorted(unknown)} (opciones: {list(CHARTS)})")
+        self.charts = tuple(CHARTS) if charts is None else tuple(charts)
         self.output_dir = output_dir
+        self.workers = workers or os.cpu_count() or 1
+        self.skip_unchanged = skip_unchanged
+        self.reused = []
+        self.timings = {}
         os.makedirs(self.output_dir, exist_ok=True)
 
-    def plot_age_distribution(self, users: list[User]) -> None:
-        if not users:
+    # ----------------------------
+    # RENDERIZADO
+    # ----------------------------
+    def _render(self, name: str, data: dict) -> None:
+        settings = chart_settings(name)
+        for filepath in render_chart(name, data, self.output_dir, settings):
+            print(f"Gráfico guardado en: {filepath}")
+        self._save_hash(name, chart_hash(name, data, settings))
+
+    def _hash_path(self, name: str) -> str:
+        return os.path.join(self.output_dir, f"{name}.hash")
+
+    def _save_hash(self, name: str, digest: str) -> None:
+        # El hash se escribe después de guardar la imagen: si el proceso se
+        # interrumpe, el gráfico se vuelve a generar la próxima vez
+        with open(self._hash_path(name), "w", encoding="utf-8") as f:
+            f.write(digest + "\n")
+
+    def _is_unchanged(self, name: str, digest: str, settings: dict) -> bool:
+        """True si el hash guardado coincide y siguen existiendo todos los archivos."""
+        try:
+            with open(self._hash_path(name), encoding="utf-8") as f:
+                if f.read().strip() != digest:
+                    return False
+        except OSError:
+            return False
+        return all(
+            os.path.exists(os.path.join(self.output_dir, f"{name}.{fmt}"))
+            for fmt in settings["formats"]
+        )
+
+    def render_all(self, view: AggregateView, force: bool = False) -> dict:
+        """
+        Genera los gráficos activos (`self.charts`; por defecto los ocho) en
+        paralelo en un pool de procesos.
+
+        Los datos de cada gráfico se extraen de la vista agregada y a cada
+        proceso solo se le envía ese resumen. Si el pool no está disponible
+        se renderiza en serie.
+
+        Junto a cada gráfico se guarda el hash de sus datos y ajustes
+        (`chart_hash`); si coincide con el de la ejecución anterior el gráfico
+        se reutiliza sin volver a dibujarlo, salvo con `force=True`. Los
+        nombres reutilizados quedan en `self.reused` y el tiempo de dibujo de
+        cada gráfico generado, en `self.timings`.
+
+        Returns:
+            Diccionario gráfico -> rutas generadas o reutilizadas.
+        """
+        self.reused = []
+        self.timings = {}
+        if not view:
+            print("No hay datos para generar gráficos.")
+            return {}
+
+        tasks, digests, outputs = [], {}, {}
+        for name, data in self.prepare_all(view, self.charts).items():
+            if data is None:
+                continue
+            settings = chart_settings(name)
+            digests[name] = chart_hash(name, data, settings)
+            if self.skip_unchanged and not force and self._is_unchanged(name, digests[name], settings):
+                self.reused.append(name)
+                outputs[name] = [os.path.join(self.output_dir, f"{name}.{fmt}") for fmt in settings["formats"]]
+                continue
+            tasks.append((name, data, self.output_dir, settings))
+
+        workers = min(self.workers, len(tasks))
+        results = None
+        if workers > 1:
+            try:
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    results = list(executor.map(_render_chart_task, tasks))
+            except (OSError, RuntimeError) as e:
+                logger.warning("No se pudo usar el pool de procesos (%s); renderizando en serie.", e)
+        if results is None:
+            results = [_render_chart_task(task) for task in tasks]
+
+        for task, (paths, seconds) in zip(tasks, results):
+            name = task[0]
+            outputs[name] = paths
+            self.timings[name] = seconds
+            self._save_hash(name, digests[name])
+            for filepath in paths:
+                print(f"Gráfico guardado en: {filepath}")
+
+        if self.reused:
+            logger.info("Gráficos reutilizados (sin cambios): %s", ", ".join(self.reused))
+        logger.info("Gráficos generados: %d, reutilizados: %d", len(tasks), len(self.reused))
+        return outputs
+
+    # ----------------------------
+    # PREPARACIÓN DE DATOS
+    # ----------------------------
+    # Todos los datos salen de la AggregateView (una sola pasada sobre los
+    # usuarios), así que el coste no crece con el número de gráficos.
+    def prepare_all(self, view: AggregateView, charts: Optional[Sequence[str]] = None) -> dict:
+        """Datos agregados de cada gráfico de `charts` (None si un gráfico no aplica)."""
+        prepare = {
+            "distribucion_edades": self._data_age_distribution,
+            "distribucion_genero": self._data_gender_distribution,
+            "top_paises": self._data_top_countries,
+            "edad_por_pais": self._data_age_by_country,
+            "matriz_correlacion": self._data_correlation_matrix,
+            "distribucion_regiones": self._data_region_distribution,
+            "distribucion_grupos_edad": self._data_age_groups_distribution,
+            "genero_por_pais": self._data_gender_by_top_countries,
+        }
+        return {name: prepare[name](view) for name in (charts if charts is not None else prepare)}
+
+    def _data_age_distribution(self, view: AggregateView) -> dict:
+        # Histograma de edades: cada valor distinto con su frecuencia como peso
+        histogram = sorted(view.ages.histogram.items())
+        return {"ages": [h[0] for h in histogram], "counts": [h[1] for h in histogram]}
+
+    def _data_gender_distribution(self, view: AggregateView) -> dict:
+        return {"genders": list(view.genders.keys()), "counts": list(view.genders.values())}
+
+    def _data_top_countries(self, view: AggregateView, top_n: int = 10) -> dict:
+        top_countries = view.top_countries(top_n)
+        return {
+            "top_n": top_n,
+            "countries": [c[0] for c in top_countries],
+            "counts": [c[1] for c in top_countries],
+        }
+
+    def _data_age_by_country(self, view: AggregateView, top_n: int = 6) -> dict:
+        top_countries = [c[0] for c in view.top_countries(top_n)]
+        return {
+            "top_n": top_n,
+            "countries": top_countries,
+            "boxes": [_box_stats(view.ages_of(country)) for country in top_countries],
+        }
+
+    def _data_correlation_matrix(self, view: AggregateView):
+        # Variables numéricas disponibles (population/is_outlier solo si existen)
+        labels = view.numeric_fields()
+        if len(labels) < 2:
+            print("No hay suficientes variables numéricas para correlación.")
+            return None
+
+        # Calcular matriz de correlación manualmente
+        n = len(labels)
+        corr_matrix = [[0.0] * n for _ in range(n)]
+        for i, label1 in enumerate(labels):
+            for j, label2 in enumerate(labels):
+                if i == j:
+                    corr_matrix[i][j] = 1.0
+                else:
+                    corr_matrix[i][j] = view.correlation(label1, label2)
+
+        return {"labels": labels, "matrix": corr_matrix}
+
+    def _data_region_distribution(self, view: AggregateView) -> dict:
+        sorted_regions = sorted(view.regions.items(), key=lambda x: x[1], reverse=True)
+        return {
+            "regions": [r[0] for r in sorted_regions],
+            "counts": [r[1] for r in sorted_regions],
+        }
+
+    def _data_age_groups_distribution(self, view: AggregateView) -> dict:
+        # Ordenar por edad (no alfabéticamente)
+        order = ["<18", "18-30", "31-45", "46-60", "61-80", "80+"]
+        sorted_groups = sorted(view.age_groups.items(),
+                               key=lambda x: order.index(x[0]) if x[0] in order else 999)
+        return {
+            "groups": [g[0] for g in sorted_groups],
+            "counts": [g[1] for g in sorted_groups],
+        }
+
+    def _data_gender_by_top_countries(self, view: AggregateView, top_n: int = 8) -> dict:
+        top_countries = [c[0] for c in view.top_countries(top_n)]
+        genders = [view.genders_of(country) for country in top_countries]
+        return {
+            "top_n": top_n,
+            "countries": top_countries,
+            "males": [g["male"] for g in genders],
+            "females": [g["female"] for g in genders],
+        }
+
+    # ----------------------------
+    # GRÁFICOS INDIVIDUALES
+    # ----------------------------
+    def plot_age_distribution(self, view: AggregateView) -> None:
+        if not view:
             print("No hay datos para generar gráfico de distribución de edades.")
             return
-        
-        ages = [u.age for u in users]
-        plt.figure(figsize=(8, 5))
-        plt.hist(ages, bins=15, color="#1f77b4", edgecolor="black", alpha=0.7)
-        plt.title("Distribución de Edades")
-        plt.xlabel("Edad")
-        plt.ylabel("Frecuencia")
-        plt.grid(True, alpha=0.3)
-        plt.tight_layout()
-        filepath = os.path.join(self.output_dir, "distribucion_edades.png")
-        plt.savefig(filepath, dpi=300, bbox_inches='tight')
-        print(f"Gráfico guardado en: {filepath}")
-        plt.show()
-
-
-    def plot_gender_distribution(self, users: list[User]) -> None:
-        if not users:
+        self._render("distribucion_edades", self._data_age_distribution(view))
+
+    def plot_gender_distribution(self, view: AggregateView) -> None:
+        if not view:
             print("No hay datos para generar gráfico de distribución por género.")
             return
-        
-        gender_counts = Counter(u.gender for u in users)
-        genders = list(gender_counts.keys())
-        counts = list(gender_counts.values())
-        colors = ["#66c2a5", "#fc8d62"]
-        
-        plt.figure(figsize=(6, 4))
-        plt.bar(genders, counts, color=colors[:len(genders)])
-        plt.title("Distribución por Género")
-        plt.xlabel("Género")
-        plt.ylabel("Cantidad")
-        plt.tight_layout()
-        filepath = os.path.join(self.output_dir, "distribucion_genero.png")
-        plt.savefig(filepath, dpi=300, bbox_inches='tight')
-        print(f"Gráfico guardado en: {filepath}")
-        plt.show()
-
-    def plot_top_countries(self, users: list[User], top_n: int = 10) -> None:
-        if not users:
+        self._render("distribucion_genero", self._data_gender_distribution(view))
+
+    def plot_top_countries(self, view: AggregateView, top_n: int = 10) -> None:
+        if not view:
             print("No hay datos para generar gráfico de países.")
             return
-        
-        country_counts = Counter(u.country for u in users)
-        top_countries = country_counts.most_common(top_n)
-        countries = [c[0] for c in top_countries]
-        counts = [c[1] for c in top_countries]
-        
-        plt.figure(figsize=(9, 6))
-        plt.barh(countries, counts, color="#4a90e2")
-        plt.title(f"Top {top_n} Países con más Usuarios")
-        plt.xlabel("Cantidad")
-        plt.ylabel("País")
-        plt.tight_layout()
-        filepath = os.path.join(self.output_dir, "top_paises.png")
-        plt.savefig(filepath, dpi=300, bbox_inches='tight')
-        print(f"Gráfico guardado en: {filepath}")
-        plt.show()
-
-    def plot_age_by_country(self, users: list[User], top_n: int = 6):
+        self._render("top_paises", self._data_top_countries(view, top_n))
+
+    def plot_age_by_country(self, view: AggregateView, top_n: int = 6):
         """Muestra la distribución de edad por país con boxplots."""
-        if not users:
+        if not view:
             print("No hay datos para generar gráfico de edad por país.")
             return
-        
-        country_counts = Counter(u.country for u in users)
-        top_countries = [c[0] for c in country_counts.most_common(top_n)]
-        
-        # Agrupar edades por país
-        age_by_country = {country: [] for country in top_countries}
-        for u in users:
-            if u.country in top_countries:
-                age_by_country[u.country].append(u.age)
-        
-        # Preparar datos para matplotlib
-        data = [age_by_country[country] for country in top_countries]
-        
-        plt.figure(figsize=(10, 6))
-        bp = plt.boxplot(data, labels=top_countries, patch_artist=True)
-        for patch in bp['boxes']:
-            patch.set_facecolor('#b3d9ff')
-        plt.title(f"Distribución de Edad por País (Top {top_n})")
-        plt.xlabel("País")
-        plt.ylabel("Edad")
-        plt.xticks(rotation=45)
-        plt.grid(True, alpha=0.3, axis='y')
-        plt.tight_layout()
-        filepath = os.path.join(self.output_dir, "edad_por_pais.png")
-        plt.savefig(filepath, dpi=300, bbox_inches='tight')
-        print(f"Gráfico guardado en: {filepath}")
-        plt.show()
-
-    def plot_correlation_matrix(self, users: list[User]):
+        self._render("edad_por_pais", self._data_age_by_country(view, top_n))
+
+    def plot_correlation_matrix(self, view: AggregateView):
         """Matriz de correlación entre variables numéricas."""
-        if not users:
+        if not view:
             print("No hay datos para generar matriz de correlación.")
             return
-        
-        # Extraer solo variables numéricas
-        ages = [u.age for u in users]
-        numeric_data = {"age": ages}
-        
-        # Añadir variables numéricas adicionales si existen
-        if hasattr(users[0], 'population') and users[0].population:
-            numeric_data["population"] = [u.population for u in users]
-        if hasattr(users[0], 'is_outlier'):
-            numeric_data["is_outlier"] = [1 if u.is_outlier else 0 for u in users]
-        
-        if len(numeric_data) < 2:
-            print("No hay suficientes variables numéricas para correlación.")
-            return
-        
-        # Calcular matriz de correlación manualmente
-        labels = list(numeric_data.keys())
-        n = len(labels)
-        corr_matrix = [[0.0] * n for _ in range(n)]
-        
-        # Función para calcular correlación manualmente
-        def _correlation(x, y):
-            n = len(x)
-            if n == 0:
-                return 0.0
-            mean_x = sum(x) / n
-            mean_y = sum(y) / n
-            
-            numerator = sum((x[i] - mean_x) * (y[i] - mean_y) for i in range(n))
-            sum_sq_x = sum((xi - mean_x) ** 2 for xi in x)
-            sum_sq_y = sum((yi - mean_y) ** 2 for yi in y)
-            denominator = (sum_sq_x * sum_sq_y) ** 0.5
-            
-            if denominator == 0:
-                return 0.0
-            return numerator / denominator
-        
-        for i, label1 in enumerate(labels):
-            for j, label2 in enumerate(labels):
-                if i == j:
-                    corr_matrix[i][j] = 1.0
-                else:
-                    corr_matrix[i][j] = _correlation(numeric_data[label1], numeric_data[label2])
-        
-        plt.figure(figsize=(6, 5))
-        im = plt.imshow(corr_matrix, cmap="coolwarm", aspect="auto", vmin=-1, vmax=1)
-        plt.colorbar(im)
-        plt.xticks(range(n), labels, rotation=45, ha="right")
-        plt.yticks(range(n), labels)
-        plt.title("Matriz de Correlación")
-        
-        # Anotar valores
-        for i in range(n):
-            for j in range(n):
-                plt.text(j, i, f"{corr_matrix[i][j]:.2f}", ha="center", va="center", color="black")
-        
-        plt.tight_layout()
-        filepath = os.path.join(self.output_dir, "matriz_correlacion.png")
-        plt.savefig(filepath, dpi=300, bbox_inches='tight')
-        print(f"Gráfico guardado en: {filepath}")
-        plt.show()
-
-    def plot_region_distribution(self, users: list[User]):
+        data = self._data_correlation_matrix(view)
+        if data is not None:
+            self._render("matriz_correlacion", data)
+
+    def plot_region_distribution(self, view: AggregateView):
         """Distribución de usuarios por región continental."""
-        if not users:
+        if not view:
             print("No hay datos para generar gráfico de regiones.")
             return
-        
-        # Contar usuarios por región
-        regions = [getattr(u, "region", "N/A") for u in users]
-        region_counts = Counter(regions)
-        sorted_regions = sorted(region_counts.items(), key=lambda x: x[1], reverse=True)
-        
-        regions_names = [r[0] for r in sorted_regions]
-        regions_counts = [r[1] for r in sorted_regions]
-        
-        plt.figure(figsize=(10, 6))
-        bars = plt.bar(regions_names, regions_counts, color='#9b59b6', alpha=0.8, edgecolor='black')
-        plt.title("Distribución de Usuarios por Región Continental")
-        plt.xlabel("Región")
-        plt.ylabel("Cantidad de Usuarios")
-        plt.xticks(rotation=45, ha='right')
-        plt.grid(True, alpha=0.3, axis='y')
-        
-        # Añadir etiquetas de valores en las barras
-        for bar in bars:
-            height = bar.get_height()
-            plt.text(bar.get_x() + bar.get_width()/2., height,
-                    f'{int(height)}',
-                    ha='center', va='bottom')
-        
-        plt.tight_layout()
-        filepath = os.path.join(self.output_dir, "distribucion_regiones.png")
-        plt.savefig(filepath, dpi=300, bbox_inches='tight')
-        print(f"Gráfico guardado en: {filepath}")
-        plt.show()
-
-    def plot_age_groups_distribution(self, users: list[User]):
+        self._render("distribucion_regiones", self._data_region_distribution(view))
+
+    def plot_age_groups_distribution(self, view: AggregateView):
         """Distribución por grupos de edad."""
-        if not users:
+        if not view:
             print("No hay datos para generar gráfico de grupos de edad.")
             return
-        
-        age_groups = [getattr(u, "age_group", "unknown") for u in users]
-        age_group_counts = Counter(age_groups)
-        
-        # Ordenar por edad (no alfabéticamente)
-        order = ["<18", "18-30", "31-45", "46-60", "61-80", "80+"]
-        sorted_groups = sorted(age_group_counts.items(), 
-                              key=lambda x: order.index(x[0]) if x[0] in order else 999)
-        
-        groups_names = [g[0] for g in sorted_groups]
-        groups_counts = [g[1] for g in sorted_groups]
-        
-        colors = ['#e74c3c', '#f39c12', '#3498db', '#2ecc71', '#9b59b6', '#34495e']
-        
-        plt.figure(figsize=(10, 6))
-        plt.pie(groups_counts, labels=groups_names, autopct='%1.1f%%', 
-                colors=colors[:len(groups_names)], startangle=90)
-        plt.title("Distribución de Usuarios por Grupos de Edad")
-        plt.tight_layout()
-        filepath = os.path.join(self.output_dir, "distribucion_grupos_edad.png")
-        plt.savefig(filepath, dpi=300, bbox_inches='tight')
-        print(f"Gráfico guardado en: {filepath}")
-        plt.show()
-
-    def plot_gender_by_top_countries(self, users: list[User], top_n: int = 8):
+        self._render("distribucion_grupos_edad", self._data_age_groups_distribution(view))
+
+    def plot_gender_by_top_countries(self, view: AggregateView, top_n: int = 8):
         """Gráfico de barras apilado: género por país (top N)."""
-        if not users:
+        if not view:
             print("No hay datos para generar gráfico de género por país.")
             return
-        
-        # Obtener top países
-        country_counts = Counter(u.country for u in users)
-        top_countries = [c[0] for c in country_counts.most_common(top_n)]
-        
-        # Contar por país y género
-        country_gender_data = {country: {"male": 0, "female": 0} for country in top_countries}
-        
-        for u in users:
-            if u.country in top_countries:
-                gender = u.gender
-                if gender in country_gender_data[u.country]:
-                    country_gender_data[u.country][gender] += 1
-        
-        males = [country_gender_data[c]["male"] for c in top_countries]
-        females = [country_gender_data[c]["female"] for c in top_countries]
-        
-        # Crear gráfico apilado
-        x_pos = range(len(top_countries))
-        width = 0.6
-        
-        fig, ax = plt.subplots(figsize=(12, 6))
-        bars1 = ax.bar(x_pos, males, width, label='Hombre', color='#3498db', alpha=0.8)
-        bars2 = ax.bar(x_pos, females, width, bottom=males, label='Mujer', color='#e74c3c', alpha=0.8)
-        
-        ax.set_xlabel('País')
-        ax.set_ylabel('Cantidad de Usuarios')
-        ax.set_title(f'Distribución de Género por País (Top {top_n})')
-        ax.set_xticks(x_pos)
-        ax.set_xticklabels(top_countries, rotation=45, ha='right')
-        ax.legend()
-        ax.grid(True, alpha=0.3, axis='y')
-        
-        plt.tight_layout()
-        filepath = os.path.join(self.output_dir, "genero_por_pais.png")
-        plt.savefig(filepath, dpi=300, bbox_inches='tight')
-        print(f"Gráfico guardado en: {filepath}")
-        plt.show()
+        self._render("genero_por_pais", self._data_gender_by_top_countries(view, top_n))
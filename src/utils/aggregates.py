@@ -0,0 +1,168 @@
+"""
+aggregates.py
+---------
+Vista agregada de los usuarios construida en una sola pasada.
+
+Cada columna (país, género, edad, región...) se lee una única vez por lote y
+se vuelca en contadores; a partir de ellos salen todos los gráficos y las
+estadísticas del dashboard sin volver a recorrer los usuarios. El tamaño de
+la vista depende del número de categorías distintas (países × edades), no del
+número de usuarios, y dos vistas se combinan con `merge`.
+"""
+
+from collections import Counter
+from typing import Iterable, List, Tuple
+from src.models.user_batch import column, value_counts
+from src.utils.stats import AgeStats
+
+# Variables numéricas de la matriz de correlación (orden de las columnas)
+NUMERIC_FIELDS = ("age", "population", "is_outlier")
+
+
+class AggregateView:
+    """Conteos, grupos y distribuciones de edad por país de un conjunto de usuarios."""
+
+    def __init__(self):
+        self.total = 0
+        self.ages = AgeStats()
+        self.genders = Counter()
+        self.countries = Counter()
+        self.domains = Counter()
+        self.regions = Counter()
+        self.age_groups = Counter()
+        self.country_genders = Counter()  # (país, género) -> usuarios
+        self.country_ages = Counter()     # (país, edad) -> usuarios
+        self.numeric = Counter()          # (edad, población, outlier) -> usuarios
+        self.has_population = False
+        self.has_outliers = False
+
+    @classmethod
+    def from_users(cls, users: Iterable) -> "AggregateView":
+        """Construye la vista a partir de un UserBatch o una lista de User."""
+        view = cls()
+        view.update(users)
+        return view
+
+    # ----------------------------
+    # ACUMULACIÓN
+    # ----------------------------
+    def update(self, users: Iterable) -> None:
+        """Añade un lote de usuarios ya enriquecidos (una lectura por columna)."""
+        countries = list(column(users, "country"))
+        ages = list(column(users, "age"))
+        if not ages:
+            return
+        self.total += len(ages)
+
+        by_gender = Counter(zip(countries, column(users, "gender")))
+        by_age = Counter(zip(countries, ages))
+        self.country_genders.update(by_gender)
+        self.country_ages.update(by_age)
+
+        # Los totales por país, género y edad salen de los conteos por pares
+        age_counts = Counter()
+        for (country, gender), n in by_gender.items():
+            self.countries[country] += n
+            self.genders[gender] += n
+        for (_, age), n in by_age.items():
+            age_counts[age] += n
+        self.ages.update_histogram(age_counts)
+
+        # La población depende solo del país, así que hay pocas combinaciones
+        numeric = Counter(zip(ages, column(users, "population"), column(users, "is_outlier")))
+        for (age, population, outlier), n in numeric.items():
+            self.has_population = self.has_population or bool(population)
+            self.has_outliers = self.has_outliers or outlier is not None
+            self.numeric[(age, population or 0, 1 if outlier else 0)] += n
+
+        self.domains.update(value_counts(users, "email_domain", "unknown"))
+        self.regions.update(value_counts(users, "region", "N/A"))
+        self.age_groups.update(value_counts(users, "age_group", "unknown"))
+
+    def merge(self, other: "AggregateView") -> "AggregateView":
+        """Combina otra vista (de otro lote o hilo) en esta."""
+        self.total += other.total
+        self.ages.merge(other.ages)
+        for name in ("genders", "countries", "domains", "regions", "age_groups",
+                     "country_genders", "country_ages", "numeric"):
+            getattr(self, name).update(getattr(other, name))
+        self.has_population = self.has_population or other.has_population
+        self.has_outliers = self.has_outliers or other.has_outliers
+        return self
+
+    # ----------------------------
+    # CONSULTAS
+    # ----------------------------
+    def __len__(self) -> int:
+        return self.total
+
+    def top_countries(self, n: int) -> List[Tuple[str, int]]:
+        """Los n países con más usuarios."""
+        return self.countries.most_common(n)
+
+    def ages_of(self, country: str) -> AgeStats:
+        """Distribución de edades de un país."""
+        return AgeStats.from_histogram(
+            {age: n for (c, age), n in self.country_ages.items() if c == country}
+        )
+
+    def genders_of(self, country: str) -> Counter:
+        """Usuarios de un país por género."""
+        return Counter({g: n for (c, g), n in self.country_genders.items() if c == country})
+
+    def numeric_fields(self) -> List[str]:
+        """Variables numéricas disponibles para la matriz de correlación."""
+        fields = ["age"]
+        if self.has_population:
+            fields.append("population")
+        if self.has_outliers:
+            fields.append("is_outlier")
+        return fields
+
+    def correlation(self, x: str, y: str) -> float:
+        """Coeficiente de Pearson entre dos variables numéricas (sumas exactas)."""
+        i, j = NUMERIC_FIELDS.index(x), NUMERIC_FIELDS.index(y)
+        n = sx = sy = sxx = syy = sxy = 0
+        for values, weight in self.numeric.items():
+            a, b = values[i], values[j]
+            n += weight
+            sx += a * weight
+            sy += b * weight
+            sxx += a * a * weight
+            syy += b * b * weight
+            sxy += a * b * weight
+        return pearson(n, sx, sy, sxx, syy, sxy)
+
+
+class SketchView(AggregateView):
+    """
+    Vista para los gráficos construida por SketchStatistics (STATS_BACKEND="sketch").
+
+    Solo guarda datos de tamaño acotado:
+    - `countries` y `domains`: los top-k de Space-Saving (como mucho
+      SKETCH_TOPK_CAPACITY países y TOP_EMAIL_DOMAINS_COUNT dominios).
+    - `country_genders` y `country_ages`: solo de los países del top-k.
+    - `moments`: sumas de productos de las variables numéricas en lugar de
+      la tabla `numeric`, suficientes para la correlación de Pearson.
+    Edades, géneros, regiones y grupos de edad son exactos.
+    """
+
+    def __init__(self, moments: Counter = None):
+        super().__init__()
+        # "n", i -> suma de la variable i, (i, j) con i <= j -> suma de productos
+        self.moments = moments if moments is not None else Counter()
+
+    def correlation(self, x: str, y: str) -> float:
+        i, j = sorted((NUMERIC_FIELDS.index(x), NUMERIC_FIELDS.index(y)))
+        m = self.moments
+        return pearson(m["n"], m[i], m[j], m[(i, i)], m[(j, j)], m[(i, j)])
+
+
+def pearson(n, sx, sy, sxx, syy, sxy) -> float:
+    """Coeficiente de Pearson a partir de las sumas (0.0 si alguna variable es constante)."""
+    if n == 0:
+        return 0.0
+    denominator = ((n * sxx - sx * sx) * (n * syy - sy * sy)) ** 0.5
+    if denominator == 0:
+        return 0.0
+    return (n * sxy - sx * sy) / denominator
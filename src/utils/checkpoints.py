@@ -0,0 +1,161 @@
+"""
+checkpoints.py
+--------------
+Checkpoints de las etapas del pipeline en disco, para reanudar una ejecución
+fallida sin repetir la extracción ni las llamadas a las APIs.
+
+Cada ejecución tiene una clave derivada de sus parámetros (n_users, seed;
+el controlador elige una seed aleatoria si no se indica ninguna) y
+de los valores de config que cambian el resultado de extracción y
+transformación (CHECKPOINT_SETTINGS). Sus checkpoints se guardan en
+<CACHE_DIR>/checkpoints/<clave>/:
+
+    manifest.json     etapas completadas, en orden
+    extract.pkl.gz    usuarios extraídos y limpios (UserBatch)
+    transform.pkl.gz  usuarios enriquecidos, vista agregada y estadísticas
+
+Las etapas load, plots y stats solo se marcan como completadas: su resultado
+ya está en data/ y plots/. Los datos se guardan con pickle (UserBatch guarda
+columnas en arrays, así que ocupa poco) comprimido con gzip; solo se leen
+archivos escritos por este mismo módulo.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import pickle
+from datetime import datetime, timezone
+from typing import Any, List, Optional
+import src.config as config
+
+# Etapas del pipeline por lotes, en orden de ejecución
+STAGES = ("extract", "transform", "load", "plots", "stats")
+
+# Etapa cuyo checkpoint alimenta a cada etapa (None: no necesita ninguno)
+STAGE_INPUT = {
+    "extract": None,
+    "transform": "extract",
+    "load": "transform",
+    "plots": "transform",
+    "stats": "transform",
+}
+
+# Valores de config que cambian los usuarios extraídos o transformados
+CHECKPOINT_SETTINGS = (
+    "RANDOMUSER_API_URL", "MAX_USERS_PER_REQUEST", "EXTRACTION_PAGE_SIZE",
+    "RESTCOUNTRIES_API_URL", "RESTCOUNTRIES_FIELDS", "AGE_GROUPS",
+    "POPULAR_EMAIL_DOMAINS", "OUTLIER_IQR_COEFFICIENT",
+    "TOP_COUNTRIES_COUNT", "TOP_EMAIL_DOMAINS_COUNT",
+)
+
+MANIFEST_FILENAME = "manifest.json"
+
+
+def run_key(n_users: int, seed: Optional[str]) -> str:
+    """Clave de una ejecución: hash de sus parámetros y de CHECKPOINT_SETTINGS."""
+    params = {"n_users": n_users, "seed": seed}
+    params.update({name: getattr(config, name) for name in CHECKPOINT_SETTINGS})
+    raw = json.dumps(params, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(raw).hexdigest()[:16]
+
+
+class CheckpointStore:
+    """
+    Checkpoints de una ejecución (una carpeta por clave).
+
+    Con enabled=False no se escribe nada, pero se pueden leer los checkpoints
+    de ejecuciones anteriores.
+    """
+
+    def __init__(self, root: str, n_users: int, seed: Optional[str] = None, enabled: bool = True):
+        self.key = run_key(n_users, seed)
+        self.path = os.path.join(root, self.key)
+        self.enabled = enabled
+        self.params = {"n_users": n_users, "seed": seed}
+
+    def _file(self, stage: str) -> str:
+        return os.path.join(self.path, f"{stage}.pkl.gz")
+
+    def _write_atomic(self, path: str, write) -> None:
+        """Escribe en un temporal y lo renombra: un fallo no deja archivos a medias."""
+        tmp_path = path + ".tmp"
+        write(tmp_path)
+        os.replace(tmp_path, path)
+
+    # ----------------------------
+    # MANIFIESTO
+    # ----------------------------
+    def manifest(self) -> dict:
+        try:
+            with open(os.path.join(self.path, MANIFEST_FILENAME), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"params": self.params, "stages": {}}
+
+    def _save_manifest(self, manifest: dict) -> None:
+        def write(path):
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(manifest, f, indent=2, ensure_ascii=False)
+        self._write_atomic(os.path.join(self.path, MANIFEST_FILENAME), write)
+
+    def completed(self) -> List[str]:
+        """Etapas completadas, en orden de STAGES."""
+        stages = self.manifest()["stages"]
+        return [stage for stage in STAGES if stage in stages]
+
+    def last_completed(self) -> Optional[str]:
+        """Última etapa completada de forma consecutiva desde extract."""
+        last = None
+        done = set(self.completed())
+        for stage in STAGES:
+            if stage not in done:
+                break
+            last = stage
+        return last
+
+    def has_data(self, stage: str) -> bool:
+        return stage in self.manifest()["stages"] and os.path.exists(self._file(stage))
+
+    # ----------------------------
+    # LECTURA Y ESCRITURA
+    # ----------------------------
+    def save(self, stage: str, data: Any = None, rows: Optional[int] = None) -> None:
+        """Marca `stage` como completada y, si hay `data`, guarda su resultado."""
+        if not self.enabled:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        if data is not None:
+            def write(path):
+                with gzip.open(path, "wb", compresslevel=1) as f:
+                    pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+            self._write_atomic(self._file(stage), write)
+
+        manifest = self.manifest()
+        manifest["stages"][stage] = {
+            "completed_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "rows": rows,
+            "file": os.path.basename(self._file(stage)) if data is not None else None,
+        }
+        self._save_manifest(manifest)
+
+    def load(self, stage: str) -> Any:
+        """Resultado guardado de `stage` (None si no hay checkpoint)."""
+        if not self.has_data(stage):
+            return None
+        with gzip.open(self._file(stage), "rb") as f:
+            return pickle.load(f)
+
+    def invalidate_from(self, stage: str) -> None:
+        """Olvida `stage` y las etapas posteriores (se van a volver a ejecutar)."""
+        if not self.enabled:
+            return
+        later = STAGES[STAGES.index(stage):]
+        manifest = self.manifest()
+        if not any(name in manifest["stages"] for name in later):
+            return
+        for name in later:
+            manifest["stages"].pop(name, None)
+            if os.path.exists(self._file(name)):
+                os.remove(self._file(name))
+        self._save_manifest(manifest)
@@ -0,0 +1,42 @@
+"""
+http.py
+---------
+Sesiones HTTP compartidas por los servicios.
+
+`requests` se importa aquí solo cuando se crea la primera sesión, de modo
+que los comandos que no hacen peticiones (p. ej. recalcular estadísticas
+desde la base de datos) no pagan su coste de importación.
+"""
+
+import threading
+
+_lock = threading.Lock()
+
+
+def pooled_session(pool_size: int):
+    """Sesión de requests con un pool de `pool_size` conexiones por host."""
+    import requests
+
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class LazySession:
+    """Descriptor que crea la sesión del objeto la primera vez que se usa (seguro entre hilos)."""
+
+    def __set_name__(self, owner, name):
+        self.attr = f"_{name}"
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        session = obj.__dict__.get(self.attr)
+        if session is None:
+            with _lock:
+                session = obj.__dict__.get(self.attr)
+                if session is None:
+                    session = obj.__dict__[self.attr] = pooled_session(obj.max_workers)
+        return session
@@ -1,22 +1,158 @@
+"""
+logger.py
+---------
+Configuración centralizada del logging del proyecto.
+
+La configuración se hace una sola vez por proceso, aunque `setup_logger` se
+llame desde cada módulo (y varias veces con el mismo nombre). Todos los
+loggers comparten un único QueueHandler: registrar un mensaje solo lo pone en
+una cola, y un QueueListener escribe en logs/etl.log y en consola desde su
+propio hilo, fuera del camino de cada lote.
+
+Opciones en src/config.py:
+    LOG_LEVEL:  nivel mínimo ("INFO", "DEBUG"...)
+    LOG_FORMAT: "text" o "json" (una línea JSON por registro en el archivo)
+    LOG_ASYNC:  False para escribir directamente, sin cola ni hilo
+
+Los mensajes se pasan con formato perezoso (`logger.info("... %s", valor)`):
+el texto solo se construye si el nivel está activo.
+"""
+
+import atexit
+import json
 import logging
+import logging.handlers
 import os
+import queue
+import threading
+from datetime import datetime, timezone
+from src.config import LOG_ASYNC, LOG_DIR, LOG_FILENAME, LOG_FORMAT, LOG_LEVEL, project_path
 
-def setup_logger(name: str = "etl_logger") -> logging.Logger:
-    """Configura un logger centralizado para el proyecto."""
-    log_dir = "logs"
-    os.makedirs(log_dir, exist_ok=True)
+TEXT_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
 
-    logger = logging.getLogger(name)
-    logger.setLevel(logging.INFO)
+# Atributos estándar de LogRecord; el resto son campos de `extra=`
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_lock = threading.Lock()
+_handler = None
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Un objeto JSON por línea: hora, nivel, logger, mensaje y campos de `extra=`."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update({k: v for k, v in vars(record).items() if k not in _RECORD_ATTRS})
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _ProcessQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler que, en un proceso hijo creado con fork (p. ej. el pool de
+    gráficos), escribe directamente: allí no corre el hilo del listener.
+    """
+
+    def __init__(self, log_queue: queue.Queue, handlers: list):
+        super().__init__(log_queue)
+        self.pid = os.getpid()
+        self.handlers = handlers
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if os.getpid() == self.pid:
+            super().emit(record)
+            return
+        for handler in self.handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
 
-    file_handler = logging.FileHandler(os.path.join(log_dir, "etl.log"))
+
+class _FanOutHandler(logging.Handler):
+    """Reenvía cada registro a varios handlers (modo síncrono, LOG_ASYNC=False)."""
+
+    def __init__(self, handlers: list):
+        super().__init__()
+        self.handlers = handlers
+
+    def emit(self, record: logging.LogRecord) -> None:
+        for handler in self.handlers:
+            handler.handle(record)
+
+    def flush(self) -> None:
+        for handler in self.handlers:
+            handler.flush()
+
+
+def _build_handlers() -> list:
+    """Handlers finales: archivo (texto o JSON) y consola (siempre texto)."""
+    log_dir = project_path(LOG_DIR)
+    os.makedirs(log_dir, exist_ok=True)
+
+    file_handler = logging.FileHandler(os.path.join(log_dir, LOG_FILENAME), encoding="utf-8")
     console_handler = logging.StreamHandler()
 
-    formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
-    file_handler.setFormatter(formatter)
-    console_handler.setFormatter(formatter)
+    text_formatter = logging.Formatter(TEXT_FORMAT)
+    file_handler.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else text_formatter)
+    console_handler.setFormatter(text_formatter)
+    return [file_handler, console_handler]
 
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
 
+def _shared_handler() -> logging.Handler:
+    """Handler común a todos los loggers, creado la primera vez que se pide."""
+    global _handler, _listener
+    with _lock:
+        if _handler is not None:
+            return _handler
+        if LOG_FORMAT not in ("text", "json"):
+            raise ValueError(f"LOG_FORMAT no válido: {LOG_FORMAT!r} (opciones: 'text', 'json')")
+        handlers = _build_handlers()
+        if LOG_ASYNC:
+            log_queue = queue.SimpleQueue()
+            _handler = _ProcessQueueHandler(log_queue, handlers)
+            _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+            _listener.start()
+            # Al salir se vacía la cola antes de cerrar los archivos
+            atexit.register(shutdown_logging)
+        else:
+            # Sin cola: un único handler que reparte a archivo y consola
+            _handler = _FanOutHandler(handlers)
+        return _handler
+
+
+def shutdown_logging() -> None:
+    """Detiene el listener (escribiendo lo pendiente en la cola) y cierra los archivos."""
+    global _handler, _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            for handler in _listener.handlers:
+                handler.close()
+            _listener = None
+        elif _handler is not None:
+            for handler in _handler.handlers:
+                handler.close()
+        _handler = None
+
+
+def setup_logger(name: str = "etl_logger") -> logging.Logger:
+    """
+    Devuelve el logger `name` conectado al handler común del proyecto.
+
+    Es idempotente: llamarla varias veces con el mismo nombre no duplica
+    líneas. Los loggers del proyecto no propagan a la raíz, así que una
+    configuración externa (basicConfig...) tampoco las duplica.
+    """
+    handler = _shared_handler()
+    logger = logging.getLogger(name)
+    logger.setLevel(LOG_LEVEL)
+    logger.propagate = False
+    if handler not in logger.handlers:
+        logger.addHandler(handler)
     return logger
@@ -0,0 +1,235 @@
+"""
+metrics.py
+---------
+Instrumentación por etapas de una ejecución del ETL.
+
+Cada etapa (extracción, limpieza, enriquecimiento, cargas, gráficos...) se
+envuelve en `RunMetrics.stage(nombre)`, que registra duración, filas de
+entrada y salida, filas por segundo y picos de memoria. Una misma etapa se
+puede abrir muchas veces (p. ej. una vez por lote en modo streaming) y los
+valores se acumulan. Al terminar se vuelca todo a metrics.json y,
+opcionalmente, a formato de texto Prometheus (textfile collector).
+
+Opcionalmente se perfila con cProfile una única etapa elegida por nombre.
+"""
+
+import cProfile
+import json
+import os
+import pstats
+import re
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, Optional
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - Windows no tiene el módulo resource
+    resource = None
+
+
+def rss_peak_bytes() -> Optional[int]:
+    """Pico de memoria residente (RSS) del proceso hasta ahora, o None si no se puede medir."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux lo da en KiB y macOS en bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class StageMetrics:
+    """Valores acumulados de una etapa."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.seconds = 0.0
+        self.rows_in = None
+        self.rows_out = None
+        self.py_peak_bytes = None
+        self.rss_peak_bytes = None
+
+    def add_rows(self, rows_in: Optional[int] = None, rows_out: Optional[int] = None) -> None:
+        """Suma filas de entrada y/o salida a la etapa."""
+        if rows_in is not None:
+            self.rows_in = (self.rows_in or 0) + rows_in
+        if rows_out is not None:
+            self.rows_out = (self.rows_out or 0) + rows_out
+
+    @property
+    def rows_per_sec(self) -> Optional[float]:
+        rows = self.rows_out if self.rows_out is not None else self.rows_in
+        if rows is None or self.seconds <= 0:
+            return None
+        return rows / self.seconds
+
+    def to_dict(self) -> dict:
+        mb = lambda b: round(b / 2 ** 20, 2) if b is not None else None
+        return {
+            "stage": self.name,
+            "calls": self.calls,
+            "seconds": round(self.seconds, 4),
+            "rows_in": self.rows_in,
+            "rows_out": self.rows_out,
+            "rows_per_sec": round(self.rows_per_sec, 1) if self.rows_per_sec is not None else None,
+            "py_peak_mb": mb(self.py_peak_bytes),
+            "rss_peak_mb": mb(self.rss_peak_bytes),
+        }
+
+
+class RunMetrics:
+    """
+    Métricas de una ejecución, etapa a etapa.
+
+    Args:
+        trace_memory: Medir el pico de memoria Python de cada etapa con
+                      tracemalloc (preciso pero ralentiza el proceso).
+        profile_stage: Nombre de la etapa a perfilar con cProfile (o None).
+    """
+
+    def __init__(self, trace_memory: bool = False, profile_stage: Optional[str] = None):
+        self.stages: Dict[str, StageMetrics] = {}
+        self.info = {"started_at": datetime.now(timezone.utc).isoformat(timespec="seconds")}
+        self.trace_memory = trace_memory
+        self.profile_stage = profile_stage
+        self._profiler = cProfile.Profile() if profile_stage else None
+        self._start = time.perf_counter()
+        self._tracing_started = False
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing_started = True
+
+    def _get(self, name: str) -> StageMetrics:
+        if name not in self.stages:
+            self.stages[name] = StageMetrics(name)
+        return self.stages[name]
+
+    @contextmanager
+    def stage(self, name: str, rows_in: Optional[int] = None) -> Iterator[StageMetrics]:
+        """
+        Mide un bloque como etapa `name`.
+
+        Devuelve la StageMetrics acumulada para que el bloque anote las filas
+        de salida con `add_rows(rows_out=...)`.
+        """
+        metrics = self._get(name)
+        metrics.add_rows(rows_in=rows_in)
+        profiling = self._profiler is not None and name == self.profile_stage
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        if profiling:
+            self._profiler.enable()
+        start = time.perf_counter()
+        try:
+            yield metrics
+        finally:
+            metrics.seconds += time.perf_counter() - start
+            metrics.calls += 1
+            if profiling:
+                self._profiler.disable()
+            if self.trace_memory:
+                peak = tracemalloc.get_traced_memory()[1]
+                metrics.py_peak_bytes = max(metrics.py_peak_bytes or 0, peak)
+            metrics.rss_peak_bytes = rss_peak_bytes()
+
+    def iter_stage(self, name: str, batches: Iterable) -> Iterator:
+        """Recorre un iterable de lotes contando como etapa `name` el tiempo de producir cada uno."""
+        iterator = iter(batches)
+        while True:
+            with self.stage(name) as metrics:
+                try:
+                    batch = next(iterator)
+                except StopIteration:
+                    return
+                metrics.add_rows(rows_out=len(batch))
+            yield batch
+
+    def record(self, name: str, seconds: float, rows_in: Optional[int] = None,
+               rows_out: Optional[int] = None) -> None:
+        """Añade una medida tomada fuera (p. ej. en otro proceso)."""
+        metrics = self._get(name)
+        metrics.seconds += seconds
+        metrics.calls += 1
+        metrics.add_rows(rows_in, rows_out)
+
+    # ----------------------------
+    # EXPORTACIÓN
+    # ----------------------------
+    def to_dict(self) -> dict:
+        return {
+            "run": {
+                **self.info,
+                "seconds": round(time.perf_counter() - self._start, 4),
+                "rss_peak_mb": round(rss_peak_bytes() / 2 ** 20, 2) if resource else None,
+            },
+            "stages": [stage.to_dict() for stage in self.stages.values()],
+        }
+
+    def to_prometheus(self) -> str:
+        """Métricas en formato de texto de Prometheus."""
+        series = {
+            "etl_stage_seconds": ("gauge", "Tiempo total de la etapa", lambda s: s.seconds),
+            "etl_stage_rows_in": ("gauge", "Filas de entrada de la etapa", lambda s: s.rows_in),
+            "etl_stage_rows_out": ("gauge", "Filas de salida de la etapa", lambda s: s.rows_out),
+            "etl_stage_rows_per_second": ("gauge", "Filas por segundo", lambda s: s.rows_per_sec),
+            "etl_stage_python_peak_bytes": ("gauge", "Pico de memoria Python (tracemalloc)", lambda s: s.py_peak_bytes),
+            "etl_stage_rss_peak_bytes": ("gauge", "Pico de RSS del proceso al terminar la etapa", lambda s: s.rss_peak_bytes),
+        }
+        lines = []
+        for metric, (kind, help_text, getter) in series.items():
+            values = [(s.name, getter(s)) for s in self.stages.values() if getter(s) is not None]
+            if not values:
+                continue
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} {kind}")
+            for stage, value in values:
+                lines.append(f'{metric}{{stage="{stage}"}} {value}')
+        lines.append("# HELP etl_run_seconds Duración total de la ejecución")
+        lines.append("# TYPE etl_run_seconds gauge")
+        lines.append(f"etl_run_seconds {time.perf_counter() - self._start}")
+        return "\n".join(lines) + "\n"
+
+    def save(self, output_dir: str, prometheus: bool = False) -> list:
+        """
+        Escribe metrics.json (y metrics.prom si `prometheus`) en output_dir y,
+        si se perfiló una etapa, profile_<etapa>.prof y su resumen en texto.
+
+        Returns:
+            Rutas de los archivos escritos.
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        paths = [os.path.join(output_dir, "metrics.json")]
+        with open(paths[0], "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2, ensure_ascii=False)
+
+        if prometheus:
+            paths.append(os.path.join(output_dir, "metrics.prom"))
+            with open(paths[-1], "w", encoding="utf-8") as f:
+                f.write(self.to_prometheus())
+
+        if self._profiler is not None and self.profile_stage in self.stages:
+            # "load:SQLLoader" -> profile_load_SQLLoader.prof (válido también en Windows)
+            stem = "profile_" + re.sub(r"\W", "_", self.profile_stage)
+            prof_path = os.path.join(output_dir, f"{stem}.prof")
+            self._profiler.dump_stats(prof_path)
+            paths.append(prof_path)
+            paths.append(os.path.join(output_dir, f"{stem}.txt"))
+            with open(paths[-1], "w", encoding="utf-8") as f:
+                pstats.Stats(self._profiler, stream=f).sort_stats("cumulative").print_stats(30)
+
+        if self._tracing_started:
+            tracemalloc.stop()
+            self._tracing_started = False
+        return paths
+
+    def summary(self) -> str:
+        """Tabla breve de etapas ordenadas por tiempo, para el log."""
+        rows = sorted(self.stages.values(), key=lambda s: s.seconds, reverse=True)
+        return "\n".join(
+            f"  {s.name:32s} {s.seconds:8.3f} s"
+            + (f"  {s.rows_per_sec:12.0f} filas/s" if s.rows_per_sec else "")
+            for s in rows
+        )
@@ -0,0 +1,201 @@
+"""
+sketches.py
+---------
+Resúmenes probabilísticos ("sketches") combinables y de memoria constante,
+implementados a mano, para calcular estadísticas sobre ejecuciones que no
+caben en memoria:
+
+- KLLSketch: cuantiles aproximados de cualquier variable numérica.
+- SpaceSaving: top-k de elementos más frecuentes (países, dominios...).
+- CountMinSketch: frecuencia estimada de cualquier elemento.
+
+Todos tienen `update` y `merge`, de modo que cada lote o cada hilo puede
+mantener su propio sketch y combinarlos al final. Cada uno expone su cota
+de error mediante `error_bound()`.
+"""
+
+import hashlib
+import math
+import random
+from typing import Dict, Hashable, Iterable, List, Tuple
+
+
+class KLLSketch:
+    """
+    Sketch KLL (Karnin, Lang, Liberty 2016) para cuantiles aproximados.
+
+    Guarda O(k) elementos repartidos en "compactores" por niveles; un elemento
+    del nivel h representa 2^h elementos originales. El error de rango
+    normalizado es de aproximadamente 1.65% para k=200 (99% de confianza).
+    """
+
+    def __init__(self, k: int = 200, seed: int = None) -> None:
+        self.k = k
+        self.count = 0
+        self.compactors: List[List[float]] = [[]]
+        self._random = random.Random(seed)
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.compactors) - level - 1
+        return max(2, int(math.ceil(self.k * (2 / 3) ** depth)))
+
+    def _size(self) -> int:
+        return sum(len(c) for c in self.compactors)
+
+    def _max_size(self) -> int:
+        return sum(self._capacity(h) for h in range(len(self.compactors)))
+
+    def update(self, values: Iterable[float]) -> None:
+        """Añade valores al sketch."""
+        level0 = self.compactors[0]
+        for value in values:
+            level0.append(value)
+            self.count += 1
+            if len(level0) >= self._capacity(0):
+                self._compress()
+                level0 = self.compactors[0]
+
+    def _compress(self) -> None:
+        """Compacta el primer nivel lleno: ordena y promociona la mitad de sus elementos."""
+        for level in range(len(self.compactors)):
+            if len(self.compactors[level]) >= self._capacity(level):
+                if level + 1 == len(self.compactors):
+                    self.compactors.append([])
+                items = sorted(self.compactors[level])
+                # Si hay un número impar se deja el último en este nivel
+                keep = [items.pop()] if len(items) % 2 else []
+                offset = self._random.randint(0, 1)
+                self.compactors[level + 1].extend(items[offset::2])
+                self.compactors[level] = keep
+                if self._size() < self._max_size():
+                    return
+
+    def merge(self, other: "KLLSketch") -> "KLLSketch":
+        """Combina otro sketch en este."""
+        while len(self.compactors) < len(other.compactors):
+            self.compactors.append([])
+        for level, items in enumerate(other.compactors):
+            self.compactors[level].extend(items)
+        self.count += other.count
+        while self._size() >= self._max_size():
+            self._compress()
+        return self
+
+    def quantile(self, q: float) -> float:
+        """Valor aproximado del cuantil q (0..1)."""
+        weighted = sorted(
+            (value, 2 ** level)
+            for level, items in enumerate(self.compactors)
+            for value in items
+        )
+        if not weighted:
+            return 0.0
+        target = q * sum(w for _, w in weighted)
+        running = 0
+        for value, weight in weighted:
+            running += weight
+            if running >= target:
+                return value
+        return weighted[-1][0]
+
+    def error_bound(self) -> float:
+        """Error de rango normalizado aproximado (fracción de n, 99% de confianza)."""
+        return 2.296 / (self.k ** 0.9723)
+
+
+class SpaceSaving:
+    """
+    Algoritmo Space-Saving (Metwally et al. 2005) para top-k.
+
+    Mantiene como máximo `capacity` contadores. Cada conteo estimado
+    sobreestima el real como mucho en n / capacity, y cualquier elemento con
+    frecuencia real mayor que n / capacity está garantizado en el resumen.
+    """
+
+    def __init__(self, capacity: int = 100) -> None:
+        self.capacity = capacity
+        self.count = 0
+        self.counters: Dict[Hashable, List[int]] = {}  # elemento -> [conteo, error]
+
+    def update(self, items: Iterable[Hashable]) -> None:
+        """Añade elementos al resumen."""
+        counters = self.counters
+        for item in items:
+            self.count += 1
+            entry = counters.get(item)
+            if entry is not None:
+                entry[0] += 1
+            elif len(counters) < self.capacity:
+                counters[item] = [1, 0]
+            else:
+                # Sustituye al elemento con menor conteo y hereda su conteo como error
+                victim = min(counters, key=lambda x: counters[x][0])
+                min_count = counters.pop(victim)[0]
+                counters[item] = [min_count + 1, min_count]
+
+    def merge(self, other: "SpaceSaving") -> "SpaceSaving":
+        """Combina otro resumen (Agarwal et al. 2012) conservando la capacidad."""
+        min_self = min((c for c, _ in self.counters.values()), default=0) if len(self.counters) >= self.capacity else 0
+        min_other = min((c for c, _ in other.counters.values()), default=0) if len(other.counters) >= other.capacity else 0
+        merged = {}
+        for item in set(self.counters) | set(other.counters):
+            c1, e1 = self.counters.get(item, (min_self, min_self))
+            c2, e2 = other.counters.get(item, (min_other, min_other))
+            merged[item] = [c1 + c2, e1 + e2]
+        top = sorted(merged.items(), key=lambda kv: kv[1][0], reverse=True)[:self.capacity]
+        self.counters = {item: entry for item, entry in top}
+        self.count += other.count
+        return self
+
+    def most_common(self, n: int) -> List[Tuple[Hashable, int]]:
+        """Los n elementos con mayor conteo estimado."""
+        top = sorted(self.counters.items(), key=lambda kv: kv[1][0], reverse=True)[:n]
+        return [(item, entry[0]) for item, entry in top]
+
+    def error_bound(self) -> float:
+        """Sobreestimación máxima de cualquier conteo (en número de elementos)."""
+        return self.count / self.capacity if self.capacity else 0.0
+
+
+class CountMinSketch:
+    """
+    Sketch Count-Min (Cormode y Muthukrishnan 2005) para frecuencias.
+
+    Con ancho w y profundidad d, la estimación nunca es menor que la real y
+    la supera en más de (e / w) * n con probabilidad como mucho e^-d.
+    """
+
+    def __init__(self, width: int = 2048, depth: int = 5) -> None:
+        self.width = width
+        self.depth = depth
+        self.count = 0
+        self.table = [[0] * width for _ in range(depth)]
+
+    def _indexes(self, item: Hashable) -> List[int]:
+        digest = hashlib.blake2b(str(item).encode("utf-8"), digest_size=8 * self.depth).digest()
+        return [int.from_bytes(digest[8 * i:8 * i + 8], "little") % self.width for i in range(self.depth)]
+
+    def update(self, items: Iterable[Hashable]) -> None:
+        """Añade elementos al sketch."""
+        for item in items:
+            self.count += 1
+            for row, index in zip(self.table, self._indexes(item)):
+                row[index] += 1
+
+    def merge(self, other: "CountMinSketch") -> "CountMinSketch":
+        """Suma otro sketch con las mismas dimensiones."""
+        if (self.width, self.depth) != (other.width, other.depth):
+            raise ValueError("Solo se pueden combinar sketches Count-Min de igual tamaño")
+        for row, other_row in zip(self.table, other.table):
+            for i, value in enumerate(other_row):
+                row[i] += value
+        self.count += other.count
+        return self
+
+    def estimate(self, item: Hashable) -> int:
+        """Frecuencia estimada (cota superior) del elemento."""
+        return min(row[index] for row, index in zip(self.table, self._indexes(item)))
+
+    def error_bound(self) -> float:
+        """Sobreestimación máxima (en número de elementos) con probabilidad 1 - e^-depth."""
+        return math.e / self.width * self.count
@@ -0,0 +1,161 @@
+"""
+stats.py
+---------
+Acumulador estadístico de una sola pasada para variables numéricas discretas
+(como la edad), implementado a mano sin numpy ni statistics.
+
+- Media y varianza con el algoritmo de Welford (forma ponderada de Chan), en
+  la misma pasada en que se construye el histograma.
+- Los cuantiles salen del histograma: las edades son enteros acotados, así
+  que "ordenar" equivale a ordenar los valores distintos (counting sort) una
+  sola vez; después cada percentil es una búsqueda binaria.
+- Dos acumuladores se pueden combinar con `merge` (lotes o hilos).
+"""
+
+from bisect import bisect_right
+from collections import Counter
+from typing import Iterable, Optional
+
+
+class AgeStats:
+    """Media, desviación típica, mínimo, máximo y cuantiles en una sola pasada."""
+
+    def __init__(self):
+        self.count = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self.histogram = Counter()
+        self._values = None
+        self._cumulative = None
+
+    @classmethod
+    def from_values(cls, values: Iterable) -> "AgeStats":
+        """Construye el acumulador a partir de un iterable de valores."""
+        stats = cls()
+        stats.update(values)
+        return stats
+
+    @classmethod
+    def from_histogram(cls, histogram: dict) -> "AgeStats":
+        """Construye el acumulador a partir de un histograma {valor: frecuencia}."""
+        stats = cls()
+        stats.update_histogram(histogram)
+        return stats
+
+    # ----------------------------
+    # ACUMULACIÓN
+    # ----------------------------
+    def add(self, value, weight: int = 1) -> None:
+        """Añade `weight` repeticiones de `value` (paso de Welford ponderado)."""
+        if weight <= 0:
+            return
+        total = self.count + weight
+        delta = value - self._mean
+        self._mean += delta * weight / total
+        self._m2 += delta * delta * self.count * weight / total
+        self.count = total
+        self.histogram[value] += weight
+        self._values = self._cumulative = None
+
+    def update(self, values: Iterable) -> None:
+        """Añade un lote de valores: se agrupan primero y se suman por valor distinto."""
+        self.update_histogram(Counter(values))
+
+    def update_histogram(self, histogram: dict) -> None:
+        """Añade un histograma {valor: frecuencia}."""
+        for value, weight in histogram.items():
+            self.add(value, weight)
+
+    def merge(self, other: "AgeStats") -> "AgeStats":
+        """Combina otro acumulador en este (fórmula paralela de Chan)."""
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.count, self._mean, self._m2 = other.count, other._mean, other._m2
+        else:
+            total = self.count + other.count
+            delta = other._mean - self._mean
+            self._mean += delta * other.count / total
+            self._m2 += other._m2 + delta * delta * self.count * other.count / total
+            self.count = total
+        self.histogram.update(other.histogram)
+        self._values = self._cumulative = None
+        return self
+
+    # ----------------------------
+    # RESULTADOS
+    # ----------------------------
+    @property
+    def mean(self) -> float:
+        return self._mean if self.count else 0.0
+
+    @property
+    def pstdev(self) -> float:
+        """Desviación típica poblacional."""
+        return (self._m2 / self.count) ** 0.5 if self.count else 0.0
+
+    @property
+    def min(self):
+        self._ensure_sorted()
+        return self._values[0] if self._values else 0
+
+    @property
+    def max(self):
+        self._ensure_sorted()
+        return self._values[-1] if self._values else 0
+
+    def _ensure_sorted(self) -> None:
+        """Ordena una única vez los valores distintos y sus frecuencias acumuladas."""
+        if self._values is not None:
+            return
+        self._values = sorted(self.histogram)
+        self._cumulative = []
+        running = 0
+        for value in self._values:
+            running += self.histogram[value]
+            self._cumulative.append(running)
+
+    def _value_at(self, index: int):
+        """Valor que ocuparía la posición `index` (0..n-1) en la lista ordenada."""
+        return self._values[bisect_right(self._cumulative, index)]
+
+    def percentile(self, percent: float) -> float:
+        """Percentil con interpolación lineal (mismo criterio que el cálculo manual original)."""
+        if self.count == 0:
+            return 0.0
+        self._ensure_sorted()
+        k = (self.count - 1) * (percent / 100)
+        f = int(k)
+        c = min(f + 1, self.count - 1)
+        low = self._value_at(f)
+        if f == c:
+            return low
+        return low + (self._value_at(c) - low) * (k - f)
+
+    @property
+    def median(self) -> float:
+        return self.percentile(50)
+
+    def iqr_bounds(self, coefficient: float) -> Optional[tuple]:
+        """Límites (inferior, superior) para outliers por el método IQR."""
+        if self.count == 0:
+            return None
+        q1, q3 = self.percentile(25), self.percentile(75)
+        iqr = q3 - q1
+        return q1 - coefficient * iqr, q3 + coefficient * iqr
+
+    def summary(self) -> dict:
+        """Estadísticas de edad con las claves usadas en los informes."""
+        mean, std = self.mean, self.pstdev
+        q1, q3 = self.percentile(25), self.percentile(75)
+        return {
+            "avg_age": round(mean, 2),
+            "median_age": round(self.median, 2),
+            "std_age": round(std, 2),
+            "min_age": self.min,
+            "max_age": self.max,
+            "cv_age": round((std / mean) * 100, 2) if mean > 0 else 0,
+            "q1_age": round(q1, 2),
+            "q3_age": round(q3, 2),
+            "iqr_age": round(q3 - q1, 2),
+        }